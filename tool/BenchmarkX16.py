@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+################################################################################
+#
+# Measure how long ConverterX16.py takes to convert resources
+#
+################################################################################
+#
+# Copyright 2020 Andrew Moore
+#
+#    BenchmarkX16.py is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    BenchmarkX16.py is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with BenchmarkX16.py.  If not, see <https://www.gnu.org/licenses/>.
+#
+################################################################################
+
+import argparse
+import configparser
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ConverterX16
+
+
+################################################################################
+# Global Variables
+version_info = (0, 1, 0)
+
+
+################################################################################
+# {{{ Configure
+################################################################################
+
+################################################################################
+# Parse the command-line
+def configure(args = None):
+	version_string = '.'.join(map(str, version_info))
+
+	parser = argparse.ArgumentParser(
+		description =
+			f'Time each stage of converting a set of generated resources'
+			f' with ConverterX16.py.  The resources are the same every'
+			f' run, so the results can be saved and compared with a'
+			f' later run to find changes that made the converter slower.'
+			f'\n'
+			f'\nversion:'
+			f'\n  {version_string}'
+		, formatter_class = argparse.RawTextHelpFormatter
+		)
+
+	parser.add_argument('--compare'
+		, help    = 'Compare the results with a saved baseline and fail if a stage'
+			    '\nis slower than the threshold.'
+		, action  = 'store'
+		, dest    = 'compare'
+		, metavar = 'FILE'
+		)
+
+	parser.add_argument('--filter'
+		, help    = 'Only run the workloads with this text in their name'
+		, action  = 'store'
+		, dest    = 'filter'
+		, metavar = 'TEXT'
+		)
+
+	parser.add_argument('--list'
+		, help   = 'Print the names of the workloads and exit'
+		, action = 'store_true'
+		, dest   = 'list'
+		)
+
+	parser.add_argument('--minimum'
+		, help    = 'Stages faster than this in the baseline are not checked,'
+			    '\nthey are mostly noise.  Default: 1.0'
+		, action  = 'store'
+		, default = 1.0
+		, dest    = 'minimum'
+		, metavar = 'MS'
+		, type    = float
+		)
+
+	parser.add_argument('--repeat'
+		, help    = 'Run each workload this many times, the fastest time of each'
+			    '\nstage is used.  Default: 5'
+		, action  = 'store'
+		, default = 5
+		, dest    = 'repeat'
+		, metavar = 'N'
+		, type    = int
+		)
+
+	parser.add_argument('--save'
+		, help    = 'Save the results as a baseline'
+		, action  = 'store'
+		, dest    = 'save'
+		, metavar = 'FILE'
+		)
+
+	parser.add_argument('--threshold'
+		, help    = 'The percent a stage can be slower than the baseline.'
+			    '\nDefault: 25'
+		, action  = 'store'
+		, default = 25.0
+		, dest    = 'threshold'
+		, metavar = 'PERCENT'
+		, type    = float
+		)
+
+	parser.add_argument('-v', '--verbose'
+		, help    = 'Print the time of every run'
+		, action  = 'count'
+		, default = 0
+		)
+
+	arg = parser.parse_args(args)
+
+	arg.version = version_info
+
+	if arg.repeat < 1:
+		arg.repeat = 1
+
+	return arg
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Workload : Generate
+################################################################################
+
+################################################################################
+# Write an indexed GIF
+#
+# The palette is a color ramp, the pixel values are what matter.  A gray palette
+# would be saved as a grayscale image, without a palette.
+def _gif_write(filename, pixels, color_count = 256):
+	from PIL import Image
+
+	image = Image.fromarray(pixels, 'P')
+
+	palette = []
+	for index in range(color_count):
+		level = (index * 255) // max(color_count - 1, 1)
+		palette.extend(( level, 255 - level, (level * 7) & 0xff ))
+	image.putpalette(palette)
+
+	image.save(filename)
+
+	return
+
+
+################################################################################
+# A random number generator that gives the same numbers every run
+def _random(seed):
+	import numpy
+
+	return numpy.random.default_rng(seed)
+
+
+################################################################################
+# 640x480 8bpp bitmap
+def _generate_bitmap(work_dir):
+	import numpy
+
+	pixels = _random(1).integers(0, 256, ( 480, 640 ), dtype = numpy.uint8)
+	_gif_write(f'{work_dir}/bitmap.gif', pixels)
+
+	return \
+		f'[Bitmap Bitmap]\n' \
+		f'File = {work_dir}/bitmap.gif\n' \
+		f'Bits_Per_Pixel = 8\n'
+
+
+################################################################################
+# 1024 tiles, one GIF file for each tile
+def _generate_tileset(work_dir, bits_per_pixel):
+	import numpy
+
+	tile_dir = f'{work_dir}/tile_{bits_per_pixel}'
+	os.makedirs(tile_dir, exist_ok = True)
+
+	random = _random(bits_per_pixel)
+	color_count = 1 << bits_per_pixel
+
+	lines = [ '[Tileset]' ]
+	for index in range(0x400):
+		pixels = random.integers(0, color_count, ( 8, 8 ), dtype = numpy.uint8)
+		_gif_write(f'{tile_dir}/{index:03x}.gif', pixels, color_count)
+		lines.append(f'{index:03x} = {tile_dir}/{index:03x}.gif')
+
+	with open(f'{work_dir}/tileset_{bits_per_pixel}.ini', 'w') as file:
+		file.write('\n'.join(lines) + '\n')
+
+	return \
+		f'[Tileset{bits_per_pixel} Tileset]\n' \
+		f'File = {work_dir}/tileset_{bits_per_pixel}.ini\n' \
+		f'Bits_Per_Pixel = {bits_per_pixel}\n'
+
+
+################################################################################
+# A tilemap with every row, 000 to 3ff
+def _generate_tilemap(work_dir):
+	random = _random(3)
+
+	lines = [ '[Tilemap]' ]
+	for index in range(0x400):
+		row = []
+		for _ in range(32):
+			row.append(f'{int(random.integers(0, 0x400)):03x} {int(random.integers(0, 16)):x} 0 0')
+		lines.append(f'{index:02x} = ' + ' '.join(row))
+
+	with open(f'{work_dir}/tilemap.ini', 'w') as file:
+		file.write('\n'.join(lines) + '\n')
+
+	return \
+		f'[Tilemap Tilemap]\n' \
+		f'File = {work_dir}/tilemap.ini\n'
+
+
+################################################################################
+# A 256x256 Tiled CSV tilemap with flipped tiles
+def _generate_tilemap_csv(work_dir):
+	random = _random(5)
+
+	tile_index = random.integers(0, 0x400, (256, 256))
+	flip = random.integers(0, 4, (256, 256)) << 30
+
+	lines = []
+	for row in (tile_index | flip):
+		lines.append(','.join(str(int(value)) for value in row))
+
+	with open(f'{work_dir}/tilemap.csv', 'w') as file:
+		file.write('\n'.join(lines) + '\n')
+
+	return \
+		f'[TilemapCsv Tilemap]\n' \
+		f'File = {work_dir}/tilemap.csv\n'
+
+
+################################################################################
+# A 256 color palette in a GIF file and in an INI file
+def _generate_palette(work_dir):
+	import numpy
+
+	random = _random(4)
+
+	pixels = numpy.arange(256, dtype = numpy.uint8).reshape(16, 16)
+	_gif_write(f'{work_dir}/palette.gif', pixels)
+
+	lines = [ '[Palette]' ]
+	for index in range(0, 256, 16):
+		row = [ f'{int(rgb):03x}' for rgb in random.integers(0, 0x1000, 16) ]
+		lines.append(f'{index:02x} = ' + ' '.join(row))
+
+	with open(f'{work_dir}/palette.ini', 'w') as file:
+		file.write('\n'.join(lines) + '\n')
+
+	return \
+		f'[PaletteGif Palette]\n' \
+		f'File = {work_dir}/palette.gif\n' \
+		f'\n' \
+		f'[PaletteIni Palette]\n' \
+		f'File = {work_dir}/palette.ini\n'
+
+
+################################################################################
+# Write all the input files and the resource file
+def generate(work_dir):
+	section_list = []
+	section_list.append(_generate_bitmap(work_dir))
+	for bits_per_pixel in ( 2, 4, 8 ):
+		section_list.append(_generate_tileset(work_dir, bits_per_pixel))
+	section_list.append(_generate_tilemap(work_dir))
+	section_list.append(_generate_tilemap_csv(work_dir))
+	section_list.append(_generate_palette(work_dir))
+
+	resource = f'{work_dir}/Resource.ini'
+	with open(resource, 'w') as file:
+		file.write('\n'.join(section_list))
+
+	return resource
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Workload : Stages
+################################################################################
+#
+# Each workload is a list of stages.  A stage is given the result of the stage
+# before it and returns its own result.  Only the stages are timed.
+#
+################################################################################
+
+################################################################################
+# Read a section of an INI file
+def _stage_ini(filename, section):
+	file_ini = configparser.ConfigParser()
+	file_ini.read(filename)
+
+	return dict(file_ini[section])
+
+
+################################################################################
+def _workload_bitmap(converter, resource, work_dir):
+	from PIL import Image
+
+	def decode(section_ini):
+		image = Image.open(section_ini['file'])
+		pixels = ConverterX16._load_gif_pixels(image)
+		ConverterX16._pixels_validate(section_ini['file'], pixels, 8)
+		return pixels
+
+	return \
+		[ ( 'ini'   , lambda _: _stage_ini(resource, 'Bitmap Bitmap') )
+		, ( 'decode', decode )
+		, ( 'pack'  , lambda pixels: ConverterX16._pixels_pack(pixels, 8) )
+		, ( 'write' , lambda data: _stage_write(converter, work_dir, 'bitmap.x16b', data) )
+		]
+
+
+################################################################################
+def _workload_tileset(converter, resource, work_dir, bits_per_pixel):
+	def ini(_):
+		section_ini = _stage_ini(resource, f'Tileset{bits_per_pixel} Tileset')
+		tile_ini = _stage_ini(section_ini['file'], 'Tileset')
+		return [ tile_ini[f'{index:03x}'] for index in range(len(tile_ini)) ]
+
+	return \
+		[ ( 'ini'   , ini )
+		, ( 'decode', lambda filename_list: ConverterX16._load_tile_list(converter, filename_list, bits_per_pixel) )
+		, ( 'pack'  , lambda tile_list: ConverterX16._tiles_pack(tile_list, bits_per_pixel) )
+		, ( 'write' , lambda data: _stage_write(converter, work_dir, f'tileset_{bits_per_pixel}.x16t', data) )
+		]
+
+
+################################################################################
+def _workload_tilemap(converter, resource, work_dir):
+	def ini(_):
+		section_ini = _stage_ini(resource, 'Tilemap Tilemap')
+		return _stage_ini(section_ini['file'], 'Tilemap')
+
+	return \
+		[ ( 'ini'   , ini )
+		, ( 'pack'  , lambda section_ini: ConverterX16._convert_tilemap_ini_section(converter, section_ini) )
+		, ( 'write' , lambda data: _stage_write(converter, work_dir, 'tilemap.x16m', data) )
+		]
+
+
+################################################################################
+def _workload_tilemap_csv(converter, resource, work_dir):
+	def decode(section_ini):
+		return ConverterX16._tiled_read_csv(section_ini['file'])
+
+	return \
+		[ ( 'ini'   , lambda _: _stage_ini(resource, 'TilemapCsv Tilemap') )
+		, ( 'decode', decode )
+		, ( 'pack'  , lambda tiled: ConverterX16._tiled_entries('tilemap.csv', tiled[0], tiled[1], 0, 0) )
+		, ( 'write' , lambda data: _stage_write(converter, work_dir, 'tilemap_csv.x16m', data) )
+		]
+
+
+################################################################################
+def _workload_palette_gif(converter, resource, work_dir):
+	return \
+		[ ( 'ini'   , lambda _: _stage_ini(resource, 'PaletteGif Palette') )
+		, ( 'decode', lambda section_ini: ConverterX16._convert_palette_gif(converter, section_ini) )
+		, ( 'write' , lambda data: _stage_write(converter, work_dir, 'palette_gif.x16p', data) )
+		]
+
+
+################################################################################
+def _workload_palette_ini(converter, resource, work_dir):
+	def ini(_):
+		section_ini = _stage_ini(resource, 'PaletteIni Palette')
+		return _stage_ini(section_ini['file'], 'Palette')
+
+	return \
+		[ ( 'ini'   , ini )
+		, ( 'pack'  , lambda section_ini: ConverterX16._convert_palette_ini_section(converter, section_ini) )
+		, ( 'write' , lambda data: _stage_write(converter, work_dir, 'palette_ini.x16p', data) )
+		]
+
+
+################################################################################
+# Convert the whole resource, the same as running ConverterX16.py
+def _workload_convert(resource, work_dir, convert_option, name):
+	args = [ '--output-dir', f'{work_dir}/out', convert_option, name, resource ]
+
+	return \
+		[ ( 'convert', lambda _: ConverterX16.main(args) )
+		]
+
+
+################################################################################
+def _stage_write(converter, work_dir, filename, data):
+	ConverterX16._write_data(converter, ( 0, 0 ), data, f'{work_dir}/out/{filename}')
+
+	return None
+
+
+################################################################################
+# Get all the workloads
+#
+# Returns a list of ( name, stage list ).  The arguments are only used when
+# the stages are called.
+def workload_list(converter, resource, work_dir):
+	workloads = []
+	workloads.append(( 'bitmap-8bpp', _workload_bitmap(converter, resource, work_dir) ))
+	for bits_per_pixel in ( 2, 4, 8 ):
+		workloads.append(( f'tileset-{bits_per_pixel}bpp'
+			, _workload_tileset(converter, resource, work_dir, bits_per_pixel)
+			))
+	workloads.append(( 'tilemap-ini', _workload_tilemap(converter, resource, work_dir) ))
+	workloads.append(( 'tilemap-csv', _workload_tilemap_csv(converter, resource, work_dir) ))
+	workloads.append(( 'palette-gif', _workload_palette_gif(converter, resource, work_dir) ))
+	workloads.append(( 'palette-ini', _workload_palette_ini(converter, resource, work_dir) ))
+
+	workloads.append(( 'convert-bitmap'
+		, _workload_convert(resource, work_dir, '--convert-bitmap', 'Bitmap')
+		))
+	for bits_per_pixel in ( 2, 4, 8 ):
+		workloads.append(( f'convert-tileset-{bits_per_pixel}bpp'
+			, _workload_convert(resource, work_dir, '--convert-tileset', f'Tileset{bits_per_pixel}')
+			))
+	workloads.append(( 'convert-tilemap'
+		, _workload_convert(resource, work_dir, '--convert-tilemap', 'Tilemap')
+		))
+	workloads.append(( 'convert-tilemap-csv'
+		, _workload_convert(resource, work_dir, '--convert-tilemap', 'TilemapCsv')
+		))
+	workloads.append(( 'convert-palette-gif'
+		, _workload_convert(resource, work_dir, '--convert-palette', 'PaletteGif')
+		))
+	workloads.append(( 'convert-palette-ini'
+		, _workload_convert(resource, work_dir, '--convert-palette', 'PaletteIni')
+		))
+
+	return workloads
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Run
+################################################################################
+
+################################################################################
+# Run the stages of a workload and time them
+#
+# Returns the fastest time, in seconds, of each stage.
+def run_workload(benchmark, name, stage_list):
+	best = {}
+	for run in range(benchmark.repeat):
+		result = None
+		for stage, function in stage_list:
+			start = time.perf_counter()
+			result = function(result)
+			elapsed = time.perf_counter() - start
+
+			if stage not in best or elapsed < best[stage]:
+				best[stage] = elapsed
+
+			if benchmark.verbose > 0:
+				print(f'{name} {stage} run {run}: {elapsed * 1000:.3f} ms')
+
+	return best
+
+
+################################################################################
+# Run all the workloads
+def run(benchmark, work_dir):
+	resource = generate(work_dir)
+	os.makedirs(f'{work_dir}/out', exist_ok = True)
+
+	# Every repeat has to decode the images, not get them from the cache
+	converter = ConverterX16.configure([ '--image-cache', '0', '--output-dir', f'{work_dir}/out', resource ])
+
+	results = {}
+	for name, stage_list in workload_list(converter, resource, work_dir):
+		if benchmark.filter is not None and benchmark.filter not in name:
+			continue
+
+		results[name] = run_workload(benchmark, name, stage_list)
+
+	return results
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Baseline
+################################################################################
+
+################################################################################
+# Save the results
+def baseline_save(benchmark, results):
+	import numpy
+	from PIL import Image
+
+	baseline = \
+	{	'version'   : list(benchmark.version)
+	,	'converter' : list(ConverterX16.version_info)
+	,	'python'    : platform.python_version()
+	,	'pillow'    : Image.__version__
+	,	'numpy'     : numpy.__version__
+	,	'machine'   : platform.machine()
+	,	'repeat'    : benchmark.repeat
+	,	'results'   : results
+	}
+
+	with open(benchmark.save, 'w') as file:
+		json.dump(baseline, file, indent = '\t', sort_keys = True)
+		file.write('\n')
+
+	return
+
+
+################################################################################
+# Compare the results with the baseline
+#
+# Returns a list of ( workload, stage, baseline, result ) for every stage that
+# is slower than the threshold allows.
+def baseline_compare(benchmark, baseline, results):
+	minimum   = benchmark.minimum / 1000
+	threshold = 1 + (benchmark.threshold / 100)
+
+	regression_list = []
+	for name, stage_time in results.items():
+		for stage, elapsed in stage_time.items():
+			base = baseline.get(name, {}).get(stage)
+			if base is None or base < minimum:
+				continue
+
+			if elapsed > (base * threshold):
+				regression_list.append(( name, stage, base, elapsed ))
+
+	return regression_list
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Report
+################################################################################
+
+################################################################################
+# Print a table of the results
+def report(results, baseline = None):
+	print(f'{"Workload":<24} {"Stage":<8} {"Time ms":>10} {"Baseline":>10} {"Change":>8}')
+
+	for name, stage_time in results.items():
+		for stage, elapsed in stage_time.items():
+			line = f'{name:<24} {stage:<8} {elapsed * 1000:>10.3f}'
+
+			base = None
+			if baseline is not None:
+				base = baseline.get(name, {}).get(stage)
+
+			if base is not None and base > 0:
+				change = ((elapsed - base) / base) * 100
+				line += f' {base * 1000:>10.3f} {change:>+7.1f}%'
+
+			print(line)
+
+	return
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Main
+################################################################################
+
+################################################################################
+# Run BenchmarkX16.py
+def main(args = None):
+	benchmark = configure(args)
+
+	# The stages are not called, so the names do not need a converter
+	if benchmark.list is True:
+		for name, _ in workload_list(None, None, None):
+			print(name)
+		return 0
+
+	with tempfile.TemporaryDirectory(prefix = 'BenchmarkX16.') as work_dir:
+		results = run(benchmark, work_dir)
+
+	baseline = None
+	if benchmark.compare is not None:
+		with open(benchmark.compare) as file:
+			baseline = json.load(file)['results']
+
+	report(results, baseline)
+
+	if benchmark.save is not None:
+		baseline_save(benchmark, results)
+
+	if benchmark.compare is not None:
+		regression_list = baseline_compare(benchmark, baseline, results)
+		for name, stage, base, elapsed in regression_list:
+			print(f'Regression: {name} {stage}:' \
+			      f' {base * 1000:.3f} ms ==> {elapsed * 1000:.3f} ms' \
+			      f' (threshold {benchmark.threshold:g}%)'
+			      )
+
+		if len(regression_list) > 0:
+			return 1
+
+	return 0
+
+
+################################################################################
+if __name__ == '__main__':
+	sys.exit(main())
+
+################################################################################
+# }}}
+################################################################################
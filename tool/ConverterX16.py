@@ -29,7 +29,6 @@
 #
 # Todo
 # - Add Tilemap Support [In-Progress]
-# - Add Sprite Support
 # - Make the "--makefile" command-line option SSD friendly by calculating a
 #   hash (MD5?) of the new contents and comparing that with the has in the
 #   previously generated makefile.  If the same, don't write a new file.
@@ -40,17 +39,32 @@
 
 import argparse
 import configparser
+import contextlib
+import hashlib
+import io
+import json
 import os
+import select
+import shutil
+import struct
 import sys
 import textwrap
+import time
 
-from PIL import Image
+# Pillow, NumPy, and the process pool are only imported when they are needed.
+# This keeps commands like "--makefile" and "--list-output-files" fast, since
+# they are run by make every time.
 
 
 ################################################################################
 # Global Variables
 version_info = (0, 4, 0)
 
+# The version of the bytes that are written.  Change it whenever the same
+# inputs and options are converted to different output bytes, so that the
+# conversion cache does not return outputs made by the old code.
+output_format = 4
+
 
 ################################################################################
 # Check Python Version
@@ -64,7 +78,7 @@ if sys.version_info[0] < 3:
 
 ################################################################################
 # Configure the Application
-def configure():
+def configure(args = None):
 	########################################
 	# Build configuration from the args
 
@@ -83,6 +97,24 @@ def configure():
 		, formatter_class = argparse.RawTextHelpFormatter
 		)
 
+	parser.add_argument('--cache-dir'
+		, help    = 'Keep converted data in this directory and reuse it when the'
+			    '\ninput files and resource settings have not changed.'
+		, action  = 'store'
+		, default = None
+		, dest    = 'cache_dir'
+		, metavar = 'DIR'
+		)
+
+	parser.add_argument('--cache-size'
+		, help    = 'The maximum size of the cache directory in MiB. Default: 256'
+		, action  = 'store'
+		, default = 256
+		, dest    = 'cache_size'
+		, metavar = 'MiB'
+		, type    = int
+		)
+
 	parser.add_argument('--case'
 		, help    = 'Convert the output filename to all upper (or lower) case.'
 		, choices = [ 'lower', 'upper' ]
@@ -97,6 +129,13 @@ def configure():
 		, metavar = 'BITMAP'
 		)
 
+	parser.add_argument('--convert-bundle'
+		, help    = 'Only convert a bundle resource'
+		, action  = 'store'
+		, dest    = 'convert_bundle'
+		, metavar = 'BUNDLE'
+		)
+
 	parser.add_argument('--convert-file'
 		, help    = 'Only convert the resources related to the file'
 		, action  = 'store'
@@ -104,6 +143,13 @@ def configure():
 		, metavar = 'FILE'
 		)
 
+	parser.add_argument('--convert-layer'
+		, help    = 'Only convert a layer resource'
+		, action  = 'store'
+		, dest    = 'convert_layer'
+		, metavar = 'LAYER'
+		)
+
 	parser.add_argument('--convert-palette'
 		, help    = 'Only convert the palette resource'
 		, action  = 'store'
@@ -111,6 +157,20 @@ def configure():
 		, metavar = 'PALETTE'
 		)
 
+	parser.add_argument('--convert-stale'
+		, help    = 'Convert all resources that are missing or older than their'
+			    '\ninput files'
+		, action  = 'store_true'
+		, dest    = 'convert_stale'
+		)
+
+	parser.add_argument('--convert-sprite'
+		, help    = 'Only convert a sprite resource'
+		, action  = 'store'
+		, dest    = 'convert_sprite'
+		, metavar = 'SPRITE'
+		)
+
 	parser.add_argument('--convert-tilemap'
 		, help    = 'Only convert a tilemap resource'
 		, action  = 'store'
@@ -125,12 +185,51 @@ def configure():
 		, metavar = 'TILE_SET'
 		)
 
+	parser.add_argument('--depfile'
+		, help    = 'Write a GNU Make dependency file, OUTPUT.d, for every output'
+			    '\nfile.  It lists all the files used to create the output.'
+			    '\nWith --convert-stale the outputs that are up to date are'
+			    '\ntouched, for the grouped rule of --makefile.'
+		, action  = 'store_true'
+		, dest    = 'depfile'
+		)
+
 	parser.add_argument('--help-resource'
 		, help   = 'Print information about the resource file'
 		, action = 'store_true'
 		, dest   = 'help_resource'
 		)
 
+	parser.add_argument('--image-cache'
+		, help    = 'The memory, in MiB, used to keep decoded images so that the'
+			    '\nresources which use the same image only decode it once.  The'
+			    '\nleast recently used images are dropped first.  Use 0 to turn'
+			    '\nthe cache off.  Default: 256'
+		, action  = 'store'
+		, default = 256
+		, dest    = 'image_cache_limit'
+		, metavar = 'MIB'
+		, type    = int
+		)
+
+	parser.add_argument('-j', '--jobs'
+		, help    = 'The number of resources, or tiles, to convert at the same'
+			    '\ntime.  Use 0 for the number of CPUs.  Default: 1'
+		, action  = 'store'
+		, default = 1
+		, dest    = 'jobs'
+		, metavar = 'N'
+		, type    = int
+		)
+
+	parser.add_argument('--layout'
+		, help    = 'Write the addresses chosen for "Address = auto" to a ca65'
+			    '\ninclude file.'
+		, action  = 'store'
+		, dest    = 'layout_file'
+		, metavar = 'FILE'
+		)
+
 	parser.add_argument('--list-input-files'
 		, help   = 'Print a list of input files and exit'
 		, action = 'store_true'
@@ -155,12 +254,48 @@ def configure():
 		, dest   = 'output_dir'
 		)
 
+	parser.add_argument('--preview'
+		, help   = 'Draw the converted resources to PNG files, the same way that'
+			   '\nVera would show them, and exit.  Nothing is converted.'
+		, action = 'store_true'
+		, dest   = 'preview'
+		)
+
+	parser.add_argument('--ram-banks'
+		, help    = 'The number of 8 KiB banks of high RAM that "Address = auto"'
+			    '\ncan use, bank 0 is never used.  Default: 64'
+		, action  = 'store'
+		, default = 64
+		, dest    = 'ram_banks'
+		, metavar = 'N'
+		, type    = int
+		)
+
+	parser.add_argument('--stats'
+		, help    = 'Print the time spent in each stage of each resource and some'
+			    '\ncounters when done.  "json" prints a JSON report instead of'
+			    '\na table.'
+		, action  = 'store'
+		, choices = [ 'table', 'json' ]
+		, const   = 'table'
+		, default = None
+		, dest    = 'stats'
+		, nargs   = '?'
+		)
+
 	parser.add_argument('-v', '--verbose'
 		, help    = 'Print information during execution: -v = Print output files, -vv = Print status info, -vvv = Extra debugging output'
 		, action  = 'count'
 		, default = 0
 		)
 
+	parser.add_argument('--watch'
+		, help   = 'Keep running after converting and convert the resources'
+			   '\nagain when their input files change.  Stop with Ctrl-C.'
+		, action = 'store_true'
+		, dest   = 'watch'
+		)
+
 	parser.add_argument('resource'
 		, action  = 'store'
 		, default = None
@@ -169,18 +304,46 @@ def configure():
 		, type    = str
 		)
 
-	arg = parser.parse_args()
+	arg = parser.parse_args(args)
 
 	arg.version = version_info
 
+	arg.index = None
+
+	arg.layout = None
+
+	arg.image_cache       = {}
+	arg.image_cache_bytes = 0
+
+	arg.stats_data    = {}
+	arg.stats_section = None
+
+	if arg.jobs < 1:
+		arg.jobs = os.cpu_count() or 1
+
+	arg.image_cache_limit = max(arg.image_cache_limit, 0) * 1024 * 1024
+
 	arg.output_ext = \
 	{	'bitmap'  : 'x16b'
+	,	'bundle'  : 'x16a'
+	,	'layer'   : 'x16t'
 	,	'palette' : 'x16p'
 	,	'sprite'  : 'x16s'
 	,	'tilemap' : 'x16m'
 	,	'tileset' : 'x16t'
 	}
 
+	# Extra files that some resources write in addition to the file of the
+	# resource type.
+	arg.output_ext_extra = \
+	{	'column'  : 'x16v'
+	,	'frame'   : 'x16f'
+	,	'index'   : 'x16i'
+	,	'preview' : 'png'
+	,	'remap'   : 'x16r'
+	,	'row'     : 'x16h'
+	}
+
 	return arg
 
 
@@ -209,7 +372,12 @@ result in a file called "Foo".
 
 The file will also have an extension based on the resource type:
 	Bitmap  ==> .{converter.output_ext["bitmap"]}
-	Palette ==> .{converter.output_ext["palette"]}
+	Bundle  ==> .{converter.output_ext["bundle"]}
+	Layer   ==> .{converter.output_ext["layer"]} and .{converter.output_ext["tilemap"]}
+	Palette ==> .{converter.output_ext["palette"]} (and .{converter.output_ext["bitmap"]} from a truecolor image)
+	Sprite  ==> .{converter.output_ext["sprite"]} and .{converter.output_ext_extra["frame"]}
+	Tilemap ==> .{converter.output_ext["tilemap"]}
+	Tileset ==> .{converter.output_ext["tileset"]}
 
 Continuing with the "Foo" example, if the resource type is "Bitmap" then the 
 converted file will be "Foo.{converter.output_ext["bitmap"]}".
@@ -224,6 +392,287 @@ Below is an example of a series of Section titles for a fictional game:
 	[UI_Alien Tileset]
 
 	[UI_Human Tileset]
+
+Bitmap Options
+
+	File = IMAGE
+	  A GIF file, the color indexes are written as
+	  "Foo.{converter.output_ext["bitmap"]}".
+
+	Bits_Per_Pixel = 2 | 4 | 8
+	  The default is "8".
+
+	Chunks = no | yes
+	  Also write the bitmap cut in to chunks that never cross a 64 KiB
+	  Vera bank, or an 8 KiB high RAM bank with "Memory = ram".  Each
+	  chunk, "Foo-0.{converter.output_ext["bitmap"]}", "Foo-1.{converter.output_ext["bitmap"]}", ..., has its own address and
+	  is loaded with one LOAD.  The index, "Foo.{converter.output_ext_extra["index"]}", has a 1 byte
+	  count and a 7 byte entry for each chunk, in load order: the memory
+	  (0 = RAM, 1 = Vera), the bank, the address (2 bytes), and the
+	  length (3 bytes).  Its address is set with Index_Address_High and
+	  Index_Address_Low.  There can be at most 255 chunks.  The default
+	  is "no".
+
+	Address_Bank, Address_High, Address_Low
+	  The address of the bitmap.
+
+Palette Options
+
+	File = IMAGE
+	  A GIF file uses the palette of the GIF.  Any other image, such as a
+	  24-bit PNG, is truecolor and its colors are reduced to make the
+	  palette.  The image is also written, using the palette indexes, as
+	  "Foo.{converter.output_ext["bitmap"]}".
+
+	Colors = 4 | 16 | 256
+	  The number of colors to reduce a truecolor image to, the bitmap
+	  uses 2, 4, or 8 bits-per-pixel to match.  Adding this key to a GIF
+	  palette also reduces its colors.  The default is "256".
+
+	  When the image has transparent pixels, they use palette index 0.
+
+	Bitmap_Address_High, Bitmap_Address_Low
+	  The address of the bitmap.
+
+Sprite Options
+
+	A sprite resource cuts a sprite sheet in to frames and writes the
+	frames, "Foo.{converter.output_ext["sprite"]}", and a frame table, "Foo.{converter.output_ext_extra["frame"]}".
+
+	File = IMAGE
+	  The sprite sheet.  The frames are read in row order, left to right
+	  and top to bottom.
+
+	Bits_Per_Pixel = 4 | 8
+	Frame_Width = 8 | 16 | 32 | 64
+	Frame_Height = 8 | 16 | 32 | 64
+	  The default frame size is 8x8.
+
+	Order = row | column
+	  Read the frames in row order, or top to bottom and left to right.
+	  The default is "row".
+
+	Frame_First, Frame_Count
+	  Only use some of the frames on the sheet.  The default is all of
+	  them.
+
+	Deduplicate = no | exact
+	  Only keep one copy of frames that are the same.  The default is
+	  "exact".
+
+	Address_Bank, Address_High, Address_Low
+	  The Vera address of the frames, it must be a multiple of 32.  The
+	  bank is not part of the file, it is only used for the frame table.
+
+	Table_Address_High, Table_Address_Low
+	  The frame table has 2 bytes for each frame on the sheet, the same as
+	  bytes 0 and 1 of the Vera sprite attributes: the address of the
+	  frame and the color mode.  Copy them in to the sprite attributes to
+	  show the frame.
+
+Tilemap Options
+
+	File = INI | JSON | TMX | CSV
+	  An INI file has a "Tilemap" section, each row has 4 hex values for
+	  every tile: the tile index, the palette offset, V-Flip, and H-Flip.
+	  Without a file, the rows are in the resource section.
+
+	  A Tiled map (.json, .tmj, or .tmx) or a Tiled CSV export (.csv)
+	  can also be used.  The flipped tiles keep their flip bits, rotated
+	  tiles are an error.  The tiles of all the Tiled tilesets are
+	  numbered from 0, in the same order as Tiled.
+
+	Layer = NAME
+	  The Tiled tile layer to use, the default is the first one.
+
+	Palette_Offset = HEX
+	  The palette offset of all the Tiled tiles.  The default is "0".
+
+	Empty_Tile = HEX
+	  The tile index to use where the Tiled map is empty.  The default is
+	  "0".
+
+	Map_Width = 32 | 64 | 128 | 256
+	  Pad each row of a Tiled tilemap to the width of the VERA layer.
+
+	Strips = no | yes
+	  Scroll a world that is larger than the VERA layer.  The layer,
+	  Map_Width x Map_Height (default 32x32), is a ring buffer: world
+	  tile (X, Y) is always at (X % Map_Width, Y % Map_Height).  The
+	  tilemap file is the top-left corner of the world, and two more
+	  files have a record for each world column, "Foo.{converter.output_ext_extra["column"]}", and
+	  each world row, "Foo.{converter.output_ext_extra["row"]}".
+
+	  A record is 3 bytes for the Vera ADDR_L, ADDR_M, and ADDR_H
+	  registers (with the increment) and the bytes to write to DATA0.  A
+	  column record has two parts, byte 0 then byte 1 of each entry,
+	  each with its own address.  When the world is larger than the
+	  layer, there are records for each band of Map_Height rows (or
+	  Map_Width columns), in band order.  The default is "no".
+
+	Column_Address_High, Column_Address_Low
+	Row_Address_High, Row_Address_Low
+	  The addresses of the column and row strips.
+
+Tileset Options
+
+	File = INI | IMAGE
+	  An INI file has a "Tileset" section with one image file for each
+	  tile.  An image file is an atlas, the tiles are cut out of it.
+
+	Bits_Per_Pixel = 2 | 4 | 8
+	Tile_Width = 8 | 16
+	Tile_Height = 8 | 16
+	  The size of the tiles in an atlas, the default is 8x8.
+
+	Order = row | column
+	  Read the atlas tiles in row order, or top to bottom and left to
+	  right.  The default is "row".
+
+	Tile_First, Tile_Count
+	  Only use some of the tiles in the atlas.  The default is all of
+	  them.
+
+	Deduplicate = no | exact | yes
+	  Only keep one copy of tiles that are the same.  "yes" also finds
+	  tiles that are a horizontal, vertical, or both flipped copy of
+	  another tile.  The default is "no".
+
+	  A remap table, "Foo.{converter.output_ext_extra["remap"]}", is written with one tilemap
+	  entry for each original tile.  The entry has the new tile index and
+	  the flip bits, the same as the tilemap entries.  Its address is set
+	  with Remap_Address_High and Remap_Address_Low.
+
+	Sub_Palettes = no | yes
+	  Only for a 4bpp atlas that uses the 256 colors of its GIF palette.
+	  The tiles are grouped in to at most 16 sub-palettes of 15 colors
+	  (and color 0, which is transparent) and the pixels are changed to
+	  the indexes of their sub-palette.  The sub-palettes are written as
+	  "Foo.{converter.output_ext["palette"]}" (Palette_Address_High, Palette_Address_Low) and
+	  the palette offset of each tile is in the remap table, which is
+	  always written.  The default is "no".
+
+	  When the sub-palettes are in the Vera palette the palette offsets
+	  start at the sub-palette of their address, which must be a
+	  multiple of 32 bytes from $1FA00.  Otherwise they start at 0.
+
+Layer Options
+
+	A layer resource cuts one large image into tiles and writes both the
+	tileset, "Foo.{converter.output_ext["layer"]}", and the tilemap, "Foo.{converter.output_ext["tilemap"]}".  The tileset has the
+	same extension as a Tileset resource, so a Layer and a Tileset can
+	not have the same name.
+
+	File = IMAGE
+	  The image to cut into tiles.  The width and height must be a
+	  multiple of the tile size.
+
+	Bits_Per_Pixel = 2 | 4 | 8
+	Tile_Width = 8 | 16
+	Tile_Height = 8 | 16
+	  The default tile size is 8x8.
+
+	Deduplicate = no | exact | yes
+	  Same as the Tileset option, but the default is "yes".  The tilemap
+	  entries point at the kept tiles.
+
+	Sub_Palettes = no | yes
+	  Same as the Tileset option.  The palette offset of each tile is in
+	  its tilemap entry.  Tiles that are the same after being changed to
+	  sub-palette indexes are only kept once.
+
+	Map_Width = 32 | 64 | 128 | 256
+	  Pad each row of the tilemap to the width of the VERA layer.  The
+	  default is the number of tiles across the image.
+
+	Address_High, Address_Low
+	  The address of the tileset.
+
+	Map_Address_High, Map_Address_Low
+	  The address of the tilemap.
+
+Bundle Options
+
+	A bundle copies the output files of other resources in to one file,
+	"Foo.{converter.output_ext["bundle"]}", so a program only opens one file to load them all.
+	The bundles are converted after all the other resources.  Use the
+	X16_Bundle_Load macro, in Zakero_X16.inc, to load every file of the
+	bundle to its address.
+
+	Resources = SECTION, SECTION, ...
+	  The resource sections to put in the bundle, for example
+	  "TitleScreen Bitmap, UI Palette".  The default is all the resources
+	  that are not bundles.
+
+	Align = BYTES
+	  Start the data of each file at a multiple of BYTES from the start
+	  of the bundle.  The default is "1".
+
+	The bundle starts with a 2 byte count and a 12 byte entry for each
+	file: the hash of the file name (2 bytes), the offset of the data (3
+	bytes), the length (3 bytes), the memory (0 = RAM, 1 = Vera), the
+	bank, and the address (2 bytes).  The hash is 32-bit FNV-1a of the
+	file name, for example "Foo.{converter.output_ext["bitmap"]}", with the high and low 16 bits
+	combined using exclusive-or.
+
+Preview Options
+
+	"--preview" draws the outputs of the Bitmap, Layer, Tilemap, and
+	Tileset resources to "Foo.{converter.output_ext_extra["preview"]}", the same way that Vera would
+	show them.  A Tileset is drawn 16 tiles across, using the remap table
+	when there is one.  The colors are the default Vera palette.
+
+	Preview_Palette = SECTION, SECTION, ...
+	  The Palette resources to write over the default palette, for
+	  example "UI Palette".  A palette with an address in the Vera palette
+	  ($FA00-$FBFF) starts at the color of that address, otherwise it
+	  starts at color 0.  The sub-palettes of a Layer or Tileset are
+	  always used.
+
+	Preview_Tileset = SECTION
+	  The Tileset or Layer resource that has the tiles of a Tilemap.
+
+Layout
+
+	Address = auto
+	  Let ConverterX16.py choose the address.  Map_Address, Table_Address,
+	  Remap_Address, Bitmap_Address, Column_Address, Row_Address, and
+	  Index_Address can also be "auto".  Address_Bank is set too, it is
+	  the Vera bank (0 or 1) or the high RAM bank.
+
+	  After converting, all the outputs are packed in to Vera memory, the
+	  Vera palette, or high RAM ($A000-$BFFF, banks 1 to "--ram-banks").
+	  Outputs with a fixed address are not moved, but if they overlap or
+	  are not aligned a warning is printed.  A palette address of
+	  $FA00-$FBFF is always in the Vera palette, Address_Bank is not
+	  needed.  The default memory and alignment is:
+	    Tileset, Layer, Bitmap : Vera, 2048 bytes
+	    Tilemap, Layer Map     : Vera, 512 bytes
+	    Sprite                 : Vera, 32 bytes
+	    Palette                : Vera palette
+	    Sub-palettes           : Vera palette, 32 bytes
+	    Remap, Frame Table     : High RAM
+	    Bitmap Chunk Index     : High RAM
+	    Column and Row Strips  : High RAM
+	    Compressed data        : High RAM
+
+	Memory = vram | palette | ram
+	Align = BYTES
+	  Change the memory or the alignment, use the same prefix as the
+	  address, for example Map_Memory or Map_Align.
+
+	  The chosen addresses are kept in ".ConverterX16.Layout.RESOURCE" and
+	  "--layout FILE" writes them as ca65 symbols, for example Foo_Address,
+	  Foo_Bank, Foo_Map_Address, and Foo_Map_Bank.
+
+Compression
+
+	Compression = none | rle | lz
+	  Compress the data of a Bitmap, Layer, Palette, Tilemap, or Tileset.
+	  The file still starts with the 2 byte address, load the file in to
+	  RAM and use the Vera_Decompress_RLE or Vera_Decompress_LZ macro, in
+	  Zakero_X16_Vera.inc, to write the data to Vera.  The default is
+	  "none".
          ''')
 
 	return
@@ -240,55 +689,35 @@ Below is an example of a series of Section titles for a fictional game:
 ################################################################################
 # Print all input files
 def list_input_files(converter):
-	resource = configparser.ConfigParser()
-	resource.read(converter.resource)
-
-	file_list = set()
-
-	for section_id in resource.sections():
-		filename = _filename_get(resource[section_id])
-		if filename is None:
-			continue
+	index = _resource_index(converter)
 
-		file_list.add(filename)
-	
-	filename_list = ' '.join(file_list)
+	filename_list = ' '.join(index['file'])
 	print(f'{filename_list}')
 
 	return
 
-
 ################################################################################
 # Print all output files
 def list_output_files(converter):
-	resource = configparser.ConfigParser()
-	resource.read(converter.resource)
+	index = _resource_index(converter)
 
-	file_list = set()
+	_resource_output_check(converter, index)
 
-	for section_id in resource.sections():
-		resource_type = _resource_type(section_id)
-		if resource_type is None:
-			_log_warning(converter, f'Not a resource section: "{section_id}"')
-			continue
-		if resource_type not in converter.output_ext:
-			_log_warning(converter, f'Unknown resource type: {resource_type}')
-			continue
+	file_list = []
+
+	for section_id in _resource_section_list(converter, index):
+		section_ini = _resource_section(index, section_id)
+		file_list.extend(_section_output_files(converter, section_id, section_ini))
 
-		filename = _output_filename(converter, section_id)
-		file_list.add(filename)
-	
 	filename_list = ' '.join(file_list)
 	print(f'{filename_list}')
 
 	return
 
-
 ################################################################################
 # Generate a Makefile
 def generate_makefile(converter):
-	resource = configparser.ConfigParser()
-	resource.read(converter.resource)
+	index = _resource_index(converter)
 
 	case = converter.case
 	if case is None:
@@ -303,29 +732,41 @@ def generate_makefile(converter):
 		output_dir = f'--output-dir {output_dir}'
 
 
+	_resource_output_check(converter, index)
+
+	dst_list = []
+
+	# Each output only depends on the input of its own resource, because
+	# "--convert-stale" only writes the outputs that are older than their
+	# own inputs.
 	makefile = ''
 
-	for section_id in resource.sections():
-		src = _filename_get(resource[section_id])
+	for section_id in _resource_section_list(converter, index):
+		section_ini = _resource_section(index, section_id)
+
+		src = index['section'][section_id]['file']
 		if src is None:
 			src = ''
 
-		resource_name = _resource_name(section_id)
-		resource_type = _resource_type(section_id)
-		if resource_type is None:
-			_log_warning(converter, f'Not a resource section: "{section_id}"')
-			continue
-		if resource_type not in converter.output_ext:
-			_log_warning(converter, f'Unknown resource type: {resource_type}')
-			continue
+		for dst in _section_output_files(converter, section_id, section_ini):
+			dst_list.append(dst)
+			makefile += f'{dst}: {converter.resource} {src}\n'
 
-		dst = _output_filename(converter, section_id)
+	# All the resources are converted by a single process.  The grouped
+	# target ("&:") requires GNU Make 4.3 or newer.
+	if len(dst_list) > 0:
+		dst = ' '.join(dst_list)
 
 		makefile += textwrap.dedent(f'''\
-		{dst}: {converter.resource} {src}
-			$(ConverterX16) --convert-{resource_type} {resource_name}
+		{dst} &: {converter.resource}
+			$(ConverterX16) {case} {output_dir} --convert-stale --depfile
 		''')
-	
+
+	# The dependency files add the files that are referenced by other files,
+	# like tile images, to the prerequisites of each output.
+	for dst in dst_list:
+		makefile += f'-include {dst}.d\n'
+
 	filename = ".ConverterX16.Makefile."
 	output = open(filename, "w")
 	output.write(makefile)
@@ -338,27 +779,223 @@ def generate_makefile(converter):
 
 ################################################################################
 # Convert all resources
+#
+# An error in one resource does not stop the other resources from being
+# converted.  The number of resources that failed is returned.
 def convert(converter, section_list):
 	_log_info(converter, f'Building Resources: {section_list}')
 
-	resource = configparser.ConfigParser()
-	resource.read(converter.resource)
+	index = _resource_index(converter)
+
+	if converter.layout is None:
+		converter.layout = _layout_read(converter)
+
+	# Sections that write the same file as another section are not converted
+	error_count = 0
+	shared = _resource_output_shared(converter, index)
+	for section_id in [ section_id for section_id in section_list if section_id in shared ]:
+		filename, other_id = shared[section_id]
+		_log_section_error(section_id, f'"{filename}" is also written by "[{other_id}]"')
+		error_count += 1
+	section_list = [ section_id for section_id in section_list if section_id not in shared ]
+
+	# The bundles copy the other outputs, so they are converted last
+	bundle_list  = [ section_id for section_id in section_list if _resource_type(section_id) == 'bundle' ]
+	section_list = [ section_id for section_id in section_list if _resource_type(section_id) != 'bundle' ]
+
+	if converter.jobs > 1 and len(section_list) > 1:
+		error_count += _convert_parallel(converter, index, section_list)
+	else:
+		error_count += _convert_serial(converter, index, section_list)
+
+	if _layout_is_used(converter, index):
+		try:
+			with _stats_stage(converter, 'layout'):
+				section_list = _layout_update(converter, index)
+		except ConverterError as error:
+			print(f"Error: {error}")
+			return error_count + 1
+
+		# The addresses were changed, convert again to use them
+		if len(section_list) > 0:
+			convert_stale = converter.convert_stale
+			converter.convert_stale = False
+			error_count += _convert_serial(converter, index, section_list)
+			converter.convert_stale = convert_stale
+
+	error_count += _convert_serial(converter, index, bundle_list)
+
+	return error_count
+
+
+################################################################################
+# Convert the resources, one at a time
+#
+# Any other exception is reported as the error of the section, with its
+# traceback, the same as when the sections are converted in parallel.
+def _convert_serial(converter, index, section_list):
+	import traceback
+
+	error_count = 0
 
 	for section_id in section_list:
-		_log_info(converter, f'Resource Name: "{_resource_name(section_id)}"')
-		_log_info(converter, f'Resource Type: "{_resource_type(section_id)}"')
+		try:
+			section_ini = _resource_section(index, section_id)
+			_convert_section(converter, section_id, section_ini)
+		except ConverterError as error:
+			_log_section_error(section_id, error)
+			error_count += 1
+		except Exception:
+			_log_section_error(section_id, traceback.format_exc().rstrip())
+			error_count += 1
 
-		section_ini = resource[section_id]
+	return error_count
 
-		resource_type = _resource_type(section_id)
-		if resource_type == 'bitmap':
-			_convert_bitmap(converter, section_id, section_ini)
-		elif resource_type == 'palette':
-			_convert_palette(converter, section_id, section_ini)
-		elif resource_type == 'tilemap':
-			_convert_tilemap(converter, section_id, section_ini)
-		elif resource_type == 'tileset':
-			_convert_tileset(converter, section_id, section_ini)
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Convert
+################################################################################
+
+################################################################################
+# Convert a resource section
+def _convert_section(converter, section_id, section_ini):
+	converter.stats_section = section_id
+
+	try:
+		with _stats_stage(converter, None):
+			_convert_section_run(converter, section_id, section_ini)
+	finally:
+		converter.stats_section = None
+
+	return
+
+
+################################################################################
+# Convert a resource section, unless it is up to date or in the cache
+def _convert_section_run(converter, section_id, section_ini):
+	_log_info(converter, f'Resource Name: "{_resource_name(section_id)}"')
+	_log_info(converter, f'Resource Type: "{_resource_type(section_id)}"')
+
+	_layout_apply(converter, section_id, section_ini)
+
+	output_list = _section_output_files(converter, section_id, section_ini)
+
+	if converter.stats is not None:
+		_stats_input_files(converter, section_id, section_ini)
+
+	if converter.depfile:
+		with _stats_stage(converter, 'depfile'):
+			_depfile_write(converter, section_id, section_ini, output_list)
+
+	if converter.convert_stale:
+		with _stats_stage(converter, 'stale'):
+			is_stale = _section_is_stale(converter, section_id, section_ini, output_list)
+
+		if not is_stale:
+			_stats_count(converter, 'up_to_date')
+			_log_info(converter, f'Up to date')
+
+			# GNU Make checks all the outputs of the grouped rule in the
+			# Makefile together, so they must all be newer than the inputs
+			# of every resource or the rule is run again.
+			if converter.depfile:
+				for filename in output_list:
+					os.utime(filename)
+			return
+
+	with _stats_stage(converter, 'cache'):
+		cache_key = _cache_key(converter, section_id, section_ini)
+		cache_hit = _cache_restore(converter, cache_key, output_list)
+
+	if cache_key is not None:
+		_stats_count(converter, 'cache_hit' if cache_hit else 'cache_miss')
+	if cache_hit:
+		return
+
+	resource_type = _resource_type(section_id)
+	if resource_type == 'bitmap':
+		_convert_bitmap(converter, section_id, section_ini)
+	elif resource_type == 'bundle':
+		_convert_bundle(converter, section_id, section_ini)
+	elif resource_type == 'layer':
+		_convert_layer(converter, section_id, section_ini)
+	elif resource_type == 'palette':
+		_convert_palette(converter, section_id, section_ini)
+	elif resource_type == 'sprite':
+		_convert_sprite(converter, section_id, section_ini)
+	elif resource_type == 'tilemap':
+		_convert_tilemap(converter, section_id, section_ini)
+	elif resource_type == 'tileset':
+		_convert_tileset(converter, section_id, section_ini)
+
+	with _stats_stage(converter, 'cache'):
+		_cache_store(converter, cache_key, output_list)
+
+	return
+
+
+################################################################################
+# Convert the resource sections using a pool of worker processes
+#
+# Each worker collects its messages and they are printed in the same order as
+# the sections, so that the output does not depend on which worker finishes
+# first.
+def _convert_parallel(converter, index, section_list):
+	import concurrent.futures
+
+	worker = argparse.Namespace(**vars(converter))
+	worker.jobs = 1
+	worker.image_cache       = {}
+	worker.image_cache_bytes = 0
+	worker.stats_data = {}
+
+	error_count = 0
+
+	with concurrent.futures.ProcessPoolExecutor(converter.jobs) as pool:
+		job_list = []
+		for section_id in section_list:
+			section_ini = _resource_section(index, section_id)
+			job = pool.submit(_convert_section_job, worker, section_id, section_ini)
+			job_list.append((section_id, job))
+
+		for section_id, job in job_list:
+			log, error, stats_data = job.result()
+			print(log, end = '')
+			_stats_merge(converter, stats_data)
+
+			if error is not None:
+				_log_section_error(section_id, error)
+				error_count += 1
+
+	return error_count
+
+
+################################################################################
+# Convert a resource section in a worker process
+#
+# The statistics of the section are returned so they can be added to the
+# statistics of the main process.  Any other exception is returned as the
+# error of the section, with its traceback, so that it does not stop the pool
+# and lose the other sections.
+def _convert_section_job(converter, section_id, section_ini):
+	import traceback
+
+	log   = io.StringIO()
+	error = None
+
+	with contextlib.redirect_stdout(log):
+		try:
+			_convert_section(converter, section_id, section_ini)
+		except ConverterError as exception:
+			error = exception
+		except Exception:
+			error = ConverterError(traceback.format_exc().rstrip())
+
+	return ( log.getvalue(), error, converter.stats_data )
 
 
 ################################################################################
@@ -372,19 +1009,14 @@ def convert(converter, section_list):
 ################################################################################
 # Get a Section ID list
 def get_section(converter, name, type):
-	resource = configparser.ConfigParser()
-	resource.read(converter.resource)
+	index = _resource_index(converter)
 
 	section_list = []
 
-	for section_id in resource.sections():
-		resource_name = _resource_name(section_id)
-		resource_type = _resource_type(section_id)
-
-		if resource_name == name and resource_type == type:
-			_log_debug(converter, f'Section ID: {section_id}')
-			section_list.append(section_id)
-			break
+	section_id = index['name_type'].get(f'{name} {type}')
+	if section_id is not None:
+		_log_debug(converter, f'Section ID: {section_id}')
+		section_list.append(section_id)
 
 	_log_debug(converter, f'Section List: {section_list}')
 
@@ -393,43 +1025,47 @@ def get_section(converter, name, type):
 
 	return section_list
 
-
 ################################################################################
 # Get Section ID list
 def get_section_all(converter_):
-	resource = configparser.ConfigParser()
-	resource.read(converter_.resource)
-
-	section_list = []
+	index = _resource_index(converter_)
 
-	for section_id in resource.sections():
-		resource_type = _resource_type(section_id)
-		if resource_type is None:
-			_log_warning(converter, f'Not a resource section: "{section_id}"')
-			continue
-		if resource_type not in converter.output_ext:
-			_log_warning(converter, f'Unknown resource type: {resource_type}')
-			continue
-		section_list.append(section_id)
+	section_list = _resource_section_list(converter_, index)
 
 	if len(section_list) == 0:
 		_error(f'No resources were found')
 
 	return section_list
 
+################################################################################
+# Get the Section ID list that was asked for on the command-line
+def get_section_list(converter):
+	if converter.convert_bitmap is not None:
+		return get_section(converter, converter.convert_bitmap, 'bitmap')
+	if converter.convert_bundle is not None:
+		return get_section(converter, converter.convert_bundle, 'bundle')
+	if converter.convert_layer is not None:
+		return get_section(converter, converter.convert_layer, 'layer')
+	if converter.convert_palette is not None:
+		return get_section(converter, converter.convert_palette, 'palette')
+	if converter.convert_sprite is not None:
+		return get_section(converter, converter.convert_sprite, 'sprite')
+	if converter.convert_tilemap is not None:
+		return get_section(converter, converter.convert_tilemap, 'tilemap')
+	if converter.convert_tileset is not None:
+		return get_section(converter, converter.convert_tileset, 'tileset')
+	if converter.convert_file is not None:
+		return get_sections_for_file(converter, converter.convert_file)
+
+	return get_section_all(converter)
 
 ################################################################################
 # Get a Section ID list
 def get_sections_for_file(converter_, filename_):
-	resource = configparser.ConfigParser()
-	resource.read(converter_.resource)
-
-	section_list = []
+	index = _resource_index(converter_)
 
-	for section_id in resource.sections():
-		filename = _filename_get(resource[section_id])
-		if filename == filename_:
-			section_list.append(section_id)
+	filename = _filename_normalize(filename_)
+	section_list = list(index['file'].get(filename, []))
 
 	if len(section_list) == 0:
 		_error(f'No resources use the file "{filename_}"')
@@ -458,103 +1094,567 @@ def _convert_bitmap(converter, section_id, section_ini):
 
 	_filename_set(section_ini, filename)
 
-	image = Image.open(filename)
+	with _stats_stage(converter, 'decode'):
+		image = _image_load(converter, filename)
 
 	_log_info(converter
-		, f"Format: {image.format}, " \
-		  f"Size: {image.size[0]}x{image.size[1]}, " \
-		  f"Color: {image.mode}"
+		, f"Format: {image['format']}, " \
+		  f"Size: {image['size'][0]}x{image['size'][1]}, " \
+		  f"Color: {image['mode']}"
 		)
 
-	if image.size[0] > 640 or image.size[1] > 480:
-		log_warning(converter, "Image maybe too large.")
+	# A larger bitmap has to be loaded in chunks
+	if image['size'][0] > 640 or image['size'][1] > 480:
+		if not _chunks_get(section_ini):
+			_log_warning(converter, "Image maybe too large.")
 
-	data = []
-	if image.format == 'GIF':
+	data = bytearray()
+	if image['format'] == 'GIF':
 		bits_per_pixel = _bits_per_pixel_get(section_ini)
-		data = _load_gif(image, bits_per_pixel)
+		with _stats_stage(converter, 'decode'):
+			pixels = _load_gif(image, bits_per_pixel)
+			_stats_count(converter, 'pixels', pixels.size)
+
+		with _stats_stage(converter, 'pack'):
+			data = _pixels_pack(pixels, bits_per_pixel)
 	else:
-		_error(f'Unsupported image type: {image.format}')
+		_error(f'Unsupported image type: {image["format"]}')
 	
 	address = _address_get(section_ini)
 	filename = _output_filename(converter, section_id)
-	_write_data(converter, address, data, filename)
-
-	return
+	_write_data(converter, address, data, filename, _compression_get(section_ini))
 
+	if _chunks_get(section_ini):
+		_convert_bitmap_chunks(converter, section_id, section_ini, data)
 
-################################################################################
-# }}}
-################################################################################
+	return
 
-################################################################################
-# {{{ Convert : Palette
-################################################################################
 
 ################################################################################
-# Determine the source of the palette data
-def _convert_palette(converter, section_id, section_ini):
-	data = []
-	filename = _filename_get(section_ini)
-	if filename is None:
-		data = _convert_palette_ini_section(converter, section_ini)
-	else:
-		_log_debug(converter, f'File: {filename}')
+# Write the bitmap again, cut in to chunks that are each one LOAD
+#
+# A chunk never crosses a 64 KiB Vera bank, or an 8 KiB high RAM bank, so it
+# can be loaded with its own 2 byte address.  The chunks are written as
+# "Foo-0.x16b", "Foo-1.x16b", ... and the index file lists them in load
+# order.
+#
+# Index:
+# - The number of chunks (1 byte)
+# - For each chunk (7 bytes):
+#   - The memory: 0 = RAM, 1 = Vera
+#   - The bank: The Vera bank (0 or 1) or the high RAM bank
+#   - The address (2 bytes)
+#   - The length (3 bytes)
+def _convert_bitmap_chunks(converter, section_id, section_ini, data):
+	chunk_list = _bitmap_chunk_list(section_ini, len(data))
+
+	index = bytearray([ len(chunk_list) ])
+	for number, chunk in enumerate(chunk_list):
+		address = ( chunk['address'] & 0xff, chunk['address'] >> 8 )
+		filename = _bitmap_chunk_filename(converter, section_id, number)
+		_write_data(converter
+			, address
+			, memoryview(data)[chunk['offset'] : chunk['offset'] + chunk['size']]
+			, filename
+			)
 
-		filename = _filename_normalize(filename)
-		_filename_validate(filename)
-		_filename_set(section_ini, filename)
+		index += bytes(( chunk['memory'], chunk['bank'] ))
+		index += chunk['address'].to_bytes(2, 'little')
+		index += chunk['size'].to_bytes(3, 'little')
 
-		ext = filename.split('.')[-1]
-		if ext == 'gif':
-			data = _convert_palette_gif(converter, section_ini)
-		elif ext == 'ini':
-			data = _convert_palette_ini(converter, section_ini)
-		else:
-			_error(f'Palette resources do not support file extension ".{ext}"')
+	_log_status(converter, f'Chunks: {len(chunk_list)}')
 
-	address = _address_get(section_ini)
-	filename = _output_filename(converter, section_id)
-	_write_data(converter, address, data, filename)
+	address = _address_get(section_ini, 'index_')
+	filename = _output_filename(converter, section_id, 'index')
+	_write_data(converter, address, index, filename)
 
 	return
 
 
 ################################################################################
-# Extract the palette information from the GIF and convert it to a format the
-# can be directly loaded into the CommanderX16's Vera chip
-def _convert_palette_gif(converter, section_ini):
-	data = []
-	filename = _filename_get(section_ini)
-	image = Image.open(filename)
-	palette = image.getpalette()
-	_log_debug(converter, f"Palette R,G.B,...: {palette}")
+# Cut the bitmap data in to chunks at the bank boundaries
+#
+# Returns a list of chunks, in load order:
+# { 'memory', 'bank', 'address', 'offset', 'size' }
+def _bitmap_chunk_list(section_ini, size):
+	if _compression_get(section_ini) != 'none':
+		_error('Chunks can not be used with Compression')
+
+	memory, _ = _layout_memory_get(section_ini, '', 'bitmap')
+
+	addr_lo, addr_hi = _address_get(section_ini)
+	address = (addr_hi << 8) | addr_lo
+	bank = _int_get(section_ini, 'address_bank', 0, 16)
+
+	if layout_region[memory][0] == 'ram':
+		if address < 0xa000 or address > 0xbfff:
+			_error('The address of a bitmap in high RAM must be $A000-$BFFF')
+		start      = (bank * layout_bank_size) + (address - 0xa000)
+		end        = 256 * layout_bank_size
+		chunk_size = layout_bank_size
+	else:
+		start      = (bank << 16) | address
+		end        = 0x20000
+		chunk_size = 0x10000
 
-	rgb_index = 0
-	r = 0
-	g = 0
-	b = 0
-	flip_flop = True
+	if start + size > end:
+		_error(f'The bitmap ({size} bytes at {start:05x}) does not fit in {memory}')
 
-	for c in palette:
-		if rgb_index == 0:
-			rgb_index += 1
-			r = c
-		elif rgb_index == 1:
-			rgb_index += 1
-			g = c
-		else:
-			rgb_index = 0
-			b = c
-			
-			byte = (g & 0xf0) | (b >> 4)
-			data.append(byte)
-			byte = (r & 0xf0) >> 4
-			data.append(byte)
+	chunk_list = []
+	offset = 0
+	while offset < size:
+		chunk_end = min(((start // chunk_size) + 1) * chunk_size, start + size - offset)
+		chunk_address = _layout_address(memory, start)
 
-	_log_debug(converter, f'Data BG,0R,...: {data}')
+		chunk_list.append(
+			{	'memory'  : 1 if layout_region[memory][0] == 'vram' else 0
+			,	'bank'    : chunk_address['bank']
+			,	'address' : chunk_address['address']
+			,	'offset'  : offset
+			,	'size'    : chunk_end - start
+			})
 
-	return data
+		offset += chunk_end - start
+		start = chunk_end
+
+	# The index has one byte for the number of chunks
+	if len(chunk_list) > 0xff:
+		_error(f'The bitmap needs {len(chunk_list)} chunks, the limit is 255')
+
+	return chunk_list
+
+
+################################################################################
+# Get the chunk files that a bitmap will be cut in to
+#
+# The number of chunks depends on the size of the image and its address, so
+# the size is read from the GIF header and the address from the layout.  The
+# image is not decoded, this is used by "--list-output-files" and
+# "--makefile".  Nothing is returned when the image can not be used,
+# converting it will report the error.
+def _bitmap_chunk_files(converter, section_id, section_ini):
+	filename = _filename_get(section_ini)
+	if filename is None:
+		return []
+
+	image_size = _gif_size(_filename_normalize(filename))
+	if image_size is None:
+		return []
+
+	if converter.layout is None:
+		converter.layout = _layout_read(converter)
+	_layout_apply(converter, section_id, section_ini)
+
+	width, height = image_size
+	try:
+		size = _pixels_pack_size(width * height, _bits_per_pixel_get(section_ini))
+		chunk_list = _bitmap_chunk_list(section_ini, size)
+	except ConverterError:
+		return []
+
+	return [ _bitmap_chunk_filename(converter, section_id, number) for number in range(len(chunk_list)) ]
+
+
+################################################################################
+# Get the width and height of a GIF from its header
+#
+# Returns None when the file can not be read or is not a GIF.
+def _gif_size(filename):
+	try:
+		with open(filename, 'rb') as gif_file:
+			header = gif_file.read(10)
+	except OSError:
+		return None
+
+	if len(header) < 10 or header[0:6] not in ( b'GIF87a', b'GIF89a' ):
+		return None
+
+	return struct.unpack('<HH', header[6:10])
+
+
+################################################################################
+# Get the file name of a bitmap chunk, "Foo-NUMBER.x16b"
+def _bitmap_chunk_filename(converter, section_id, number):
+	root, ext = os.path.splitext(_output_filename(converter, section_id))
+
+	return f'{root}-{number}{ext}'
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Convert : Bundle
+################################################################################
+#
+# A bundle is all the output files of some resources in one file, so that a
+# program only has to open one file.  The bundle does not have the 2 byte
+# address header, it starts with a directory:
+#
+#   Count   : 2 bytes, the number of entries
+#   Entry   : 12 bytes for each output file
+#     Hash    : 2 bytes, the hash of the output file name
+#     Offset  : 3 bytes, where the data starts in the bundle
+#     Length  : 3 bytes, the size of the data
+#     Memory  : 1 byte, 0 = RAM, 1 = Vera
+#     Bank    : 1 byte, the RAM bank or the Vera address bit 16
+#     Address : 2 bytes, the address from the output file header
+#
+# The data of each output file follows the directory, in the same order, so
+# the bundle can be read from start to end.  All values are little-endian.
+#
+################################################################################
+
+bundle_entry_size = 12
+
+
+################################################################################
+# Copy the output files of the resources in to a bundle
+def _convert_bundle(converter, section_id, section_ini):
+	align = _int_get(section_ini, 'align', 1)
+	if align < 1:
+		_error('Align must be 1 or more')
+
+	entry_list = []
+	for member_id in _bundle_member_list(converter, section_id, section_ini):
+		_log_info(converter, f'Resource: {member_id}')
+		entry_list.extend(_bundle_entry_list(converter, member_id))
+
+	if len(entry_list) > 0xffff:
+		_error(f'A bundle can not have more than 65535 files')
+
+	hash_list = {}
+	for entry in entry_list:
+		name = hash_list.setdefault(entry['hash'], entry['name'])
+		if name != entry['name']:
+			_log_warning(converter, f'Bundle: "{name}" and "{entry["name"]}" have the same hash {entry["hash"]:04x}')
+
+	offset = 2 + (len(entry_list) * bundle_entry_size)
+	for entry in entry_list:
+		offset += -offset % align
+		entry['offset'] = offset
+		offset += len(entry['data'])
+
+	if offset > 0xffffff:
+		_error(f'The bundle is {offset} bytes, the limit is 16 MiB')
+
+	data = bytearray(offset)
+	data[0:2] = len(entry_list).to_bytes(2, 'little')
+
+	position = 2
+	for entry in entry_list:
+		data[position:position + bundle_entry_size] = \
+			  entry['hash'].to_bytes(2, 'little') \
+			+ entry['offset'].to_bytes(3, 'little') \
+			+ len(entry['data']).to_bytes(3, 'little') \
+			+ bytes(( entry['memory'], entry['bank'] )) \
+			+ entry['address'].to_bytes(2, 'little')
+		position += bundle_entry_size
+
+		data[entry['offset']:entry['offset'] + len(entry['data'])] = entry['data']
+
+		_log_info(converter
+			, f'Entry: {entry["name"]}, Hash: {entry["hash"]:04x}, ' \
+			  f'Offset: {entry["offset"]:06x}, Length: {len(entry["data"])}'
+			)
+
+	filename = _output_filename(converter, section_id)
+	_write_data(converter, None, data, filename)
+
+	return
+
+
+################################################################################
+# Get the Section IDs of the resources in a bundle
+#
+# "Resources" is a list of Section IDs, separated by commas or new lines.
+# Without it, all the resources that are not bundles are used.
+def _bundle_member_list(converter, section_id, section_ini):
+	index = _resource_index(converter)
+
+	if 'resources' not in section_ini:
+		member_list = []
+		for member_id, section in index['section'].items():
+			if section['type'] in converter.output_ext and section['type'] != 'bundle':
+				member_list.append(member_id)
+
+		return member_list
+
+	member_list = []
+	for member_id in section_ini['resources'].replace(',', '\n').split('\n'):
+		member_id = ' '.join(member_id.split())
+		if len(member_id) == 0:
+			continue
+
+		if member_id not in index['section']:
+			_error(f'Resource "[{member_id}]" not found')
+
+		resource_type = _resource_type(member_id)
+		if resource_type not in converter.output_ext or resource_type == 'bundle':
+			_error(f'"[{member_id}]" can not be in a bundle')
+
+		member_list.append(member_id)
+
+	return member_list
+
+
+################################################################################
+# Get the directory entries of the output files of a resource
+#
+# The memory and bank come from the resource options, the same way that the
+# layout uses them.
+def _bundle_entry_list(converter, member_id):
+	member_ini = _resource_section(_resource_index(converter), member_id)
+	_layout_apply(converter, member_id, member_ini)
+
+	entry_list = []
+	for prefix, filename, kind in _layout_output_list(converter, member_id, member_ini):
+		if not os.path.exists(filename):
+			_error(f'"{filename}" was not converted')
+
+		with _stats_stage(converter, 'read'):
+			with open(filename, 'rb') as member_file:
+				header = member_file.read(2)
+				data   = member_file.read()
+			_stats_count(converter, 'files_opened')
+
+		if len(header) < 2:
+			_error(f'"{filename}" does not have an address')
+
+		memory, _ = _layout_memory_get(member_ini, prefix, kind)
+		name = os.path.basename(filename)
+
+		entry_list.append(
+			{	'name'    : name
+			,	'hash'    : _bundle_hash(name)
+			,	'memory'  : 1 if layout_region[memory][0] == 'vram' else 0
+			,	'bank'    : _int_get(member_ini, f'{prefix}address_bank', 0, 16) & 0xff
+			,	'address' : int.from_bytes(header, 'little')
+			,	'data'    : data
+			})
+
+	return entry_list
+
+
+################################################################################
+# Get the 16-bit hash of an output file name
+#
+# The hash is 32-bit FNV-1a with the high and low halves combined.
+def _bundle_hash(name):
+	value = 0x811c9dc5
+	for byte in name.encode():
+		value = ((value ^ byte) * 0x01000193) & 0xffffffff
+
+	return (value >> 16) ^ (value & 0xffff)
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Convert : Layer
+################################################################################
+
+################################################################################
+# Cut an image into tiles and write the tileset and the tilemap
+def _convert_layer(converter, section_id, section_ini):
+	filename = _filename_get(section_ini)
+	if filename is None:
+		_error(f'Ini Key "File" not found')
+
+	_log_info(converter, f'File: {filename}')
+
+	filename = _filename_normalize(filename)
+	_filename_validate(filename)
+	_filename_set(section_ini, filename)
+
+	bits_per_pixel = _bits_per_pixel_get(section_ini)
+	tile_width     = _tile_size_get(section_ini, 'tile_width')
+	tile_height    = _tile_size_get(section_ini, 'tile_height')
+
+	sub_palettes = _sub_palettes_get(section_ini, bits_per_pixel)
+	pixels = _stats_load_tile(converter, filename, 8 if sub_palettes else bits_per_pixel)
+
+	_log_info(converter
+		, f"Size: {pixels.shape[1]}x{pixels.shape[0]}, " \
+		  f"Tile: {tile_width}x{tile_height}"
+		)
+
+	tile_list = _pixels_slice(filename, pixels, tile_width, tile_height)
+	map_width = pixels.shape[1] // tile_width
+
+	if sub_palettes:
+		with _stats_stage(converter, 'quantize'):
+			tile_list, tile_palette, color_list = _subpalette_assign(converter, filename, tile_list)
+		palette_first = _subpalette_write(converter, section_id, section_ini, filename, color_list)
+
+	deduplicate = _deduplicate_get(section_ini, 'yes')
+	if deduplicate == 'no':
+		tilemap = bytearray()
+		for tile_index in range(len(tile_list)):
+			tilemap.extend(_tilemap_entry(tile_index, 0, 0, 0))
+	else:
+		with _stats_stage(converter, 'deduplicate'):
+			tile_list, tilemap = _tiles_deduplicate(converter, tile_list, deduplicate == 'yes')
+
+	if sub_palettes:
+		tilemap = _subpalette_tilemap(tilemap, tile_palette + palette_first)
+
+	tile_max_count = 0x3ff
+	if len(tile_list) > (tile_max_count + 1):
+		_error(f'{filename} has {len(tile_list)} tiles, the maximum is {tile_max_count + 1}')
+
+	tilemap = _tilemap_pad(tilemap, map_width, _map_width_get(section_ini, map_width))
+
+	with _stats_stage(converter, 'pack'):
+		data = _tiles_pack(tile_list, bits_per_pixel)
+
+	address = _address_get(section_ini)
+	filename = _output_filename(converter, section_id)
+	_write_data(converter, address, data, filename, _compression_get(section_ini))
+
+	address = _address_get(section_ini, 'map_')
+	filename = _output_filename(converter, section_id, 'tilemap')
+	_write_data(converter, address, tilemap, filename, _compression_get(section_ini))
+
+	return
+
+
+################################################################################
+# Pad the rows of the tilemap to the width of the VERA layer
+#
+# The padding entries use tile 0.
+def _tilemap_pad(tilemap, width, map_width):
+	if map_width == width:
+		return tilemap
+
+	row_size = width * 2
+	padding = bytes(_tilemap_entry(0, 0, 0, 0)) * (map_width - width)
+
+	data = bytearray()
+	for row in range(0, len(tilemap), row_size):
+		data.extend(tilemap[row:row + row_size])
+		data.extend(padding)
+
+	return data
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Convert : Palette
+################################################################################
+
+################################################################################
+# Determine the source of the palette data
+def _convert_palette(converter, section_id, section_ini):
+	data = bytearray()
+	filename = _filename_get(section_ini)
+	if filename is None:
+		with _stats_stage(converter, 'pack'):
+			data = _convert_palette_ini_section(converter, section_ini)
+	else:
+		_log_debug(converter, f'File: {filename}')
+
+		filename = _filename_normalize(filename)
+		_filename_validate(filename)
+		_filename_set(section_ini, filename)
+
+		ext = filename.split('.')[-1]
+		if _palette_is_quantized(section_ini):
+			data = _convert_palette_quantize(converter, section_id, section_ini)
+		elif ext == 'gif':
+			data = _convert_palette_gif(converter, section_ini)
+		elif ext == 'ini':
+			data = _convert_palette_ini(converter, section_ini)
+		else:
+			_error(f'Palette resources do not support file extension ".{ext}"')
+
+	address = _address_get(section_ini)
+	filename = _output_filename(converter, section_id)
+	_write_data(converter, address, data, filename, _compression_get(section_ini))
+
+	return
+
+
+################################################################################
+# Extract the palette information from the GIF and convert it to a format the
+# can be directly loaded into the CommanderX16's Vera chip
+def _convert_palette_gif(converter, section_ini):
+	data = bytearray()
+	filename = _filename_get(section_ini)
+	with _stats_stage(converter, 'decode'):
+		palette = _image_load(converter, filename)['palette']
+	_log_debug(converter, f"Palette R,G.B,...: {list(palette)}")
+
+	rgb_index = 0
+	r = 0
+	g = 0
+	b = 0
+	flip_flop = True
+
+	for c in palette:
+		if rgb_index == 0:
+			rgb_index += 1
+			r = c
+		elif rgb_index == 1:
+			rgb_index += 1
+			g = c
+		else:
+			rgb_index = 0
+			b = c
+			
+			byte = (g & 0xf0) | (b >> 4)
+			data.append(byte)
+			byte = (r & 0xf0) >> 4
+			data.append(byte)
+
+	_log_debug(converter, f'Data BG,0R,...: {list(data)}')
+
+	return data
+
+
+################################################################################
+# Reduce the colors of a truecolor image to a Vera palette
+#
+# The palette is returned and the image, now using the palette indexes, is
+# written as a bitmap.
+def _convert_palette_quantize(converter, section_id, section_ini):
+	filename = _filename_get(section_ini)
+	color_count = _colors_get(section_ini)
+
+	with _stats_stage(converter, 'decode'):
+		rgb, opaque = _load_rgb(filename)
+		_stats_count(converter, 'files_opened')
+		_stats_count(converter, 'pixels', rgb.size)
+
+	_log_info(converter
+		, f"Size: {rgb.shape[1]}x{rgb.shape[0]}, " \
+		  f"Colors: {color_count}"
+		)
+
+	with _stats_stage(converter, 'quantize'):
+		palette, pixels = _quantize(rgb, opaque, color_count)
+	_log_debug(converter, f'Palette 0RGB,...: {[f"{color:03x}" for color in palette]}')
+
+	bits_per_pixel = { 4: 2, 16: 4, 256: 8 }[color_count]
+	with _stats_stage(converter, 'pack'):
+		data = _pixels_pack(pixels, bits_per_pixel)
+
+	address = _address_get(section_ini, 'bitmap_')
+	filename = _output_filename(converter, section_id, 'bitmap')
+	_write_data(converter, address, data, filename, _compression_get(section_ini))
+
+	data = bytearray(color_count * 2)
+	for index, color in enumerate(palette):
+		data[index * 2]     = color & 0x0ff
+		data[index * 2 + 1] = color >> 8
+
+	return data
 
 
 ################################################################################
@@ -563,15 +1663,15 @@ def _convert_palette_gif(converter, section_ini):
 def _convert_palette_ini(converter, section_ini):
 	filename = _filename_get(section_ini)
 
-	file_ini = configparser.ConfigParser()
-	file_ini.read(filename)
+	file_ini = _stats_read_ini(converter, filename)
 
 	if 'Palette' not in file_ini:
 		_error(f'{filename} does not contain a "Palette" section')
 
 	section_ini = file_ini['Palette']
 
-	data = _convert_palette_ini_section(converter, section_ini)
+	with _stats_stage(converter, 'pack'):
+		data = _convert_palette_ini_section(converter, section_ini)
 
 	return data
 
@@ -588,11 +1688,14 @@ def _convert_palette_ini_section(converter, section_ini):
 	
 	rgb_max_count = 0xff
 
-	data = []
+	data = bytearray()
 	done = False
 	while not done:
 		row = section_ini[index]
 		for rgb in row.split():
+			if len(rgb) != 3 or any(digit not in '0123456789abcdefABCDEF' for digit in rgb):
+				_error(f'Palette: "{rgb}" is not a 3 digit hex color')
+
 			byte = (int(rgb[0], 16) << 4) | int(rgb[1], 16)
 			data.append(byte)
 			byte = int(rgb[2], 16)
@@ -609,11 +1712,108 @@ def _convert_palette_ini_section(converter, section_ini):
 			_log_warning(converter, f'Number of RGB values exceeds the maximum of {rgb_max_count}')
 			break
 	
-	_log_debug(converter, f'data: {data}')
+	_log_debug(converter, f'data: {list(data)}')
 
 	return data
 
 
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Convert : Sprite
+################################################################################
+
+################################################################################
+# Cut a sprite sheet in to frames and write the frames and the frame table
+#
+# The sheet is loaded once, the frames are views of its pixels.
+def _convert_sprite(converter, section_id, section_ini):
+	filename = _filename_get(section_ini)
+	if filename is None:
+		_error(f'Ini Key "File" not found')
+
+	_log_info(converter, f'File: {filename}')
+
+	filename = _filename_normalize(filename)
+	_filename_validate(filename)
+	_filename_set(section_ini, filename)
+
+	bits_per_pixel = _bits_per_pixel_get(section_ini)
+	valid_depths = (4, 8)
+	if bits_per_pixel not in valid_depths:
+		_error(f'Sprite BitsPerPixel must be one of {valid_depths}')
+
+	valid_sizes  = (8, 16, 32, 64)
+	frame_width  = _tile_size_get(section_ini, 'frame_width', valid_sizes)
+	frame_height = _tile_size_get(section_ini, 'frame_height', valid_sizes)
+
+	pixels = _stats_load_tile(converter, filename, bits_per_pixel)
+
+	_log_info(converter
+		, f"Size: {pixels.shape[1]}x{pixels.shape[0]}, " \
+		  f"Frame: {frame_width}x{frame_height}"
+		)
+
+	frame_list = _pixels_slice(filename, pixels, frame_width, frame_height, _order_get(section_ini))
+	frame_list = _tiles_range(filename, frame_list, section_ini, 'frame_')
+
+	deduplicate = _deduplicate_get(section_ini, 'exact')
+	if deduplicate == 'yes':
+		_error('Sprites can only use Deduplicate "no" or "exact"')
+
+	frame_index_list = list(range(len(frame_list)))
+	if deduplicate == 'exact':
+		frame_count = len(frame_list)
+		with _stats_stage(converter, 'deduplicate'):
+			frame_list, match_list = _tiles_unique(frame_list, False)
+		frame_index_list = [ frame_index for frame_index, _, _ in match_list ]
+		_log_info(converter, f'Frames: {frame_count}, Unique: {len(frame_list)}')
+
+	address = _address_get(section_ini)
+	vram_address = _address_vram_get(section_ini)
+	if (vram_address & 0x1f) != 0:
+		_error(f'Sprite address {vram_address:05x} is not a multiple of 32')
+
+	frame_size = _pixels_pack_size(frame_width * frame_height, bits_per_pixel)
+	table = _sprite_frame_table(vram_address, frame_size, bits_per_pixel, frame_index_list)
+
+	with _stats_stage(converter, 'pack'):
+		data = _tiles_pack(frame_list, bits_per_pixel)
+
+	filename = _output_filename(converter, section_id)
+	_write_data(converter, address, data, filename, _compression_get(section_ini))
+
+	address = _address_get(section_ini, 'table_')
+	filename = _output_filename(converter, section_id, 'frame')
+	_write_data(converter, address, table, filename)
+
+	return
+
+
+################################################################################
+# Make the frame table
+#
+# Each entry is the same as bytes 0 and 1 of the Vera sprite attributes:
+#   Byte 0: Address (12:5)
+#   Byte 1: Mode (7), Address (16:13)
+# Mode is 0 for 4bpp and 1 for 8bpp.
+def _sprite_frame_table(vram_address, frame_size, bits_per_pixel, frame_index_list):
+	mode = 0x80 if bits_per_pixel == 8 else 0x00
+
+	table = bytearray(len(frame_index_list) * 2)
+	for entry, frame_index in enumerate(frame_index_list):
+		address = vram_address + (frame_index * frame_size)
+		if address > 0x1ffff:
+			_error(f'Sprite frame {entry} address {address:05x} is outside of Vera memory')
+
+		table[entry * 2]     = (address >> 5) & 0xff
+		table[entry * 2 + 1] = ((address >> 13) & 0x0f) | mode
+
+	return table
+
+
 ################################################################################
 # }}}
 ################################################################################
@@ -625,10 +1825,12 @@ def _convert_palette_ini_section(converter, section_ini):
 ################################################################################
 # Determine the source of the tilemap data
 def _convert_tilemap(converter, section_id, section_ini):
-	data = []
+	data = bytearray()
 	filename = _filename_get(section_ini)
 	if filename is None:
-		data = _convert_tilemap_ini_section(converter, section_ini)
+		with _stats_stage(converter, 'pack'):
+			data = _convert_tilemap_ini_section(converter, section_ini)
+		width = _tilemap_ini_width(section_ini)
 	else:
 		_log_debug(converter, f'File: {filename}')
 
@@ -636,15 +1838,20 @@ def _convert_tilemap(converter, section_id, section_ini):
 		_filename_validate(filename)
 		_filename_set(section_ini, filename)
 
-		ext = filename.split('.')[-1]
+		ext = filename.split('.')[-1].lower()
 		if ext == 'ini':
-			data = _convert_tilemap_ini(converter, section_ini)
+			data, width = _convert_tilemap_ini(converter, section_ini)
+		elif ext in ('csv', 'json', 'tmj', 'tmx'):
+			data, width = _convert_tilemap_tiled(converter, section_ini)
 		else:
 			_error(f'Tilemap resources do not support file extension ".{ext}"')
 
+	if _strips_get(section_ini):
+		data = _convert_tilemap_strips(converter, section_id, section_ini, data, width)
+
 	address = _address_get(section_ini)
 	filename = _output_filename(converter, section_id)
-	_write_data(converter, address, data, filename)
+	_write_data(converter, address, data, filename, _compression_get(section_ini))
 
 	return
 
@@ -655,56 +1862,42 @@ def _convert_tilemap_ini(converter, section_ini):
 	_log_debug(converter, f'Tilemap: {[option for option in section_ini]}')
 	filename = _filename_get(section_ini)
 
-	file_ini = configparser.ConfigParser()
-	file_ini.read(filename)
+	file_ini = _stats_read_ini(converter, filename)
 
 	if 'Tilemap' not in file_ini:
 		_error(f'{filename} does not contain a "Tilemap" section')
 
 	section_ini = file_ini['Tilemap']
 
-	data = _convert_tilemap_ini_section(converter, section_ini)
+	with _stats_stage(converter, 'pack'):
+		data = _convert_tilemap_ini_section(converter, section_ini)
 
-	return data
+	return ( data, _tilemap_ini_width(section_ini) )
 
 
 
 ################################################################################
 # Convert the tilemap data
+#
+# Each row has groups of 4 hex values: the tile index, the palette offset, the
+# V-Flip, and the H-Flip.  A group that is not complete is ignored.
 def _convert_tilemap_ini_section(converter, section_ini):
+	import numpy
+
 	_log_debug(converter, f'Tilemap: {[option for option in section_ini]}')
 
 	index = '00'
 	if index not in section_ini:
 		_error(f'Palette: Unable to locate the first index "{index}"')
 	
-	data = []
+	value_list = []
 	while True:
 		next_index = int(index, 16) + 1
 		if next_index > 0x3ff:
 			break
 
-		field = 0
-		for tile_info in section_ini[index].split():
-			if field == 0:
-				field += 1
-				tile_index = int(tile_info, 16)
-			elif field == 1:
-				field += 1
-				palette_offset = int(tile_info, 16)
-			elif field == 2:
-				field += 1
-				v_flip = int(tile_info, 16)
-			else:
-				field = 0
-				h_flip = int(tile_info, 16)
-				byte = (tile_index & 0x00ff)
-				data.append(byte)
-				byte = (palette_offset << 4)
-				byte |= (v_flip << 3)
-				byte |= (h_flip << 3)
-				byte |= ((tile_index >> 8) & 0x0003)
-				data.append(byte)
+		row = section_ini[index].split()
+		value_list.extend(row[:len(row) - (len(row) % 4)])
 
 		index = '{0:0{1}x}'.format(next_index, 2)
 		_log_debug(converter, f'index: {index}')
@@ -712,203 +1905,3348 @@ def _convert_tilemap_ini_section(converter, section_ini):
 			_log_info(converter, f'Tilemap: Unable to locate index {index}, assuming done')
 			break
 
-	_log_debug(converter, f'data: {data}')
+	try:
+		value = numpy.array([ int(tile_info, 16) for tile_info in value_list ], dtype = numpy.int64)
+	except ValueError as error:
+		_error(f'Tilemap: {error}')
+
+	value = value.reshape(-1, 4)
+	data = _tilemap_pack(value[:, 0], value[:, 1], value[:, 2], value[:, 3])
+
+	_log_debug(converter, f'data: {list(data)}')
+
+	return data
+
+
+################################################################################
+# Get the number of tiles in the first row of an INI tilemap
+def _tilemap_ini_width(section_ini):
+	return len(section_ini.get('00', '').split()) // 4
+
+
+################################################################################
+# Convert a tilemap that was made with Tiled
+#
+# Tiled JSON (.json, .tmj) and TMX (.tmx) maps use the tile layer named by the
+# "Layer" key, or the first tile layer.  A CSV file (.csv) is one layer, the
+# same as the Tiled CSV export.
+#
+# Returns the tilemap data and its width.
+def _convert_tilemap_tiled(converter, section_ini):
+	filename = _filename_get(section_ini)
+	ext = filename.split('.')[-1].lower()
+
+	layer_name = section_ini.get('layer')
+
+	with _stats_stage(converter, 'decode'):
+		if ext == 'csv':
+			gid, first_gid = _tiled_read_csv(filename)
+		elif ext == 'tmx':
+			gid, first_gid = _tiled_read_tmx(filename, layer_name)
+		else:
+			gid, first_gid = _tiled_read_json(filename, layer_name)
+		_stats_count(converter, 'files_opened')
+
+	height, width = gid.shape
+	_log_info(converter, f'Size: {width}x{height}')
+
+	palette_offset = _int_get(section_ini, 'palette_offset', 0, 16)
+	empty_tile     = _int_get(section_ini, 'empty_tile', 0, 16)
+
+	with _stats_stage(converter, 'pack'):
+		data = _tiled_entries(filename, gid, first_gid, palette_offset, empty_tile)
+		if not _strips_get(section_ini):
+			data = _tilemap_pad(data, width, _map_width_get(section_ini, width))
+
+	return ( data, width )
+
+
+################################################################################
+# Read a CSV file of tile indexes
+#
+# An empty cell is -1, and the flip flags are in the high bits of the index.
+# The indexes are changed in to Tiled global IDs (index + 1) so that all the
+# Tiled formats are handled the same way.
+def _tiled_read_csv(filename):
+	import numpy
+
+	row_list = []
+	with open(filename, 'r') as csv_file:
+		for line in csv_file:
+			row = [ value for value in line.strip().split(',') if len(value.strip()) > 0 ]
+			if len(row) > 0:
+				row_list.append(row)
+
+	if len(row_list) == 0:
+		_error(f'{filename} does not have any tiles')
+
+	width = len(row_list[0])
+	for row_index, row in enumerate(row_list):
+		if len(row) != width:
+			_error(f'{filename}: Row {row_index} has {len(row)} tiles, expected {width}')
+
+	try:
+		value = numpy.array(row_list, dtype = numpy.int64)
+	except ValueError as error:
+		_error(f'{filename}: {error}')
+
+	gid = numpy.where(value < 0, 0, (value & 0xe0000000) | ((value & 0x1fffffff) + 1))
+
+	return ( gid.astype(numpy.uint32), 1 )
+
+
+################################################################################
+# Read a tile layer from a Tiled JSON map
+def _tiled_read_json(filename, layer_name):
+	import numpy
+
+	try:
+		with open(filename, 'r') as json_file:
+			tiled = json.load(json_file)
+	except ValueError as error:
+		_error(f'{filename}: {error}')
+
+	if tiled.get('infinite', False):
+		_error(f'{filename}: Infinite maps are not supported')
+
+	layer_list = []
+	_tiled_json_layers(tiled.get('layers', []), layer_list)
+
+	layer = _tiled_layer_find(filename, layer_list, layer_name, lambda layer: layer.get('name'))
+
+	width  = int(layer['width'])
+	height = int(layer['height'])
+
+	data = layer.get('data', [])
+	if layer.get('encoding', 'csv') == 'base64':
+		gid = _tiled_decode(filename, data, layer.get('compression', ''))
+	else:
+		gid = numpy.array(data, dtype = numpy.uint32)
+
+	return ( _tiled_shape(filename, gid, width, height), _tiled_first_gid(tiled.get('tilesets', []), lambda tileset: tileset.get('firstgid')) )
+
+
+################################################################################
+# Get all the tile layers of a Tiled JSON map, including those in groups
+def _tiled_json_layers(layers, layer_list):
+	for layer in layers:
+		if layer.get('type') == 'tilelayer':
+			layer_list.append(layer)
+		elif layer.get('type') == 'group':
+			_tiled_json_layers(layer.get('layers', []), layer_list)
+
+	return
+
+
+################################################################################
+# Read a tile layer from a Tiled TMX map
+def _tiled_read_tmx(filename, layer_name):
+	import numpy
+	import xml.etree.ElementTree
+
+	try:
+		tiled = xml.etree.ElementTree.parse(filename).getroot()
+	except xml.etree.ElementTree.ParseError as error:
+		_error(f'{filename}: {error}')
+
+	if tiled.get('infinite', '0') == '1':
+		_error(f'{filename}: Infinite maps are not supported')
+
+	layer = _tiled_layer_find(filename, list(tiled.iter('layer')), layer_name, lambda layer: layer.get('name'))
+
+	width  = int(layer.get('width'))
+	height = int(layer.get('height'))
+
+	data = layer.find('data')
+	if data is None:
+		_error(f'{filename}: Layer "{layer.get("name")}" does not have any data')
+
+	encoding = data.get('encoding')
+	if encoding is None:
+		gid = numpy.array([ int(tile.get('gid', '0')) for tile in data.iter('tile') ], dtype = numpy.uint32)
+	elif encoding == 'csv':
+		gid = numpy.array([ int(value) for value in data.text.split(',') if len(value.strip()) > 0 ], dtype = numpy.uint32)
+	elif encoding == 'base64':
+		gid = _tiled_decode(filename, data.text.strip(), data.get('compression', ''))
+	else:
+		_error(f'{filename}: Unsupported encoding "{encoding}"')
+
+	return ( _tiled_shape(filename, gid, width, height), _tiled_first_gid(tiled.findall('tileset'), lambda tileset: tileset.get('firstgid')) )
+
+
+################################################################################
+# Find a tile layer by name, or the first layer if there is no name
+def _tiled_layer_find(filename, layer_list, layer_name, get_name):
+	if len(layer_list) == 0:
+		_error(f'{filename} does not have a tile layer')
+
+	if layer_name is None:
+		return layer_list[0]
+
+	for layer in layer_list:
+		if get_name(layer) == layer_name:
+			return layer
+
+	_error(f'{filename} does not have a tile layer named "{layer_name}"')
+
+
+################################################################################
+# Get the smallest first global ID of the tilesets
+#
+# The tiles of all the tilesets are numbered from 0, in the order of their
+# global IDs, so the tilesets can be put one after the other in Vera.
+def _tiled_first_gid(tileset_list, get_first_gid):
+	first_gid_list = [ int(get_first_gid(tileset)) for tileset in tileset_list if get_first_gid(tileset) is not None ]
+	if len(first_gid_list) == 0:
+		return 1
+
+	return min(first_gid_list)
+
+
+################################################################################
+# Decode the base64 data of a tile layer
+def _tiled_decode(filename, text, compression):
+	import base64
+	import numpy
+
+	data = base64.b64decode(text)
+
+	if compression in ( None, '' ):
+		pass
+	elif compression == 'zlib':
+		import zlib
+		data = zlib.decompress(data)
+	elif compression == 'gzip':
+		import gzip
+		data = gzip.decompress(data)
+	else:
+		_error(f'{filename}: Unsupported compression "{compression}"')
+
+	if (len(data) % 4) != 0:
+		_error(f'{filename}: The layer data is not a multiple of 4 bytes')
+
+	return numpy.frombuffer(data, dtype = '<u4').astype(numpy.uint32)
+
+
+################################################################################
+# Check the number of tiles and make the layer 2D
+def _tiled_shape(filename, gid, width, height):
+	if gid.size != (width * height):
+		_error(f'{filename}: The layer has {gid.size} tiles, expected {width}x{height}')
+
+	return gid.reshape(height, width)
+
+
+################################################################################
+# Make the tilemap entries from Tiled global IDs
+#
+# Bit 31 of a global ID is H-Flip and bit 30 is V-Flip.  Bit 29 (diagonal
+# flip) and bit 28 (hexagonal rotation) rotate the tile, which Vera can not
+# do.  A global ID of 0 is an empty cell, it uses "empty_tile".
+def _tiled_entries(filename, gid, first_gid, palette_offset, empty_tile):
+	import numpy
+
+	if (gid & 0x30000000).any():
+		_error(f'{filename} has tiles that are rotated, Vera can only flip tiles')
+
+	h_flip = (gid >> 31) & 1
+	v_flip = (gid >> 30) & 1
+
+	tile_index = (gid & 0x0fffffff).astype(numpy.int64)
+	empty = tile_index == 0
+
+	tile_index -= first_gid
+	tile_index[empty] = empty_tile
+	h_flip[empty] = 0
+	v_flip[empty] = 0
+
+	return _tilemap_pack(tile_index, palette_offset, v_flip, h_flip)
+
+
+################################################################################
+# Encode an array of tilemap entries, see _tilemap_entry()
+#
+# The values can be arrays or numbers.
+def _tilemap_pack(tile_index, palette_offset, v_flip, h_flip):
+	import numpy
+
+	tile_index     = numpy.asarray(tile_index, dtype = numpy.int64)
+	palette_offset = numpy.asarray(palette_offset, dtype = numpy.int64)
+	v_flip         = numpy.asarray(v_flip, dtype = numpy.int64)
+	h_flip         = numpy.asarray(h_flip, dtype = numpy.int64)
+
+	if tile_index.size > 0:
+		if tile_index.min() < 0 or tile_index.max() > 0x3ff:
+			_error(f'Tilemap: Tile index must be 000 to 3ff')
+		if palette_offset.min() < 0 or palette_offset.max() > 0xf:
+			_error(f'Tilemap: Palette offset must be 0 to f')
+		if v_flip.min() < 0 or v_flip.max() > 1 or h_flip.min() < 0 or h_flip.max() > 1:
+			_error(f'Tilemap: Flip must be 0 or 1')
+
+	entry = numpy.empty(tile_index.shape + (2,), dtype = numpy.uint8)
+	entry[..., 0] = tile_index & 0xff
+	entry[..., 1] = (palette_offset << 4) | (v_flip << 3) | (h_flip << 2) | ((tile_index >> 8) & 0x03)
+
+	return bytearray(entry.reshape(-1))
+
+
+################################################################################
+# Cut a large tilemap in to strips that are copied in to a Vera layer
+#
+# The Vera layer (Map_Width x Map_Height) is used as a ring buffer: tile
+# (x, y) of the world is always at (x % Map_Width, y % Map_Height) in the
+# layer.  When the view scrolls, the column or row that comes in to view is
+# copied from a strip record.
+#
+# Column Strip (one for each world column, "Foo.x16v"):
+#   ADDR_L, ADDR_M, ADDR_H | Map_Height bytes, byte 0 of each entry
+#   ADDR_L, ADDR_M, ADDR_H | Map_Height bytes, byte 1 of each entry
+# Row Strip (one for each world row, "Foo.x16h"):
+#   ADDR_L, ADDR_M, ADDR_H | Map_Width entries
+#
+# The 3 address bytes go to the Vera address registers, ADDR_H has the
+# increment so that the bytes that follow are written straight to DATA0.  A
+# column uses an increment of one layer row, so each byte of the entries is
+# written in its own pass.
+#
+# A world that is taller than the layer has one set of column strips for each
+# Map_Height rows (a band), the same for rows and Map_Width.  The records are
+# in band order, then column (or row) order, and all records in a file have
+# the same size.  The tilemap file is the layer with the top-left corner of
+# the world.
+def _convert_tilemap_strips(converter, section_id, section_ini, data, width):
+	import numpy
+
+	valid_sizes = (32, 64, 128, 256)
+	map_width  = _int_get(section_ini, 'map_width', 32)
+	map_height = _int_get(section_ini, 'map_height', 32)
+	if map_width not in valid_sizes or map_height not in valid_sizes:
+		_error(f'Map_Width and Map_Height must be one of {valid_sizes}')
+
+	if width == 0 or (len(data) % (width * 2)) != 0:
+		_error(f'Strips need every row of the tilemap to have the same width')
+
+	vram_address = _address_vram_get(section_ini)
+	if (vram_address % 512) != 0:
+		_error(f'Tilemap address {vram_address:05x} is not a multiple of 512')
+
+	with _stats_stage(converter, 'pack'):
+		world = numpy.frombuffer(bytes(data), dtype = numpy.uint8).reshape(-1, width, 2)
+		height = world.shape[0]
+
+		# Fill the last band with tile 0
+		band_width  = -(-width // map_width)
+		band_height = -(-height // map_height)
+		world = numpy.pad(world
+			, ( ( 0, band_height * map_height - height ), ( 0, band_width * map_width - width ), ( 0, 0 ) )
+			)
+		world_width = band_width * map_width
+
+		_log_info(converter
+			, f'World: {width}x{height}, Layer: {map_width}x{map_height}, ' \
+			  f'Bands: {band_width}x{band_height}'
+			)
+
+		# Column strips: ( band, column, byte, header + Map_Height )
+		column = numpy.empty(( band_height, world_width, 2, 3 + map_height ), dtype = numpy.uint8)
+		column[..., 3:] = world.reshape(band_height, map_height, world_width, 2).transpose(0, 2, 3, 1)
+
+		address = vram_address \
+			+ ((numpy.arange(world_width) % map_width) * 2)[:, None] \
+			+ numpy.arange(2)[None, :]
+		column[..., 0:3] = _vera_address_bytes(address, map_width * 2)
+
+		# Row strips: ( band, row, header + Map_Width entries )
+		row = numpy.empty(( band_width, band_height * map_height, 3 + (map_width * 2) ), dtype = numpy.uint8)
+		row[..., 3:] = world.reshape(band_height * map_height, band_width, map_width * 2).transpose(1, 0, 2)
+
+		address = vram_address + ((numpy.arange(band_height * map_height) % map_height) * map_width * 2)
+		row[..., 0:3] = _vera_address_bytes(address, 1)
+
+		_log_info(converter
+			, f'Column Strips: {band_height * world_width} x {column[0, 0].size} bytes, ' \
+			  f'Row Strips: {band_width * band_height * map_height} x {row[0, 0].size} bytes'
+			)
+
+	address = _address_get(section_ini, 'column_')
+	filename = _output_filename(converter, section_id, 'column')
+	_write_data(converter, address, bytearray(column.reshape(-1)), filename)
+
+	address = _address_get(section_ini, 'row_')
+	filename = _output_filename(converter, section_id, 'row')
+	_write_data(converter, address, bytearray(row.reshape(-1)), filename)
+
+	return bytearray(world[:map_height, :map_width].reshape(-1))
+
+
+################################################################################
+# The Vera address increments, bytes ==> ADDR_H bits 7:4
+vera_increment = \
+{	0   : 0x0, 1   : 0x1, 2   : 0x2, 4   : 0x3, 8   : 0x4, 16  : 0x5
+,	32  : 0x6, 64  : 0x7, 128 : 0x8, 256 : 0x9, 512 : 0xa, 40  : 0xb
+,	80  : 0xc, 160 : 0xd, 320 : 0xe, 640 : 0xf
+}
+
+
+################################################################################
+# Get the Vera address registers ( ADDR_L, ADDR_M, ADDR_H ) for addresses
+#
+# The increment is the number of bytes to move after each write.
+def _vera_address_bytes(address, increment):
+	import numpy
+
+	address = numpy.asarray(address)
+
+	return numpy.stack(
+		( address & 0xff
+		, (address >> 8) & 0xff
+		, ((address >> 16) & 0x01) | (vera_increment[increment] << 4)
+		), axis = -1)
+
+
+################################################################################
+# Encode a tilemap entry
+#
+# Byte 0: Tile Index (7:0)
+# Byte 1: Palette Offset (7:4), V-Flip (3), H-Flip (2), Tile Index (9:8)
+def _tilemap_entry(tile_index, palette_offset, v_flip, h_flip):
+	byte_0  = (tile_index & 0x00ff)
+	byte_1  = (palette_offset << 4)
+	byte_1 |= (v_flip << 3)
+	byte_1 |= (h_flip << 2)
+	byte_1 |= ((tile_index >> 8) & 0x0003)
+
+	return ( byte_0, byte_1 )
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Convert : Tileset
+################################################################################
+
+################################################################################
+# Determine the source of the tileset data
+def _convert_tileset(converter, section_id, section_ini):
+	sub_palettes = _sub_palettes_get(section_ini, _bits_per_pixel_get(section_ini))
+
+	tile_list = []
+	filename = _filename_get(section_ini)
+	if filename is None:
+		if sub_palettes:
+			_error('Sub_Palettes needs a tileset atlas image')
+		tile_list = _convert_tileset_ini_section(converter, section_ini)
+	else:
+		_log_debug(converter, f'File: {filename}')
+
+		filename = _filename_normalize(filename)
+		_filename_validate(filename)
+		_filename_set(section_ini, filename)
+
+		ext = filename.split('.')[-1]
+		if ext == 'ini':
+			if sub_palettes:
+				_error('Sub_Palettes needs a tileset atlas image')
+			tile_list = _convert_tileset_ini(converter, section_ini)
+		elif ext == 'gif':
+			tile_list = _convert_tileset_atlas(converter, section_ini)
+		else:
+			_error(f'Tileset resources do not support file extension ".{ext}"')
+
+	if sub_palettes:
+		with _stats_stage(converter, 'quantize'):
+			tile_list, tile_palette, color_list = _subpalette_assign(converter, filename, tile_list)
+		palette_first = _subpalette_write(converter, section_id, section_ini, filename, color_list)
+
+	deduplicate = _deduplicate_get(section_ini)
+	if deduplicate != 'no' or sub_palettes:
+		if deduplicate != 'no':
+			with _stats_stage(converter, 'deduplicate'):
+				tile_list, remap = _tiles_deduplicate(converter, tile_list, deduplicate == 'yes')
+		else:
+			remap = bytearray()
+			for tile_index in range(len(tile_list)):
+				remap.extend(_tilemap_entry(tile_index, 0, 0, 0))
+
+		if sub_palettes:
+			remap = _subpalette_tilemap(remap, tile_palette + palette_first)
+
+		address = _address_get(section_ini, 'remap_')
+		filename = _output_filename(converter, section_id, 'remap')
+		_write_data(converter, address, remap, filename)
+
+	bits_per_pixel = _bits_per_pixel_get(section_ini)
+	with _stats_stage(converter, 'pack'):
+		data = _tiles_pack(tile_list, bits_per_pixel)
+
+	address = _address_get(section_ini)
+	filename = _output_filename(converter, section_id)
+	_write_data(converter, address, data, filename, _compression_get(section_ini))
+
+	return
+
+
+################################################################################
+# Convert the tileset data
+def _convert_tileset_ini(converter, section_ini):
+	_log_debug(converter, f'Tileset: {[option for option in section_ini]}')
+	filename       = _filename_get(section_ini)
+
+	file_ini = _stats_read_ini(converter, filename)
+
+	if 'Tileset' not in file_ini:
+		_error(f'{filename} does not contain a "Tileset" section')
+
+	# Copy the Bits-Per-Pixel to the other INI file
+	bits_per_pixel = _bits_per_pixel_get(section_ini)
+
+	section_ini = file_ini['Tileset']
+
+	_bits_per_pixel_set(section_ini, bits_per_pixel)
+
+	tile_list = _convert_tileset_ini_section(converter, section_ini)
+
+	return tile_list
+
+
+################################################################################
+# Load the tile images of the tileset
+def _convert_tileset_ini_section(converter, section_ini):
+	_log_debug(converter, f'Tileset: {[option for option in section_ini]}')
+
+	index = '000'
+	if index not in section_ini:
+		_error(f'Palette: Unable to locate the first index "{index}"')
+	
+	bits_per_pixel = _bits_per_pixel_get(section_ini)
+	tile_max_count = 0x3ff
+
+	filename_list = []
+	done = False
+	while not done:
+		filename = section_ini[index]
+		filename = _filename_normalize(filename)
+		_filename_validate(filename)
+		_log_info(converter, f'Tile: {filename}')
+
+		filename_list.append(filename)
+
+		next_index = int(index, 16) + 1
+		index = '{0:0{1}x}'.format(next_index, 3)
+		_log_debug(converter, f'index: {index}')
+
+		if index not in section_ini:
+			_log_info(converter, f'Tileset: Unable to locate index {index}, assuming done')
+			break
+		if next_index > tile_max_count:
+			_log_warning(converter, f'Number of tiles exceeds the maximum of {tile_max_count}')
+			break
+
+	with _stats_stage(converter, 'decode'):
+		tile_list = _load_tile_list(converter, filename_list, bits_per_pixel)
+		_stats_count(converter, 'pixels', sum(pixels.size for pixels in tile_list))
+
+	return tile_list
+
+
+################################################################################
+# Cut the tiles out of one atlas image
+#
+# The atlas is loaded once and the tiles are views of its pixels, instead of
+# opening one file for each tile.
+def _convert_tileset_atlas(converter, section_ini):
+	filename = _filename_get(section_ini)
+
+	bits_per_pixel = _bits_per_pixel_get(section_ini)
+	if _sub_palettes_get(section_ini, bits_per_pixel):
+		bits_per_pixel = 8
+	tile_width     = _tile_size_get(section_ini, 'tile_width')
+	tile_height    = _tile_size_get(section_ini, 'tile_height')
+
+	pixels = _stats_load_tile(converter, filename, bits_per_pixel)
+
+	_log_info(converter
+		, f"Size: {pixels.shape[1]}x{pixels.shape[0]}, " \
+		  f"Tile: {tile_width}x{tile_height}"
+		)
+
+	tile_list = _pixels_slice(filename, pixels, tile_width, tile_height, _order_get(section_ini))
+	tile_list = _tiles_range(filename, tile_list, section_ini, 'tile_')
+
+	tile_max_count = 0x3ff
+	if len(tile_list) > (tile_max_count + 1):
+		_error(f'{filename} has {len(tile_list)} tiles, the maximum is {tile_max_count + 1}')
+
+	return tile_list
+
+
+################################################################################
+# Load the tile images
+#
+# The tiles are always returned in the same order as the file names.
+def _load_tile_list(converter, filename_list, bits_per_pixel):
+	image_list = _image_load_list(converter, filename_list)
+
+	return [ _load_tile(image, bits_per_pixel) for image in image_list ]
+
+
+################################################################################
+# Get the pixels of a tile image
+def _load_tile(image, bits_per_pixel):
+	if image['format'] != 'GIF':
+		_error(f'Unsupported image type: {image["format"]}')
+
+	return _load_gif(image, bits_per_pixel)
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Image Cache
+################################################################################
+#
+# The same image is often used by more than one resource, like the Bitmap and
+# Palette of a title screen, or the tiles shared by tilesets.  The decoded
+# images are kept for the whole run, and between conversions with "--watch",
+# so every resource that uses a file shares one decode.
+#
+# image_cache =
+# {	NORMALIZED_FILENAME : ( ( MTIME, SIZE ), IMAGE, BYTES )
+# }
+#
+# An entry is only used while the modification time and size of the file have
+# not changed.  The entries are kept in the order they were last used, and the
+# least recently used are dropped when the images take more than
+# "--image-cache" MiB.
+#
+# IMAGE =
+# {	'filename' : The file name
+# ,	'format'   : The Pillow image format, like "GIF"
+# ,	'mode'     : The Pillow image mode, like "P"
+# ,	'size'     : ( WIDTH, HEIGHT )
+# ,	'pixels'   : The color indexes as an array of pixel rows, GIF only
+# ,	'palette'  : The R,G,B,... bytes of the palette, None if there is none
+# }
+#
+################################################################################
+
+################################################################################
+# Get a decoded image
+def _image_load(converter, filename):
+	return _image_load_list(converter, [ filename ])[0]
+
+
+################################################################################
+# Get the decoded images
+#
+# The images that are not in the cache are spread across worker processes
+# when there are a lot of them and more than one job is allowed.  The images
+# are always returned in the same order as the file names.
+def _image_load_list(converter, filename_list):
+	filename_list = [ _filename_normalize(filename) for filename in filename_list ]
+	stat_list     = [ _image_stat(filename) for filename in filename_list ]
+	image_list    = [ _image_cache_get(converter, filename, stat) for filename, stat in zip(filename_list, stat_list) ]
+
+	load_list = [ position for position, image in enumerate(image_list) if image is None ]
+	_stats_count(converter, 'files_opened', len(load_list))
+
+	decode_list = _image_decode_list(converter, [ filename_list[position] for position in load_list ])
+
+	for position, image in zip(load_list, decode_list):
+		_image_cache_put(converter, filename_list[position], stat_list[position], image)
+		image_list[position] = image
+
+	return image_list
+
+
+################################################################################
+# Decode the images, without the cache
+def _image_decode_list(converter, filename_list):
+	job_count = converter.jobs
+	if job_count <= 1 or len(filename_list) < (job_count * 8):
+		return [ _image_decode(filename) for filename in filename_list ]
+
+	import concurrent.futures
+
+	chunk_size = len(filename_list) // (job_count * 4)
+
+	with concurrent.futures.ProcessPoolExecutor(job_count) as pool:
+		image_list = list(pool.map(_image_decode
+			, filename_list
+			, chunksize = chunk_size
+			))
+
+	return image_list
+
+
+################################################################################
+# Decode an image
+def _image_decode(filename):
+	from PIL import Image
+
+	image = Image.open(filename)
+
+	pixels = None
+	if image.format == 'GIF':
+		pixels = _load_gif_pixels(image)
+
+	palette = image.getpalette()
+	if palette is not None:
+		palette = bytes(palette)
+
+	decoded = \
+	{	'filename' : filename
+	,	'format'   : image.format
+	,	'mode'     : image.mode
+	,	'size'     : image.size
+	,	'pixels'   : pixels
+	,	'palette'  : palette
+	}
+
+	return decoded
+
+
+################################################################################
+# Get the modification time and size of an image file, None if unknown
+def _image_stat(filename):
+	try:
+		stat = os.stat(filename)
+	except OSError:
+		return None
+
+	return ( stat.st_mtime_ns, stat.st_size )
+
+
+################################################################################
+# Get an image from the cache, None if it is not there or it is out of date
+def _image_cache_get(converter, filename, stat):
+	entry = converter.image_cache.pop(filename, None)
+	if entry is None:
+		return None
+
+	if entry[0] != stat:
+		converter.image_cache_bytes -= entry[2]
+		return None
+
+	# Move to the end, the most recently used
+	converter.image_cache[filename] = entry
+	_stats_count(converter, 'image_cache_hit')
+
+	return entry[1]
+
+
+################################################################################
+# Add an image to the cache
+#
+# Images that are larger than the whole cache are not kept.
+def _image_cache_put(converter, filename, stat, image):
+	if stat is None:
+		return
+
+	size = len(image['palette'] or b'')
+	if image['pixels'] is not None:
+		size += image['pixels'].nbytes
+
+	if size > converter.image_cache_limit:
+		return
+
+	while converter.image_cache_bytes + size > converter.image_cache_limit:
+		oldest = next(iter(converter.image_cache))
+		converter.image_cache_bytes -= converter.image_cache.pop(oldest)[2]
+		_stats_count(converter, 'image_cache_evict')
+
+	converter.image_cache[filename] = ( stat, image, size )
+	converter.image_cache_bytes += size
+
+	return
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Image : GIF
+################################################################################
+
+################################################################################
+# Get the GIF color indexes (Not the Palette) of a decoded image
+#
+# The color indexes are checked against the Bits-Per-Pixel.
+def _load_gif(image, bits_per_pixel):
+	valid_depths = (2, 4, 8)
+	if bits_per_pixel not in valid_depths:
+		_error(f'BitsPerPixel must be one of {valid_depths}')
+
+	pixels = image['pixels']
+	_pixels_validate(image['filename'], pixels, bits_per_pixel)
+
+	return pixels
+
+
+################################################################################
+# Load the GIF color indexes as an array of pixel rows
+#
+# The indexed buffer is pulled out of the image in one call, instead of asking
+# for every pixel individually.
+def _load_gif_pixels(image):
+	import numpy
+
+	if image.mode not in ('P', 'L'):
+		_error(f'{image.filename} is not an indexed image (Color: {image.mode})')
+
+	pixels = numpy.frombuffer(image.tobytes(), dtype = numpy.uint8)
+	pixels = pixels.reshape(image.size[1], image.size[0])
+
+	return pixels
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Image : Truecolor
+################################################################################
+
+################################################################################
+# Load a truecolor image as an array of 12-bit Vera colors
+#
+# Each 8-bit channel is rounded to the nearest 4-bit value, then the channels
+# are combined as 0x0RGB.  Any image format Pillow can read is supported.  The
+# second array is False for pixels that are transparent, if the image has no
+# transparency it is None.
+def _load_rgb(filename):
+	import numpy
+	from PIL import Image
+
+	image = Image.open(filename)
+
+	opaque = None
+	if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+		image = image.convert('RGBA')
+		pixels = numpy.asarray(image)
+		opaque = pixels[:, :, 3] >= 0x80
+		pixels = pixels[:, :, :3]
+	else:
+		image = image.convert('RGB')
+		pixels = numpy.asarray(image)
+
+	pixels = (pixels.astype(numpy.uint16) + 8) // 17
+
+	rgb  = pixels[:, :, 0] << 8
+	rgb |= pixels[:, :, 1] << 4
+	rgb |= pixels[:, :, 2]
+
+	return ( rgb, opaque )
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Color Quantization
+################################################################################
+
+################################################################################
+# Reduce the 12-bit colors to a palette
+#
+# The work is done on the histogram of the image, there are at most 4096
+# colors, so the size of the image only matters when counting colors and when
+# looking up the palette index of each pixel.
+#
+# When the image has transparent pixels, palette index 0 is kept for them.
+#
+# Returns the list of palette colors and the pixel indexes.
+def _quantize(rgb, opaque, color_count):
+	import numpy
+
+	first_index = 0
+	if opaque is not None and not opaque.all():
+		first_index = 1
+
+	histogram = numpy.bincount(rgb[opaque] if opaque is not None else rgb.reshape(-1)
+		, minlength = 0x1000
+		)
+	colors = numpy.flatnonzero(histogram)
+	counts = histogram[colors]
+
+	palette_size = color_count - first_index
+	if colors.size <= palette_size:
+		palette = colors
+	else:
+		palette = _quantize_median_cut(colors, counts, palette_size)
+		palette = _quantize_refine(colors, counts, palette)
+
+	lookup = numpy.zeros(0x1000, dtype = numpy.uint8)
+	lookup[colors] = _quantize_nearest(colors, palette) + first_index
+
+	pixels = lookup[rgb]
+	if first_index != 0:
+		pixels[~opaque] = 0
+
+	palette = [ 0 ] * first_index + [ int(color) for color in palette ]
+
+	return ( palette, pixels )
+
+
+################################################################################
+# Split the 12-bit colors in to 0x0R, 0x0G, 0x0B channels
+def _quantize_channels(colors):
+	import numpy
+
+	return numpy.stack(((colors >> 8) & 0x0f, (colors >> 4) & 0x0f, colors & 0x0f), axis = 1)
+
+
+################################################################################
+# Combine the channels in to 12-bit colors
+def _quantize_colors(channels):
+	import numpy
+
+	channels = numpy.clip(numpy.rint(channels), 0, 0x0f).astype(numpy.int64)
+
+	return (channels[:, 0] << 8) | (channels[:, 1] << 4) | channels[:, 2]
+
+
+################################################################################
+# Median cut
+#
+# Start with one box holding every color.  The box with the largest error, the
+# count weighted sum of the squared distances to its mean, is split at the
+# weighted median of its widest channel.  Repeat until there are enough boxes.
+# The palette is the weighted mean of each box.
+def _quantize_median_cut(colors, counts, palette_size):
+	import numpy
+
+	channels = _quantize_channels(colors).astype(numpy.float64)
+	weights  = counts.astype(numpy.float64)
+
+	box_list = [ _quantize_box(channels, weights, numpy.arange(colors.size)) ]
+
+	while len(box_list) < palette_size:
+		error_list = [ box['error'] for box in box_list ]
+		if max(error_list) <= 0:
+			break
+
+		box = box_list.pop(error_list.index(max(error_list)))
+		channel = int(box['variance'].argmax())
+
+		members = box['members']
+		members = members[numpy.argsort(channels[members, channel], kind = 'stable')]
+
+		total = numpy.cumsum(weights[members])
+		split = int(numpy.searchsorted(total, total[-1] / 2))
+		split = min(max(split, 1), members.size - 1)
+
+		box_list.append(_quantize_box(channels, weights, members[:split]))
+		box_list.append(_quantize_box(channels, weights, members[split:]))
+
+	means = numpy.array([ box['mean'] for box in box_list ])
+
+	return _quantize_colors(means)
+
+
+################################################################################
+# Make a median cut box from the indexes of its colors
+#
+# The variance is per channel and is not divided by the total weight.
+def _quantize_box(channels, weights, members):
+	weight  = weights[members][:, None]
+	channel = channels[members]
+
+	mean     = (channel * weight).sum(axis = 0) / weight.sum()
+	variance = (((channel - mean) ** 2) * weight).sum(axis = 0)
+
+	return { 'members': members, 'mean': mean, 'variance': variance, 'error': float(variance.sum()) }
+
+
+################################################################################
+# Move each palette color to the weighted mean of the colors closest to it
+#
+# A few rounds of k-means, starting from the median cut palette.  Palette
+# colors that no longer have any colors are left where they are.
+def _quantize_refine(colors, counts, palette, rounds = 4):
+	import numpy
+
+	channels = _quantize_channels(colors).astype(numpy.float64)
+	weights  = counts.astype(numpy.float64)
+
+	means = _quantize_channels(palette).astype(numpy.float64)
+	for _ in range(rounds):
+		nearest = _quantize_nearest(colors, _quantize_colors(means))
+
+		total = numpy.bincount(nearest, weights = weights, minlength = len(means))
+		used  = total > 0
+		for channel in range(3):
+			sums = numpy.bincount(nearest
+				, weights   = weights * channels[:, channel]
+				, minlength = len(means)
+				)
+			means[used, channel] = sums[used] / total[used]
+
+	return _quantize_colors(means)
+
+
+################################################################################
+# Find the index of the closest palette color for each color
+#
+# The squared distance is |palette|^2 - 2 * color . palette, the |color|^2 term
+# is the same for every palette color and is left out.
+def _quantize_nearest(colors, palette):
+	import numpy
+
+	channels = _quantize_channels(colors).astype(numpy.float64)
+	palette  = _quantize_channels(numpy.asarray(palette)).astype(numpy.float64)
+
+	distance = (palette ** 2).sum(axis = 1)[None, :] - 2 * (channels @ palette.T)
+
+	return distance.argmin(axis = 1).astype(numpy.uint8)
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Sub-Palettes
+################################################################################
+#
+# A 4bpp tilemap entry picks one of 16 sub-palettes with its palette offset.
+# Pixel 0 is transparent in every sub-palette, so a sub-palette has 15 colors
+# from the image and color 0.
+#
+# The tiles are grouped by the set of colors they use.  The color sets are
+# then packed, largest first, in to the sub-palette where they add the fewest
+# new colors (best fit), and a new sub-palette is only started when a set does
+# not fit in any of them.  Last, every tile is remapped to the indexes of its
+# sub-palette.
+#
+################################################################################
+
+subpalette_count  = 16
+subpalette_colors = 15
+
+
+################################################################################
+# Assign a sub-palette to each tile
+#
+# The tiles use the 8-bit color indexes of the image.  Returns the remapped
+# tiles, the sub-palette of each tile, and the image colors of each
+# sub-palette (color 0 first).
+def _subpalette_assign(converter, filename, tile_list):
+	import numpy
+
+	if len(tile_list) == 0:
+		return ( tile_list, numpy.zeros(0, dtype = numpy.int64), [ [ 0 ] ] )
+
+	tiles = numpy.stack(tile_list)
+	tile_count = tiles.shape[0]
+
+	present = numpy.zeros(( tile_count, 256 ), dtype = bool)
+	present[numpy.arange(tile_count)[:, None], tiles.reshape(tile_count, -1)] = True
+	present[:, 0] = False
+
+	color_count = present.sum(axis = 1)
+	over = numpy.flatnonzero(color_count > subpalette_colors)
+	if over.size > 0:
+		_error(f'{filename}: Tile {over[0]} has {color_count[over[0]]} colors, a sub-palette only has {subpalette_colors}')
+
+	# The color set of each tile as a 256-bit mask
+	mask_index = {}
+	mask_list  = []
+	tile_set   = numpy.empty(tile_count, dtype = numpy.int64)
+	for tile_index, row in enumerate(numpy.packbits(present, axis = 1, bitorder = 'little')):
+		mask = int.from_bytes(row.tobytes(), 'little')
+		if mask not in mask_index:
+			mask_index[mask] = len(mask_list)
+			mask_list.append(mask)
+		tile_set[tile_index] = mask_index[mask]
+
+	palette_list = []
+	set_palette  = [ 0 ] * len(mask_list)
+	for set_index in sorted(range(len(mask_list)), key = lambda index: -_bit_count(mask_list[index])):
+		mask = mask_list[set_index]
+
+		best = None
+		for palette_index, palette in enumerate(palette_list):
+			if _bit_count(palette | mask) > subpalette_colors:
+				continue
+
+			added = _bit_count(mask & ~palette)
+			if best is None or added < best[0]:
+				best = ( added, palette_index )
+
+		if best is None:
+			palette_list.append(0)
+			best = ( 0, len(palette_list) - 1 )
+
+		palette_list[best[1]] |= mask
+		set_palette[set_index] = best[1]
+
+	if len(palette_list) > subpalette_count:
+		_error(f'{filename} needs {len(palette_list)} sub-palettes, the maximum is {subpalette_count}')
+
+	lut = numpy.zeros(( len(palette_list), 256 ), dtype = numpy.uint8)
+	color_list = []
+	for palette_index, palette in enumerate(palette_list):
+		index_list = [ color for color in range(256) if (palette >> color) & 1 ]
+		lut[palette_index, index_list] = numpy.arange(1, len(index_list) + 1)
+		color_list.append([ 0 ] + index_list)
+
+	tile_palette = numpy.array(set_palette, dtype = numpy.int64)[tile_set]
+	tiles = lut[tile_palette[:, None, None], tiles]
+
+	_log_info(converter
+		, f'Sub-Palettes: {len(palette_list)}, ' \
+		  f'Colors: {[ len(color) - 1 for color in color_list ]}'
+		)
+
+	return ( list(tiles), tile_palette, color_list )
+
+
+################################################################################
+# Write the sub-palettes
+#
+# Each sub-palette is 16 colors from the palette of the image, the unused
+# colors are black.  Returns the palette offset of the first sub-palette.
+def _subpalette_write(converter, section_id, section_ini, filename, color_list):
+	palette_first = _subpalette_first(section_ini, len(color_list))
+
+	palette = list(_image_load(converter, filename)['palette'] or b'')
+	palette = palette + ([ 0 ] * (768 - len(palette)))
+
+	data = bytearray(len(color_list) * 16 * 2)
+	for palette_index, index_list in enumerate(color_list):
+		for slot, color in enumerate(index_list):
+			r, g, b = palette[color * 3:(color * 3) + 3]
+			offset = ((palette_index * 16) + slot) * 2
+			data[offset]     = (g & 0xf0) | (b >> 4)
+			data[offset + 1] = (r & 0xf0) >> 4
+
+	address = _address_get(section_ini, 'palette_')
+	filename = _output_filename(converter, section_id, 'palette')
+	_write_data(converter, address, data, filename)
+
+	return palette_first
+
+
+################################################################################
+# Get the palette offset of the first sub-palette
+#
+# When the sub-palettes are written to the Vera palette ($FA00-$FBFF) the
+# tiles have to use the sub-palettes at that address, which must be a
+# multiple of 32 bytes (16 colors).  Sub-palettes at any other address are
+# copied to the Vera palette by the program, at color 0.
+def _subpalette_first(section_ini, palette_count):
+	addr_lo, addr_hi = _address_get(section_ini, 'palette_')
+	address = (addr_hi << 8) | addr_lo
+
+	if not _address_is_palette(address):
+		return 0
+
+	if ((address - 0xfa00) % 32) != 0:
+		_error(f'Palette_Address must be a multiple of 32 bytes from $FA00, not ${address:04X}')
+
+	palette_first = (address - 0xfa00) // 32
+	if palette_first + palette_count > subpalette_count:
+		_error(f'The {palette_count} sub-palettes at ${address:04X} go past the end of the Vera palette')
+
+	return palette_first
+
+
+################################################################################
+# Add the palette offset of each tile to its tilemap entry
+def _subpalette_tilemap(tilemap, tile_palette):
+	import numpy
+
+	entry = numpy.frombuffer(bytes(tilemap), dtype = numpy.uint8).reshape(-1, 2).copy()
+	entry[:, 1] |= (numpy.asarray(tile_palette, dtype = numpy.uint8) << 4)
+
+	return bytearray(entry.reshape(-1))
+
+
+################################################################################
+# Count the bits that are set
+def _bit_count(value):
+	return bin(value).count('1')
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Pixel Packing
+################################################################################
+
+################################################################################
+# Check that all pixel indexes fit in the Bits-Per-Pixel
+def _pixels_validate(filename, pixels, bits_per_pixel):
+	max_value = (0x01 << bits_per_pixel) - 1
+	if pixels.size > 0 and int(pixels.max()) > max_value:
+		_error(f'{filename} has pixels that exceed BitsPerPixel({bits_per_pixel})')
+
+	return
+
+
+################################################################################
+# Pack the pixel indexes into bytes
+#
+# The pixels are packed in row order, left to right, with the left-most pixel
+# in the high bits of the byte:
+#   2bpp: 1 byte == 4 pixels
+#   4bpp: 1 byte == 2 pixels
+#   8bpp: 1 byte == 1 pixel
+#
+# Rows are not padded, a row can end in the middle of a byte.  If the total
+# number of pixels does not fill the last byte, those pixels are dropped.
+#
+# The bytes are packed directly in to "data" starting at "offset", a new
+# bytearray is created when "data" is None.  Large images are packed a block at
+# a time so the temporary arrays stay small.
+def _pixels_pack(pixels, bits_per_pixel, data = None, offset = 0):
+	import numpy
+
+	pixels = numpy.ascontiguousarray(pixels, dtype = numpy.uint8).reshape(-1)
+
+	size = _pixels_pack_size(pixels.size, bits_per_pixel)
+	if data is None:
+		data = bytearray(size)
+
+	output = numpy.frombuffer(data, dtype = numpy.uint8, count = size, offset = offset)
+
+	if bits_per_pixel == 8:
+		output[:] = pixels
+		return data
+
+	pixels_per_byte = 8 // bits_per_pixel
+
+	pixels = pixels[:size * pixels_per_byte].reshape(-1, pixels_per_byte)
+	shift  = numpy.arange(8 - bits_per_pixel, -1, -bits_per_pixel, dtype = numpy.uint8)
+
+	block_size = 0x10000
+	for start in range(0, size, block_size):
+		stop = start + block_size
+		numpy.bitwise_or.reduce(pixels[start:stop] << shift
+			, axis = 1
+			, out  = output[start:stop]
+			)
+
+	return data
+
+
+################################################################################
+# The number of bytes needed to pack the pixels
+def _pixels_pack_size(pixel_count, bits_per_pixel):
+	return (pixel_count * bits_per_pixel) // 8
+
+
+################################################################################
+# Cut the pixels into tiles
+#
+# The tiles are in row order, left to right and top to bottom.  With the
+# "column" order they are top to bottom and left to right.  The tiles are
+# views of the pixels, nothing is copied.
+def _pixels_slice(filename, pixels, tile_width, tile_height, order = 'row'):
+	height, width = pixels.shape
+	if (width % tile_width) != 0 or (height % tile_height) != 0:
+		_error(f'{filename} size {width}x{height} is not a multiple of the tile size {tile_width}x{tile_height}')
+
+	tiles = pixels.reshape(height // tile_height, tile_height, width // tile_width, tile_width)
+	if order == 'column':
+		tiles = tiles.transpose(2, 0, 1, 3)
+	else:
+		tiles = tiles.swapaxes(1, 2)
+	tiles = tiles.reshape(-1, tile_height, tile_width)
+
+	return list(tiles)
+
+
+################################################################################
+# Only keep a range of the tiles
+#
+# The range comes from the "First" and "Count" keys with the prefix, for
+# example Tile_First and Tile_Count.  The default is all of the tiles.
+def _tiles_range(filename, tile_list, section_ini, prefix):
+	first = _int_get(section_ini, f'{prefix}first', 0)
+	count = _int_get(section_ini, f'{prefix}count', len(tile_list) - first)
+
+	if first < 0 or count < 1 or (first + count) > len(tile_list):
+		name = prefix.title()
+		_error(f'{filename} has {len(tile_list)} {name[:-1].lower()}s, {name}First and {name}Count are out of range')
+
+	return tile_list[first:first + count]
+
+
+################################################################################
+# Pack a list of tiles
+#
+# Each tile is packed on its own, the same as if the tiles were loaded one at a
+# time.
+def _tiles_pack(tile_list, bits_per_pixel):
+	size = 0
+	for pixels in tile_list:
+		size += _pixels_pack_size(pixels.size, bits_per_pixel)
+
+	data = bytearray(size)
+
+	offset = 0
+	for pixels in tile_list:
+		_pixels_pack(pixels, bits_per_pixel, data, offset)
+		offset += _pixels_pack_size(pixels.size, bits_per_pixel)
+
+	return data
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Tile Deduplication
+################################################################################
+
+################################################################################
+# Remove duplicate tiles
+#
+# The tiles are looked up in a hash index of the tiles that have been kept.
+# When "flip" is True, the flipped versions of each tile are also looked up:
+#   H-Flip  : Columns reversed
+#   V-Flip  : Rows reversed
+#   HV-Flip : Columns and rows reversed
+# Since flipping a tile twice gives back the original tile, a tile that
+# matches the flipped version of a kept tile can be drawn by flipping that
+# kept tile.
+#
+# Returns the list of kept tiles and the remap table.  The remap table has a
+# tilemap entry for every original tile, pointing at the kept tile.
+def _tiles_deduplicate(converter, tile_list, flip):
+	tile_keep, match_list = _tiles_unique(tile_list, flip)
+
+	remap = bytearray()
+	for tile_index, v_flip, h_flip in match_list:
+		remap.extend(_tilemap_entry(tile_index, 0, v_flip, h_flip))
+
+	_log_info(converter, f'Tiles: {len(tile_list)}, Unique: {len(tile_keep)}')
+
+	return ( tile_keep, remap )
+
+
+################################################################################
+# Find the unique tiles
+#
+# Returns the list of kept tiles and, for every original tile, the index of
+# the kept tile with the V-Flip and H-Flip needed to draw it.
+def _tiles_unique(tile_list, flip):
+	tile_index = {}
+	tile_keep  = []
+	match_list = []
+
+	for pixels in tile_list:
+		variant_list = [ ( pixels, 0, 0 ) ]
+		if flip:
+			variant_list.append(( pixels[:, ::-1],    0, 1 ))
+			variant_list.append(( pixels[::-1, :],    1, 0 ))
+			variant_list.append(( pixels[::-1, ::-1], 1, 1 ))
+
+		for variant, v_flip, h_flip in variant_list:
+			key = ( variant.shape, variant.tobytes() )
+			if key in tile_index:
+				break
+		else:
+			key = ( pixels.shape, pixels.tobytes() )
+			v_flip = 0
+			h_flip = 0
+
+			tile_index[key] = len(tile_keep)
+			tile_keep.append(pixels)
+
+		match_list.append(( tile_index[key], v_flip, h_flip ))
+
+	return ( tile_keep, match_list )
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Compression
+################################################################################
+#
+# The compressed formats are a stream of tokens that end with a $00 token.  The
+# macros in Zakero_X16_Vera.inc decompress the stream directly in to Vera.
+#
+# RLE
+#   $01-$7f : Copy the next N bytes
+#   $80-$ff : Repeat the next byte (N & $7f) + 1 times
+#
+# LZ
+#   $01-$7f : Copy the next N bytes
+#   $80-$ff : Copy (N & $7f) + 4 bytes that were already written.  The next
+#             two bytes (low, high) are how far back to start copying.
+#
+# LZ matches are never 1 byte back.  The decompression macro reads the match
+# from Vera using the second data port and Vera reads one byte ahead, so the
+# byte just written would not have been read yet.
+#
+################################################################################
+
+################################################################################
+# Compress the data
+def _compress(data, compression):
+	if compression == 'rle':
+		data = _compress_rle(bytes(data))
+	elif compression == 'lz':
+		data = _compress_lz(bytes(data))
+
+	return data
+
+
+################################################################################
+# Get the compressed size as a percentage of the original size
+def _compression_ratio(data_size, compressed_size):
+	if data_size == 0:
+		return '-'
+
+	return f'{100.0 * compressed_size / data_size:.1f}%'
+
+
+################################################################################
+# Add the literal bytes to the compressed data
+def _compress_literal(compressed, literal):
+	literal_max = 0x7f
+
+	for offset in range(0, len(literal), literal_max):
+		chunk = literal[offset:offset + literal_max]
+		compressed.append(len(chunk))
+		compressed.extend(chunk)
+
+	return
+
+
+################################################################################
+# Run-Length Encoding
+#
+# The runs are found with whole-array operations.  Runs shorter than 3 bytes
+# are cheaper to store as literals.
+def _compress_rle(data):
+	import numpy
+
+	compressed = bytearray()
+	repeat_min = 3
+	repeat_max = 0x80
+
+	pixels = numpy.frombuffer(data, dtype = numpy.uint8)
+	run_start = numpy.flatnonzero(numpy.diff(pixels)) + 1
+	run_start = numpy.concatenate(([ 0 ], run_start)).astype(numpy.int64)
+	run_end = numpy.append(run_start[1:], len(data))
+
+	literal_start = 0
+	for start, end in zip(run_start.tolist(), run_end.tolist()):
+		if (end - start) < repeat_min:
+			continue
+
+		_compress_literal(compressed, data[literal_start:start])
+		literal_start = end
+
+		while start < end:
+			count = min(end - start, repeat_max)
+			if count < repeat_min:
+				_compress_literal(compressed, data[start:end])
+				break
+
+			compressed.append(0x80 | (count - 1))
+			compressed.append(data[start])
+			start += count
+
+	_compress_literal(compressed, data[literal_start:])
+	compressed.append(0x00)
+
+	return compressed
+
+
+################################################################################
+# Lempel-Ziv Encoding
+#
+# Matches are found with hash chains: Every position is added to the chain of
+# its first 4 bytes, and only the most recent positions in the chain are
+# checked.
+def _compress_lz(data):
+	compressed = bytearray()
+	match_min      = 4
+	match_max      = 0x7f + match_min
+	distance_min   = 2
+	distance_max   = 0xffff
+	chain_depth    = 16
+
+	data_size = len(data)
+	head = {}
+	prev = [ -1 ] * data_size
+
+	literal_start = 0
+	i = 0
+	while i < data_size:
+		match_size = 0
+		match_distance = 0
+
+		if (i + match_min) <= data_size:
+			key = data[i:i + match_min]
+			length_max = min(match_max, data_size - i)
+
+			j = head.get(key, -1)
+			depth = chain_depth
+			while j >= 0 and depth > 0 and (i - j) <= distance_max:
+				if (i - j) >= distance_min:
+					length = match_min
+					while (length + 8) <= length_max \
+					and data[i + length:i + length + 8] == data[j + length:j + length + 8]:
+						length += 8
+					while length < length_max and data[i + length] == data[j + length]:
+						length += 1
+
+					if length > match_size:
+						match_size = length
+						match_distance = i - j
+						if length == length_max:
+							break
+
+				j = prev[j]
+				depth -= 1
+
+		if match_size < match_min:
+			_compress_lz_insert(data, head, prev, i, match_min)
+			i += 1
+			continue
+
+		_compress_literal(compressed, data[literal_start:i])
+
+		compressed.append(0x80 | (match_size - match_min))
+		compressed.append(match_distance & 0xff)
+		compressed.append(match_distance >> 8)
+
+		for position in range(i, i + match_size):
+			_compress_lz_insert(data, head, prev, position, match_min)
+
+		i += match_size
+		literal_start = i
+
+	_compress_literal(compressed, data[literal_start:])
+	compressed.append(0x00)
+
+	return compressed
+
+
+################################################################################
+# Add a position to the hash chains
+def _compress_lz_insert(data, head, prev, position, match_min):
+	if (position + match_min) > len(data):
+		return
+
+	key = data[position:position + match_min]
+	prev[position] = head.get(key, -1)
+	head[key] = position
+
+	return
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Resource Index
+################################################################################
+
+################################################################################
+# Get the resource file index
+#
+# The resource file is only parsed once per run.  The index is also saved next
+# to the resource file and is reused as long as the resource file has not been
+# changed.
+def _resource_index(converter):
+	if converter.index is not None:
+		return converter.index
+
+	resource_stat = os.stat(converter.resource)
+	index_filename = _resource_index_filename(converter.resource)
+
+	index = _resource_index_read(converter, index_filename)
+	if index is not None \
+	and index['mtime'] == resource_stat.st_mtime_ns \
+	and index['size'] == resource_stat.st_size:
+		_log_debug(converter, f'Index: {index_filename}')
+		converter.index = index
+		return index
+
+	with open(converter.resource, 'rb') as resource_file:
+		resource_data = resource_file.read()
+
+	resource_hash = hashlib.sha256(resource_data).hexdigest()
+
+	if index is None or index['hash'] != resource_hash:
+		_log_debug(converter, f'Index: Parsing {converter.resource}')
+		index = _resource_index_build(resource_data.decode())
+		index['hash'] = resource_hash
+
+	index['mtime'] = resource_stat.st_mtime_ns
+	index['size']  = resource_stat.st_size
+
+	_resource_index_write(converter, index_filename, index)
+
+	converter.index = index
+
+	return index
+
+
+################################################################################
+# Parse the resource file and create the index
+#
+# Index Layout:
+# - section   : The resource sections, in file order
+#   - name    : The resource name
+#   - type    : The resource type, None if not a resource section
+#   - file    : The normalized "File" value, None if not used
+#   - option  : All the section options
+# - name_type : "NAME TYPE" ==> Section ID
+# - file      : Normalized file name ==> Section ID list
+def _resource_index_build(resource_text):
+	resource = configparser.ConfigParser()
+	resource.read_string(resource_text)
+
+	index = \
+	{	'version'   : list(version_info)
+	,	'section'   : {}
+	,	'name_type' : {}
+	,	'file'      : {}
+	}
+
+	for section_id in resource.sections():
+		section_ini = resource[section_id]
+
+		resource_name = _resource_name(section_id)
+		resource_type = _resource_type(section_id)
+
+		filename = _filename_get(section_ini)
+		if filename is not None:
+			filename = _filename_normalize(filename)
+			index['file'].setdefault(filename, []).append(section_id)
+
+		index['section'][section_id] = \
+		{	'name'   : resource_name
+		,	'type'   : resource_type
+		,	'file'   : filename
+		,	'option' : dict(section_ini.items())
+		}
+
+		index['name_type'].setdefault(f'{resource_name} {resource_type}', section_id)
+
+	return index
+
+
+################################################################################
+# Get the name of the file that stores the index of the resource file
+def _resource_index_filename(resource_filename):
+	resource_dir, resource_name = os.path.split(resource_filename)
+	filename = os.path.join(resource_dir, f'.ConverterX16.Index.{resource_name}')
+
+	return filename
+
+
+################################################################################
+# Read the index file
+#
+# Index files that can not be read or were made by a different version of
+# ConverterX16.py are ignored.
+def _resource_index_read(converter, filename):
+	try:
+		with open(filename, 'r') as index_file:
+			index = json.load(index_file)
+	except (OSError, ValueError):
+		return None
+
+	if not isinstance(index, dict) \
+	or index.get('version') != list(version_info):
+		_log_debug(converter, f'Index: Ignoring {filename}')
+		return None
+
+	return index
+
+
+################################################################################
+# Write the index file
+#
+# The index is only an optimization, not being able to write it is not an
+# error.
+def _resource_index_write(converter, filename, index):
+	filename_tmp = f'{filename}.{os.getpid()}'
+
+	try:
+		with open(filename_tmp, 'w') as index_file:
+			json.dump(index, index_file)
+		os.replace(filename_tmp, filename)
+	except OSError:
+		_log_debug(converter, f'Index: Unable to write {filename}')
+
+	return
+
+
+################################################################################
+# Get the Section IDs of all the resources that can be converted
+def _resource_section_list(converter, index):
+	section_list = []
+
+	for section_id, section in index['section'].items():
+		resource_type = section['type']
+		if resource_type is None:
+			_log_warning(converter, f'Not a resource section: "{section_id}"')
+			continue
+		if resource_type not in converter.output_ext:
+			_log_warning(converter, f'Unknown resource type: {resource_type}')
+			continue
+		section_list.append(section_id)
+
+	return section_list
+
+
+################################################################################
+# Get the sections that write a file that another section also writes
+#
+# For example "[Foo Layer]" and "[Foo Tileset]" both write "Foo.x16t".
+# Sections with bad options are skipped, converting them reports the error.
+# Returns { SECTION_ID: ( FILENAME, OTHER_SECTION_ID ) }.
+def _resource_output_shared(converter, index):
+	owner  = {}
+	shared = {}
+
+	for section_id in _resource_section_list(converter, index):
+		section_ini = _resource_section(index, section_id)
+		try:
+			filename_list = _section_output_files(converter, section_id, section_ini)
+		except ConverterError:
+			continue
+
+		for filename in filename_list:
+			other_id = owner.setdefault(filename, section_id)
+			if other_id != section_id:
+				shared.setdefault(section_id, ( filename, other_id ))
+				shared.setdefault(other_id, ( filename, section_id ))
+
+	return shared
+
+
+################################################################################
+# Stop when two sections write the same file
+def _resource_output_check(converter, index):
+	for section_id, ( filename, other_id ) in _resource_output_shared(converter, index).items():
+		_error(f'"[{section_id}]" and "[{other_id}]" both write "{filename}"')
+
+	return
+
+
+################################################################################
+# Get the options of a resource section
+#
+# The converters are allowed to change the options, so they get a copy.
+def _resource_section(index, section_id):
+	section_ini = dict(index['section'][section_id]['option'])
+	return section_ini
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Cache
+################################################################################
+
+################################################################################
+# Calculate the cache key of a resource section
+#
+# The key is a hash of everything that can change the converted data: the
+# version of this script, the resource settings, and the contents of every
+# input file.  If an input file can not be read, the section is not cached and
+# the conversion will report the problem.
+def _cache_key(converter, section_id, section_ini):
+	if converter.cache_dir is None:
+		return None
+
+	resource_type = _resource_type(section_id)
+
+	# A bundle is only a copy of other outputs
+	if resource_type == 'bundle':
+		return None
+
+	key = hashlib.sha256()
+	key.update(repr(converter.version).encode())
+	key.update(repr(output_format).encode())
+	key.update(repr(converter.case).encode())
+	key.update(repr(converter.output_ext.get(resource_type)).encode())
+	key.update(resource_type.encode())
+
+	for option, value in sorted(section_ini.items()):
+		key.update(f'{option}={value}\n'.encode())
+
+	for filename in _section_input_files(converter, section_id, section_ini):
+		try:
+			with open(filename, 'rb') as input_file:
+				data = input_file.read()
+		except OSError:
+			_log_debug(converter, f'Cache: Unable to read "{filename}"')
+			return None
+
+		key.update(filename.encode())
+		key.update(hashlib.sha256(data).digest())
+
+	key = key.hexdigest()
+	_log_debug(converter, f'Cache Key: {key}')
+
+	return key
+
+
+################################################################################
+# Get the directory of a cache entry
+def _cache_entry(converter, key):
+	entry = os.path.join(converter.cache_dir, key[:2], key)
+	return entry
+
+
+################################################################################
+# Copy the cached data to the output files
+#
+# The output files are hard links to the cached files when possible.  The
+# cache entry time-stamps are updated so that the output files are newer than
+# their inputs and so that the entry is the most recently used.
+def _cache_restore(converter, key, filename_list):
+	if key is None:
+		return False
+
+	entry = _cache_entry(converter, key)
+	if not os.path.isdir(entry):
+		_log_info(converter, f'Cache: Miss')
+		return False
+
+	cache_list = [ os.path.join(entry, f'{i}') for i in range(len(filename_list)) ]
+	for cache_file in cache_list:
+		if not os.path.isfile(cache_file):
+			_log_info(converter, f'Cache: Incomplete entry {entry}')
+			return False
+
+	os.utime(entry)
+
+	for cache_file, filename in zip(cache_list, filename_list):
+		os.utime(cache_file)
+
+		if os.path.lexists(filename):
+			os.remove(filename)
+
+		try:
+			os.link(cache_file, filename)
+		except OSError:
+			shutil.copyfile(cache_file, filename)
+
+		_log_status(converter, f'{filename}')
+
+	_log_info(converter, f'Cache: Hit {entry}')
+
+	return True
+
+
+################################################################################
+# Copy the output files in to the cache
+def _cache_store(converter, key, filename_list):
+	if key is None:
+		return
+
+	entry = _cache_entry(converter, key)
+	if os.path.isdir(entry):
+		return
+
+	entry_tmp = f'{entry}.{os.getpid()}'
+	os.makedirs(entry_tmp, exist_ok = True)
+
+	for i, filename in enumerate(filename_list):
+		cache_file = os.path.join(entry_tmp, f'{i}')
+		try:
+			os.link(filename, cache_file)
+		except OSError:
+			shutil.copyfile(filename, cache_file)
+
+	try:
+		os.rename(entry_tmp, entry)
+	except OSError:
+		# Another process stored the same entry first
+		shutil.rmtree(entry_tmp, ignore_errors = True)
+		return
+
+	_log_info(converter, f'Cache: Stored {entry}')
+
+	_cache_evict(converter)
+
+	return
+
+
+################################################################################
+# Remove the least recently used entries until the cache fits in the maximum
+# cache size
+def _cache_evict(converter):
+	size_max = converter.cache_size * 1024 * 1024
+
+	entry_list = []
+	size_total = 0
+
+	for prefix in os.scandir(converter.cache_dir):
+		if not prefix.is_dir():
+			continue
+
+		for entry in os.scandir(prefix.path):
+			if not entry.is_dir():
+				continue
+
+			size = 0
+			for cache_file in os.scandir(entry.path):
+				size += cache_file.stat().st_size
+
+			entry_list.append((entry.stat().st_mtime, size, entry.path))
+			size_total += size
+
+	if size_total <= size_max:
+		return
+
+	entry_list.sort()
+
+	for mtime, size, entry in entry_list:
+		if size_total <= size_max:
+			break
+
+		_log_info(converter, f'Cache: Evict {entry}')
+		shutil.rmtree(entry, ignore_errors = True)
+		size_total -= size
+
+		try:
+			os.rmdir(os.path.dirname(entry))
+		except OSError:
+			pass
+
+	return
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Layout
+################################################################################
+#
+# Outputs with "Address = auto" (or Map_Address, Table_Address, ...) are given
+# an address by the layout planner.  The resources are converted first, so
+# the size of every output is known, then all the outputs are packed in to
+# memory:
+#
+#   vram    : Vera memory, $00000 - $1F9BF.  The area above that has the
+#             PSG, palette, and sprite attributes.
+#   palette : The Vera palette, $1FA00 - $1FBFF.
+#   ram     : High RAM, $A000 - $BFFF in banks 1 to "--ram-banks".  Outputs
+#             of 8 KiB or less do not cross a bank.
+#
+# Outputs with a fixed address are placed first, the planner does not move
+# them, and any overlap or bad alignment is reported.  The auto outputs are
+# then placed from largest to smallest, each at the lowest address that fits
+# (first-fit decreasing).
+#
+# The chosen addresses are kept in ".ConverterX16.Layout.RESOURCE_FILE" and
+# used the next time the resource is converted.  When an address changes the
+# resource is converted again.
+#
+################################################################################
+
+################################################################################
+# The memory and alignment of each kind of output
+layout_kind = \
+{	'bitmap'     : ( 'vram'   , 2048 )
+,	'map'        : ( 'vram'   , 512  )
+,	'palette'    : ( 'palette', 2    )
+,	'sprite'     : ( 'vram'   , 32   )
+,	'subpalette' : ( 'palette', 32   )
+,	'table'      : ( 'ram'    , 1    )
+,	'tile'       : ( 'vram'   , 2048 )
+}
+
+# The memory areas: ( space, start, end )
+layout_region = \
+{	'vram'    : ( 'vram', 0x00000, 0x1f9c0 )
+,	'palette' : ( 'vram', 0x1fa00, 0x1fc00 )
+,	'ram'     : ( 'ram' , 0x02000, None    )
+}
+
+layout_bank_size = 0x2000
+
+
+################################################################################
+# Get the outputs of a section that have an address
+#
+# Returns a list of ( address prefix, output filename, kind ).
+def _layout_output_list(converter, section_id, section_ini):
+	resource_type = _resource_type(section_id)
+	filename = _output_filename(converter, section_id)
+
+	output_list = []
+	if resource_type == 'bitmap':
+		output_list.append(( '', filename, 'bitmap' ))
+		if _chunks_get(section_ini):
+			output_list.append(( 'index_', _output_filename(converter, section_id, 'index'), 'table' ))
+	elif resource_type == 'layer':
+		output_list.append(( '', filename, 'tile' ))
+		output_list.append(( 'map_', _output_filename(converter, section_id, 'tilemap'), 'map' ))
+		if _sub_palettes_get(section_ini):
+			output_list.append(( 'palette_', _output_filename(converter, section_id, 'palette'), 'subpalette' ))
+	elif resource_type == 'palette':
+		output_list.append(( '', filename, 'palette' ))
+		if _palette_is_quantized(section_ini):
+			output_list.append(( 'bitmap_', _output_filename(converter, section_id, 'bitmap'), 'bitmap' ))
+	elif resource_type == 'sprite':
+		output_list.append(( '', filename, 'sprite' ))
+		output_list.append(( 'table_', _output_filename(converter, section_id, 'frame'), 'table' ))
+	elif resource_type == 'tilemap':
+		output_list.append(( '', filename, 'map' ))
+		if _strips_get(section_ini):
+			output_list.append(( 'column_', _output_filename(converter, section_id, 'column'), 'table' ))
+			output_list.append(( 'row_', _output_filename(converter, section_id, 'row'), 'table' ))
+	elif resource_type == 'tileset':
+		output_list.append(( '', filename, 'tile' ))
+		if _deduplicate_get(section_ini) != 'no' or _sub_palettes_get(section_ini):
+			output_list.append(( 'remap_', _output_filename(converter, section_id, 'remap'), 'table' ))
+		if _sub_palettes_get(section_ini):
+			output_list.append(( 'palette_', _output_filename(converter, section_id, 'palette'), 'subpalette' ))
+
+	return output_list
+
+
+################################################################################
+# Get the address prefixes that are "auto"
+def _layout_auto_list(section_ini):
+	auto_list = []
+	for prefix in ( '', 'bitmap_', 'column_', 'index_', 'map_', 'palette_', 'remap_', 'row_', 'table_' ):
+		if section_ini.get(f'{prefix}address', '').lower() == 'auto':
+			auto_list.append(prefix)
+
+	return auto_list
+
+
+################################################################################
+# Check if any section uses "Address = auto"
+def _layout_is_used(converter, index):
+	for section_id in _resource_section_list(converter, index):
+		if len(_layout_auto_list(_resource_section(index, section_id))) > 0:
+			return True
+
+	return False
+
+
+################################################################################
+# Get the memory and alignment of an output
+#
+# "Memory" and "Align" (with the address prefix) change the defaults.
+# Compressed data is loaded in to RAM before it is written to Vera.
+def _layout_memory_get(section_ini, prefix, kind):
+	memory, align = layout_kind[kind]
+
+	if prefix in ( '', 'bitmap_', 'map_' ) and _compression_get(section_ini) != 'none':
+		memory, align = ( 'ram', 1 )
+
+	memory = section_ini.get(f'{prefix}memory', memory).lower()
+	if memory not in layout_region:
+		_error(f'{prefix.title()}Memory must be one of {tuple(layout_region)}')
+
+	align = _int_get(section_ini, f'{prefix}align', align)
+	if align < 1:
+		_error(f'{prefix.title()}Align must be 1 or more')
+
+	return ( memory, align )
+
+
+################################################################################
+# Replace the "auto" addresses of a section with the planned addresses
+#
+# Before there is a plan the address is 0.
+def _layout_apply(converter, section_id, section_ini):
+	layout = converter.layout
+	if layout is None:
+		layout = {}
+
+	for prefix in _layout_auto_list(section_ini):
+		address = layout.get(section_id, {}).get(prefix, { 'bank': 0, 'address': 0 })
+
+		section_ini[f'{prefix}address_bank'] = '{0:0{1}x}'.format(address['bank'], 2)
+		section_ini[f'{prefix}address_high'] = '{0:0{1}x}'.format(address['address'] >> 8, 2)
+		section_ini[f'{prefix}address_low']  = '{0:0{1}x}'.format(address['address'] & 0xff, 2)
+
+	return
+
+
+################################################################################
+# Plan the layout and save it
+#
+# Returns the sections that have an address that changed.
+def _layout_update(converter, index):
+	layout = _layout_plan(converter, index)
+
+	changed_list = []
+	for section_id, address in layout.items():
+		if address != converter.layout.get(section_id):
+			changed_list.append(section_id)
+
+	if layout != converter.layout:
+		_layout_write(converter, layout)
+		converter.layout = layout
+
+	if converter.layout_file is not None:
+		_layout_export(converter, index, layout)
+
+	return changed_list
+
+
+################################################################################
+# Pack the outputs in to memory
+def _layout_plan(converter, index):
+	fixed_list = []
+	auto_list  = []
+
+	for section_id in _resource_section_list(converter, index):
+		section_ini = _resource_section(index, section_id)
+		section_auto = _layout_auto_list(section_ini)
+
+		for prefix, filename, kind in _layout_output_list(converter, section_id, section_ini):
+			if not os.path.exists(filename):
+				if prefix in section_auto:
+					_log_warning(converter, f'Layout: [{section_id}] {filename} was not converted, it has no address')
+				continue
+
+			memory, align = _layout_memory_get(section_ini, prefix, kind)
+			item = \
+			{	'section' : section_id
+			,	'prefix'  : prefix
+			,	'filename': filename
+			,	'memory'  : memory
+			,	'align'   : align
+			,	'size'    : max(os.path.getsize(filename) - 2, 0)
+			}
+
+			if prefix in section_auto:
+				auto_list.append(item)
+			elif _address_is_set(section_ini, prefix):
+				item['start'] = _layout_fixed_start(converter, section_ini, prefix, item)
+				if item['start'] is not None:
+					fixed_list.append(item)
+
+	free = _layout_free(converter, fixed_list)
+
+	auto_list.sort(key = lambda item: ( -item['size'], -item['align'], item['section'], item['prefix'] ))
+	for item in auto_list:
+		item['start'] = _layout_fit(converter, free, item)
+
+	_layout_report(converter, fixed_list + auto_list, free)
+
+	layout = {}
+	for item in auto_list:
+		layout.setdefault(item['section'], {})[item['prefix']] = \
+			_layout_address(item['memory'], item['start'])
+
+	return layout
+
+
+################################################################################
+# Get the start of an output with a fixed address
+#
+# Fixed addresses that are not aligned are reported.  A palette address is
+# always in the Vera palette, see _address_is_palette().
+def _layout_fixed_start(converter, section_ini, prefix, item):
+	addr_lo, addr_hi = _address_get(section_ini, prefix)
+	addr_bank = _int_get(section_ini, f'{prefix}address_bank', 0, 16)
+	address = (addr_hi << 8) | addr_lo
+
+	if item['memory'] == 'palette':
+		if not _address_is_palette(address):
+			_log_warning(converter, f'Layout: [{item["section"]}] {item["filename"]} is not in the Vera palette ($FA00-$FBFF)')
+			return None
+		start = 0x10000 | address
+	elif layout_region[item['memory']][0] == 'ram':
+		if address < 0xa000 or address > 0xbfff:
+			_log_warning(converter, f'Layout: [{item["section"]}] {item["filename"]} is not in high RAM ($A000-$BFFF)')
+			return None
+		start = (addr_bank * layout_bank_size) + (address - 0xa000)
+	else:
+		start = (addr_bank << 16) | address
+
+	if (start % item['align']) != 0:
+		_log_warning(converter, f'Layout: [{item["section"]}] {item["filename"]} at {start:05x} is not aligned to {item["align"]} bytes')
+
+	return start
+
+
+################################################################################
+# Get the free space of each memory area
+#
+# The free space is a list of [ start, end ] blocks.  The space used by the
+# fixed outputs is removed, overlapping fixed outputs are reported.
+def _layout_free(converter, fixed_list):
+	free = {}
+	for memory, ( space, start, end ) in layout_region.items():
+		if end is None:
+			end = converter.ram_banks * layout_bank_size
+		free[memory] = [ [ start, end ] ]
+
+	used = { 'vram': [], 'ram': [] }
+	for item in sorted(fixed_list, key = lambda item: item['start']):
+		space = layout_region[item['memory']][0]
+		start = item['start']
+		end   = start + item['size']
+
+		for other in used[space]:
+			if start < other['start'] + other['size'] and other['start'] < end:
+				_log_warning(converter, f'Layout: [{item["section"]}] {item["filename"]} overlaps [{other["section"]}] {other["filename"]}')
+		used[space].append(item)
+
+		for memory, ( region_space, _, _ ) in layout_region.items():
+			if region_space == space:
+				free[memory] = _layout_free_remove(free[memory], start, end)
+
+	return free
+
+
+################################################################################
+# Remove the space from the list of free blocks
+def _layout_free_remove(block_list, start, end):
+	result = []
+	for block_start, block_end in block_list:
+		if end <= block_start or start >= block_end:
+			result.append([ block_start, block_end ])
+			continue
+
+		if block_start < start:
+			result.append([ block_start, start ])
+		if end < block_end:
+			result.append([ end, block_end ])
+
+	return result
+
+
+################################################################################
+# Find the lowest address that the output fits in
+def _layout_fit(converter, free, item):
+	block_list = free[item['memory']]
+	size  = item['size']
+	align = item['align']
+	space = layout_region[item['memory']][0]
+
+	for block_start, block_end in block_list:
+		start = ((block_start + align - 1) // align) * align
+
+		if space == 'ram':
+			bank_offset = start % layout_bank_size
+			if size > layout_bank_size and bank_offset != 0:
+				start += layout_bank_size - bank_offset
+			elif size <= layout_bank_size and (bank_offset + size) > layout_bank_size:
+				start += layout_bank_size - bank_offset
+
+		if start + size <= block_end:
+			free[item['memory']] = _layout_free_remove(block_list, start, start + size)
+			return start
+
+	_error(f'Layout: [{item["section"]}] {item["filename"]} ({size} bytes) does not fit in {item["memory"]}')
+
+
+################################################################################
+# Convert the start of an output to its bank and address
+def _layout_address(memory, start):
+	if layout_region[memory][0] == 'ram':
+		return { 'bank': start // layout_bank_size, 'address': 0xa000 + (start % layout_bank_size) }
+
+	return { 'bank': start >> 16, 'address': start & 0xffff }
+
+
+################################################################################
+# Report how much of each memory area is used
+def _layout_report(converter, item_list, free):
+	for item in sorted(item_list, key = lambda item: ( item['memory'], item['start'] )):
+		_log_info(converter, f'Layout: {item["memory"]:<7} {item["start"]:05x}-{item["start"] + item["size"]:05x} {item["filename"]}')
+
+	for memory, ( space, start, end ) in layout_region.items():
+		if end is None:
+			end = converter.ram_banks * layout_bank_size
+
+		size = end - start
+		free_size = sum(block_end - block_start for block_start, block_end in free[memory])
+		free_max = max([ block_end - block_start for block_start, block_end in free[memory] ], default = 0)
+
+		_log_status(converter
+			, f'Layout: {memory:<7} {size - free_size:>6} of {size:>6} bytes used' \
+			  f' ({_compression_ratio(size, size - free_size)}),' \
+			  f' largest free block {free_max} bytes'
+			)
+
+	return
+
+
+################################################################################
+def _layout_filename(resource_filename):
+	resource_dir, resource_name = os.path.split(resource_filename)
+	filename = os.path.join(resource_dir, f'.ConverterX16.Layout.{resource_name}')
+
+	return filename
+
+
+################################################################################
+# Read the saved layout
+#
+# Returns { SECTION_ID: { PREFIX: { 'bank': BANK, 'address': ADDRESS } } }
+def _layout_read(converter):
+	filename = _layout_filename(converter.resource)
+
+	try:
+		with open(filename) as layout_file:
+			layout = json.load(layout_file)
+	except (OSError, ValueError):
+		return {}
+
+	return layout
+
+
+################################################################################
+# Save the layout
+def _layout_write(converter, layout):
+	filename = _layout_filename(converter.resource)
+	filename_tmp = f'{filename}.{os.getpid()}'
+
+	try:
+		with open(filename_tmp, 'w') as layout_file:
+			json.dump(layout, layout_file, indent = '\t', sort_keys = True)
+		os.replace(filename_tmp, filename)
+	except OSError:
+		_log_warning(converter, f'Layout: Unable to write {filename}')
+
+	return
+
+
+################################################################################
+# Write the layout as a ca65 include file
+#
+# For the resource "Foo" with "Map_Address = auto":
+#   Foo_Map_Bank    = $00
+#   Foo_Map_Address = $4000
+def _layout_export(converter, index, layout):
+	line_list = [ f'; Generated by ConverterX16.py from {converter.resource}', '' ]
+
+	for section_id in sorted(layout):
+		for prefix, address in sorted(layout[section_id].items()):
+			name = _resource_name(section_id) + '_' + prefix.title()
+			line_list.append(f'{name}Bank    = ${address["bank"]:02x}')
+			line_list.append(f'{name}Address = ${address["address"]:04x}')
+
+	text = '\n'.join(line_list) + '\n'
+
+	try:
+		with open(converter.layout_file) as layout_file:
+			if layout_file.read() == text:
+				return
+	except OSError:
+		pass
+
+	with open(converter.layout_file, 'w') as layout_file:
+		layout_file.write(text)
+
+	_log_status(converter, f'{converter.layout_file}')
+
+	return
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Statistics
+################################################################################
+#
+# With "--stats", the wall and CPU time of each stage of converting a resource
+# section is recorded, along with some counters.  Work that is not part of a
+# section, like reading the resource file, is recorded under "(resource)".
+#
+# stats_data =
+# {	SECTION_ID :
+# 	{	'wall'    : SECONDS
+# 	,	'cpu'     : SECONDS
+# 	,	'stage'   : { STAGE : [ WALL, CPU ], ... }
+# 	,	'counter' : { NAME : COUNT, ... }
+# 	}
+# }
+#
+################################################################################
+
+################################################################################
+# Get the statistics of the current section
+def _stats_record(converter):
+	section_id = converter.stats_section
+	if section_id is None:
+		section_id = '(resource)'
+
+	if section_id not in converter.stats_data:
+		converter.stats_data[section_id] = \
+		{	'wall'    : 0.0
+		,	'cpu'     : 0.0
+		,	'stage'   : {}
+		,	'counter' : {}
+		}
+
+	return converter.stats_data[section_id]
+
+
+################################################################################
+# Time a stage of the current section
+#
+# Use a stage of None to time the whole section.  Nothing is done when
+# "--stats" is not used.
+@contextlib.contextmanager
+def _stats_stage(converter, stage):
+	if converter.stats is None:
+		yield
+		return
+
+	wall = time.perf_counter()
+	cpu  = time.process_time()
+	try:
+		yield
+	finally:
+		wall = time.perf_counter() - wall
+		cpu  = time.process_time() - cpu
+
+		record = _stats_record(converter)
+		if stage is None:
+			record['wall'] += wall
+			record['cpu']  += cpu
+		else:
+			timing = record['stage'].setdefault(stage, [ 0.0, 0.0 ])
+			timing[0] += wall
+			timing[1] += cpu
+
+	return
+
+
+################################################################################
+# Add to a counter of the current section
+def _stats_count(converter, name, count = 1):
+	if converter.stats is None:
+		return
+
+	counter = _stats_record(converter)['counter']
+	counter[name] = counter.get(name, 0) + count
+
+	return
+
+
+################################################################################
+# Count the input files of a section and their size
+def _stats_input_files(converter, section_id, section_ini):
+	for filename in _section_input_files(converter, section_id, section_ini):
+		if os.path.exists(filename):
+			_stats_count(converter, 'files_in')
+			_stats_count(converter, 'bytes_in', os.path.getsize(filename))
+
+	return
+
+
+################################################################################
+# Read an INI file as the "ini" stage
+def _stats_read_ini(converter, filename):
+	with _stats_stage(converter, 'ini'):
+		file_ini = configparser.ConfigParser()
+		file_ini.read(filename)
+		_stats_count(converter, 'files_opened')
+
+	return file_ini
+
+
+################################################################################
+# Load an image as the "decode" stage
+def _stats_load_tile(converter, filename, bits_per_pixel):
+	with _stats_stage(converter, 'decode'):
+		pixels = _load_tile(_image_load(converter, filename), bits_per_pixel)
+		_stats_count(converter, 'pixels', pixels.size)
+
+	return pixels
+
+
+################################################################################
+# Add the statistics from a worker process
+def _stats_merge(converter, stats_data):
+	for section_id, source in stats_data.items():
+		converter.stats_section = section_id
+		record = _stats_record(converter)
+
+		record['wall'] += source['wall']
+		record['cpu']  += source['cpu']
+
+		for stage, ( wall, cpu ) in source['stage'].items():
+			timing = record['stage'].setdefault(stage, [ 0.0, 0.0 ])
+			timing[0] += wall
+			timing[1] += cpu
+
+		for name, count in source['counter'].items():
+			record['counter'][name] = record['counter'].get(name, 0) + count
+
+	converter.stats_section = None
+
+	return
+
+
+################################################################################
+# Add up the statistics of all the sections
+#
+# Returns the total time of each stage and the total of each counter.
+def _stats_total(converter):
+	stage_total   = {}
+	counter_total = {}
+
+	for record in converter.stats_data.values():
+		for stage, ( wall, cpu ) in record['stage'].items():
+			timing = stage_total.setdefault(stage, [ 0.0, 0.0 ])
+			timing[0] += wall
+			timing[1] += cpu
+
+		for name, count in record['counter'].items():
+			counter_total[name] = counter_total.get(name, 0) + count
+
+	return ( stage_total, counter_total )
+
+
+################################################################################
+# Print the statistics
+def stats_report(converter):
+	stage_total, counter_total = _stats_total(converter)
+
+	if converter.stats == 'json':
+		report = \
+		{	'version' : '.'.join(map(str, converter.version))
+		,	'jobs'    : converter.jobs
+		,	'section' : converter.stats_data
+		,	'stage'   : stage_total
+		,	'counter' : counter_total
+		}
+		print(json.dumps(report, indent = '\t', sort_keys = True))
+		return
+
+	print(f'{"Section / Stage":<40} {"Wall ms":>10} {"CPU ms":>10}')
+
+	for section_id, record in converter.stats_data.items():
+		print(f'{section_id:<40} {record["wall"] * 1000:>10.3f} {record["cpu"] * 1000:>10.3f}')
+		for stage, ( wall, cpu ) in record['stage'].items():
+			print(f'  {stage:<38} {wall * 1000:>10.3f} {cpu * 1000:>10.3f}')
+
+	print(f'{"Total":<40}')
+	for stage, ( wall, cpu ) in sorted(stage_total.items()):
+		print(f'  {stage:<38} {wall * 1000:>10.3f} {cpu * 1000:>10.3f}')
+
+	print(f'{"Counter":<40} {"Count":>10}')
+	for name, count in sorted(counter_total.items()):
+		print(f'  {name:<38} {count:>10}')
+
+	return
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Watch
+################################################################################
+#
+# With "--watch", the process keeps running after the resources have been
+# converted and waits for their input files to change.  The resource file
+# index, the layout, and the decoded images stay in memory, so a save
+# only converts the resources that use the changed file, and the bundles that
+# contain them.
+#
+# Watched Files:
+# - The resource file
+# - The "File" of every resource section
+# - The files that those files reference, like the tile images of a Tileset
+#   INI file
+#
+# On Linux, inotify is used to wait for the changes.  The directories of the
+# files are watched, so that editors which save by renaming a new file are
+# seen.  Otherwise the files are polled.
+#
+################################################################################
+
+watch_poll_interval = 0.25
+watch_settle_time   = 0.02
+
+# The inotify events that change the contents of a file
+watch_inotify_event = \
+{	'IN_ATTRIB'      : 0x00000004
+,	'IN_CLOSE_WRITE' : 0x00000008
+,	'IN_MOVED_FROM'  : 0x00000040
+,	'IN_MOVED_TO'    : 0x00000080
+,	'IN_CREATE'      : 0x00000100
+,	'IN_DELETE'      : 0x00000200
+}
+
+watch_inotify_overflow = 0x00004000
+
+
+################################################################################
+# Convert the resources again when their input files change
+#
+# Does not return until Ctrl-C is pressed.
+def watch(converter, section_list):
+	monitor = _watch_open(converter)
+
+	try:
+		while True:
+			file_map = _watch_file_map(converter, section_list)
+
+			print(f'Watching {len(file_map)} files, press Ctrl-C to stop')
+
+			changed_list = _watch_wait(monitor, file_map)
+			for filename in sorted(changed_list):
+				print(f'Changed: {filename}')
+
+			section_list, convert_list = _watch_affected(converter
+				, section_list
+				, file_map
+				, changed_list
+				)
+
+			if len(convert_list) > 0:
+				_watch_convert(converter, convert_list)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		_watch_close(monitor)
+
+	return
+
+
+################################################################################
+# Convert the resources that were changed
+#
+# The resources are always converted, even if their outputs look up to date.
+def _watch_convert(converter, section_list):
+	convert_stale = converter.convert_stale
+	converter.convert_stale = False
+
+	if converter.stats is not None:
+		converter.stats_data = {}
+
+	start = time.perf_counter()
+	try:
+		error_count = convert(converter, section_list)
+	finally:
+		converter.convert_stale = convert_stale
+
+	elapsed = (time.perf_counter() - start) * 1000
+
+	print(f'Converted {len(section_list) - error_count} of {len(section_list)} resources in {elapsed:.1f} ms')
+
+	if converter.stats is not None:
+		stats_report(converter)
+
+	return
+
+
+################################################################################
+# Get the watched files
+#
+# Returns the normalized file name ==> Section ID set.  The sets of files that
+# are not used by a resource, like the resource file, are empty.  The inputs
+# of a bundle are the outputs of other resources, so they are not watched.
+def _watch_file_map(converter, section_list):
+	index = _resource_index(converter)
+
+	file_map = { _filename_normalize(converter.resource) : set() }
+
+	for section_id in section_list:
+		if _resource_type(section_id) == 'bundle':
+			continue
+
+		section_ini = _resource_section(index, section_id)
+		try:
+			filename_list = _section_input_files(converter, section_id, section_ini)
+		except ConverterError as error:
+			_log_section_error(section_id, error)
+			continue
+
+		for filename in filename_list:
+			filename = _filename_normalize(filename)
+			file_map.setdefault(filename, set()).add(section_id)
+
+	return file_map
+
+
+################################################################################
+# Get the resources to convert for the changed files
+#
+# When the resource file was changed, it is read again and the resources that
+# were added or whose options were changed are also converted.  The updated
+# Section ID list and the Section IDs to convert are returned.
+def _watch_affected(converter, section_list, file_map, changed_list):
+	convert_set = set()
+
+	for filename in changed_list:
+		convert_set |= file_map.get(filename, set())
+
+	if _filename_normalize(converter.resource) in changed_list:
+		index = converter.index
+		converter.index = None
+
+		try:
+			section_list = get_section_list(converter)
+		except (ConverterError, configparser.Error, OSError) as error:
+			print(f"Error: {error}")
+			converter.index = index
+			return ( section_list, [] )
+
+		for section_id in section_list:
+			section = index['section'].get(section_id)
+			if section is None \
+			or section['option'] != converter.index['section'][section_id]['option']:
+				convert_set.add(section_id)
+
+	index = _resource_index(converter)
+	for section_id in section_list:
+		if _resource_type(section_id) != 'bundle':
+			continue
+
+		section_ini = _resource_section(index, section_id)
+		try:
+			member_list = _bundle_member_list(converter, section_id, section_ini)
+		except ConverterError:
+			member_list = []
+
+		if len(convert_set.intersection(member_list)) > 0:
+			convert_set.add(section_id)
+
+	convert_list = [ section_id for section_id in section_list if section_id in convert_set ]
+
+	return ( section_list, convert_list )
+
+
+################################################################################
+# Start watching
+#
+# The monitor is a dictionary:
+# - fd   : The inotify file descriptor, None when polling
+# - libc : The C library that has the inotify functions
+# - wd   : inotify watch descriptor ==> directory
+# - stat : File name ==> ( mtime, size ), used when polling
+def _watch_open(converter):
+	monitor = \
+	{	'fd'   : None
+	,	'libc' : None
+	,	'wd'   : {}
+	,	'stat' : {}
+	}
+
+	if not sys.platform.startswith('linux'):
+		_log_status(converter, 'Watch: Polling for changes')
+		return monitor
+
+	import ctypes
+	import ctypes.util
+
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+		fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+	except (AttributeError, OSError):
+		fd = -1
+
+	if fd < 0:
+		_log_status(converter, 'Watch: inotify is not available, polling for changes')
+		return monitor
+
+	_log_status(converter, 'Watch: Using inotify')
+
+	monitor['fd']   = fd
+	monitor['libc'] = libc
+
+	return monitor
+
+
+################################################################################
+# Stop watching
+def _watch_close(monitor):
+	if monitor['fd'] is not None:
+		os.close(monitor['fd'])
+		monitor['fd'] = None
+
+	return
+
+
+################################################################################
+# Wait for a watched file to change
+#
+# Returns the set of changed files.  Changes that happen within a short time
+# of each other, like an editor writing a backup file, are returned together.
+def _watch_wait(monitor, file_map):
+	if monitor['fd'] is None:
+		return _watch_poll_wait(monitor, file_map)
+
+	_watch_inotify_update(monitor, file_map)
+
+	changed_set = set()
+	timeout     = None
+
+	while True:
+		ready, _, _ = select.select([ monitor['fd'] ], [], [], timeout)
+		if len(ready) == 0:
+			if len(changed_set) > 0:
+				return changed_set
+			timeout = None
+			continue
+
+		changed_set |= _watch_inotify_read(monitor, file_map)
+		if len(changed_set) > 0:
+			timeout = watch_settle_time
+
+
+################################################################################
+# Watch the directories of the files
+def _watch_inotify_update(monitor, file_map):
+	libc = monitor['libc']
+
+	mask = 0
+	for event in watch_inotify_event.values():
+		mask |= event
+
+	directory_set = set(os.path.dirname(filename) or '.' for filename in file_map)
+	watched_set   = set(monitor['wd'].values())
+
+	for wd, directory in list(monitor['wd'].items()):
+		if directory not in directory_set:
+			libc.inotify_rm_watch(monitor['fd'], wd)
+			del monitor['wd'][wd]
+
+	for directory in directory_set - watched_set:
+		wd = libc.inotify_add_watch(monitor['fd'], os.fsencode(directory), mask)
+		if wd >= 0:
+			monitor['wd'][wd] = directory
+
+	return
+
+
+################################################################################
+# Read the pending inotify events
+#
+# Each event is a "struct inotify_event" followed by the file name, padded
+# with NUL bytes.  Returns the set of watched files that were changed.
+def _watch_inotify_read(monitor, file_map):
+	changed_set = set()
+
+	while True:
+		try:
+			data = os.read(monitor['fd'], 64 * 1024)
+		except BlockingIOError:
+			break
+
+		offset = 0
+		while offset < len(data):
+			wd, mask, _, length = struct.unpack_from('iIII', data, offset)
+			name = data[offset + 16 : offset + 16 + length].rstrip(b'\0')
+			offset += 16 + length
+
+			if mask & watch_inotify_overflow:
+				changed_set |= set(file_map)
+				continue
+
+			directory = monitor['wd'].get(wd)
+			if directory is None or len(name) == 0:
+				continue
+
+			filename = _filename_normalize(os.path.join(directory, os.fsdecode(name)))
+			if filename in file_map:
+				changed_set.add(filename)
+
+	return changed_set
+
+
+################################################################################
+# Poll the files until one of them changes
+def _watch_poll_wait(monitor, file_map):
+	stat_map = monitor['stat']
+
+	for filename in file_map:
+		if filename not in stat_map:
+			stat_map[filename] = _watch_stat(filename)
+
+	while True:
+		time.sleep(watch_poll_interval)
+
+		changed_set = set()
+		for filename in file_map:
+			stat = _watch_stat(filename)
+			if stat != stat_map[filename]:
+				stat_map[filename] = stat
+				changed_set.add(filename)
+
+		if len(changed_set) > 0:
+			return changed_set
+
+
+################################################################################
+# Get the modification time and size of a file, None if it does not exist
+def _watch_stat(filename):
+	try:
+		stat = os.stat(filename)
+	except OSError:
+		return None
+
+	return ( stat.st_mtime_ns, stat.st_size )
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Preview
+################################################################################
+#
+# With "--preview", the outputs of the resources are drawn to PNG files,
+# "Foo.png", the same way that Vera would show them.  Nothing is converted,
+# the outputs must already exist.
+#
+# - Bitmap  : The bitmap, as wide as its image
+# - Layer   : The tilemap, drawn with the tiles of the layer
+# - Tilemap : The tilemap, drawn with the tiles of "Preview_Tileset"
+# - Tileset : The tiles, 16 across, in the order of the remap table if there
+#             is one
+#
+# The colors are the default Vera palette, with the palettes in
+# "Preview_Palette" and the sub-palettes of the tiles written over it.
+#
+################################################################################
+
+# The default palette of Commander X16 r38, see Example_Resource/palette_16x16.ini
+vera_palette_default = \
+	( '000 fff 800 afe c4c 0c5 00a ee7 d85 640 f77 333 777 af6 08f bbb'
+	, '000 111 222 333 444 555 666 777 888 999 aaa bbb ccc ddd eee fff'
+	, '211 433 644 866 a88 c99 fbb 211 422 633 844 a55 c66 f77 200 411'
+	, '611 822 a22 c33 f33 200 400 600 800 a00 c00 f00 221 443 664 886'
+	, 'aa8 cc9 feb 211 432 653 874 a95 cb6 fd7 210 431 651 862 a82 ca3'
+	, 'fc3 210 430 640 860 a80 c90 fb0 121 343 564 786 9a8 bc9 dfb 121'
+	, '342 463 684 8a5 9c6 bf7 120 241 461 582 6a2 8c3 9f3 120 240 360'
+	, '480 5a0 6c0 7f0 121 343 465 686 8a8 9ca bfc 121 242 364 485 5a6'
+	, '6c8 7f9 020 141 162 283 2a4 3c5 3f6 020 041 061 082 0a2 0c3 0f3'
+	, '122 344 466 688 8aa 9cc bff 122 244 366 488 5aa 6cc 7ff 022 144'
+	, '166 288 2aa 3cc 3ff 022 044 066 088 0aa 0cc 0ff 112 334 456 668'
+	, '88a 9ac bcf 112 224 346 458 56a 68c 79f 002 114 126 238 24a 35c'
+	, '36f 002 014 016 028 02a 03c 03f 112 334 546 768 98a b9c dbf 112'
+	, '324 436 648 85a 96c b7f 102 214 416 528 62a 83c 93f 102 204 306'
+	, '408 50a 60c 70f 212 434 646 868 a8a c9c fbe 211 423 635 847 a59'
+	, 'c6b f7d 201 413 615 826 a28 c3a f3c 201 403 604 806 a08 c09 f0b'
+	)
+
+preview_tileset_width = 16
+
+
+################################################################################
+# Draw the resources to PNG files
+#
+# The number of resources that failed is returned.
+def preview(converter, section_list):
+	error_count = 0
+
+	for section_id in section_list:
+		try:
+			_preview_section(converter, section_id)
+		except ConverterError as error:
+			_log_section_error(section_id, error)
+			error_count += 1
+
+	return error_count
+
+
+################################################################################
+# Draw a resource to a PNG file
+def _preview_section(converter, section_id):
+	import numpy
+	from PIL import Image
+
+	section_ini = _resource_section(_resource_index(converter), section_id)
+	_layout_apply(converter, section_id, section_ini)
+
+	resource_type = _resource_type(section_id)
+	if resource_type == 'bitmap':
+		pixels = _preview_bitmap(converter, section_id, section_ini)
+		tiles_id = None
+	elif resource_type in ( 'layer', 'tilemap' ):
+		tiles_id = _preview_tiles_id(converter, section_id, section_ini)
+		pixels = _preview_tilemap(converter, section_id, section_ini, tiles_id)
+	elif resource_type == 'tileset':
+		tiles_id = section_id
+		pixels = _preview_tileset(converter, section_id, section_ini)
+	else:
+		_log_status(converter, f'Preview: [{section_id}] {resource_type.title()} resources can not be previewed')
+		return
+
+	palette = _preview_palette(converter, section_ini, tiles_id)
+
+	# The color indexes are saved with the palette, which is much smaller and
+	# faster to write than the R,G,B pixels
+	image = Image.fromarray(numpy.ascontiguousarray(pixels, dtype = numpy.uint8), 'P')
+	image.putpalette(palette.tobytes())
+
+	filename = _output_filename(converter, section_id, 'preview')
+	image.save(filename)
+
+	_log_info(converter, f'Preview: {pixels.shape[1]}x{pixels.shape[0]}')
+	_log_status(converter, f'{filename}')
+
+	return
+
+
+################################################################################
+# Get the color indexes of a bitmap
+def _preview_bitmap(converter, section_id, section_ini):
+	filename = _filename_get(section_ini)
+	if filename is None:
+		_error(f'Ini Key "File" not found')
+
+	filename = _filename_normalize(filename)
+	_filename_validate(filename)
+	width = _image_load(converter, filename)['size'][0]
+
+	_, data = _preview_read(section_ini, '', _output_filename(converter, section_id))
+	pixels = _preview_unpack(data, _bits_per_pixel_get(section_ini))
+
+	height = pixels.size // width
+	return pixels[:width * height].reshape(height, width)
+
+
+################################################################################
+# Get the color indexes of a tilemap
+#
+# Entries that use a tile that is not in the tileset are drawn with color 0,
+# Vera would draw whatever is in the memory after the tiles.
+def _preview_tilemap(converter, section_id, section_ini, tiles_id):
+	if _resource_type(section_id) == 'layer':
+		filename = _output_filename(converter, section_id, 'tilemap')
+		prefix = 'map_'
+	else:
+		filename = _output_filename(converter, section_id)
+		prefix = ''
+
+	_, data = _preview_read(section_ini, prefix, filename)
+	width = _preview_map_width(converter, section_id, section_ini, tiles_id)
+
+	tiles, bits_per_pixel = _preview_tiles(converter, tiles_id)
+
+	entry = _preview_entries(data, width)
+	pixels, missing = _preview_draw(tiles, bits_per_pixel, *entry)
+
+	if missing > 0:
+		_log_warning(converter, f'Preview: [{section_id}] {missing} tilemap entries use a tile that is not in [{tiles_id}]')
+
+	return pixels
+
+
+################################################################################
+# Get the color indexes of the tiles of a tileset
+#
+# The remap table is tilemap entries for the original tiles, so drawing it
+# shows the tiles as they were before deduplication, with their sub-palettes.
+def _preview_tileset(converter, section_id, section_ini):
+	import numpy
+
+	tiles, bits_per_pixel = _preview_tiles(converter, section_id)
+
+	remap = _output_filename(converter, section_id, 'remap')
+	if os.path.exists(remap):
+		_, data = _preview_read(section_ini, 'remap_', remap)
+		entry = numpy.frombuffer(data, dtype = numpy.uint8)
+	else:
+		entry = numpy.zeros(len(tiles) * 2, dtype = numpy.uint8)
+		entry[0::2] = numpy.arange(len(tiles)) & 0xff
+		entry[1::2] = numpy.arange(len(tiles)) >> 8
+
+	tile_index, palette_offset, v_flip, h_flip = _preview_entries(entry, 1)
+
+	# The padding uses a tile that does not exist, so it is empty
+	padding = ( ( 0, (-len(tile_index)) % preview_tileset_width ), ( 0, 0 ) )
+	tile_index     = numpy.pad(tile_index, padding, constant_values = len(tiles))
+	palette_offset = numpy.pad(palette_offset, padding)
+	v_flip         = numpy.pad(v_flip, padding)
+	h_flip         = numpy.pad(h_flip, padding)
+
+	shape = ( -1, preview_tileset_width )
+	pixels, _ = _preview_draw(tiles
+		, bits_per_pixel
+		, tile_index.reshape(shape)
+		, palette_offset.reshape(shape)
+		, v_flip.reshape(shape)
+		, h_flip.reshape(shape)
+		)
+
+	return pixels
+
+
+################################################################################
+# Get the section of the tiles that a tilemap uses
+#
+# A layer uses its own tiles.  A tilemap uses the Tileset or Layer resource in
+# "Preview_Tileset".
+def _preview_tiles_id(converter, section_id, section_ini):
+	if _resource_type(section_id) == 'layer':
+		return section_id
+
+	tiles_list = _preview_section_list(converter, section_ini, 'preview_tileset')
+	if len(tiles_list) != 1 or _resource_type(tiles_list[0]) not in ( 'layer', 'tileset' ):
+		_error('Preview_Tileset must be one Tileset or Layer resource')
+
+	return tiles_list[0]
+
+
+################################################################################
+# Get the tiles of a Tileset or Layer
+#
+# Returns the color indexes as a ( TILE, ROW, COLUMN ) array and the
+# Bits-Per-Pixel.
+def _preview_tiles(converter, tiles_id):
+	tiles_ini = _resource_section(_resource_index(converter), tiles_id)
+	_layout_apply(converter, tiles_id, tiles_ini)
+
+	bits_per_pixel = _bits_per_pixel_get(tiles_ini)
+	tile_width, tile_height = _preview_tile_size(converter, tiles_id, tiles_ini)
+
+	_, data = _preview_read(tiles_ini, '', _output_filename(converter, tiles_id))
+	pixels = _preview_unpack(data, bits_per_pixel)
 
-	return data
+	tile_count = pixels.size // (tile_width * tile_height)
+	tiles = pixels[:tile_count * tile_width * tile_height].reshape(tile_count, tile_height, tile_width)
 
+	return ( tiles, bits_per_pixel )
 
-################################################################################
-# }}}
-################################################################################
 
 ################################################################################
-# {{{ Convert : Tileset
-################################################################################
+# Get the size of the tiles
+#
+# The tiles of a Tileset INI file are as large as their images.
+def _preview_tile_size(converter, tiles_id, tiles_ini):
+	filename = _filename_get(tiles_ini)
+
+	tile_ini = None
+	if _resource_type(tiles_id) == 'tileset':
+		if filename is None:
+			tile_ini = tiles_ini
+		elif filename.split('.')[-1].lower() == 'ini':
+			file_ini = configparser.ConfigParser()
+			file_ini.read(_filename_normalize(filename))
+			if 'Tileset' in file_ini:
+				tile_ini = file_ini['Tileset']
+
+	if tile_ini is not None and '000' in tile_ini:
+		return _image_load(converter, tile_ini['000'])['size']
+
+	return \
+		( _tile_size_get(tiles_ini, 'tile_width')
+		, _tile_size_get(tiles_ini, 'tile_height')
+		)
+
 
 ################################################################################
-# Determine the source of the tileset data
-def _convert_tileset(converter, section_id, section_ini):
-	data = []
+# Get the number of tiles across a tilemap
+#
+# Map_Width is used when it is there, otherwise it is the width of the input.
+def _preview_map_width(converter, section_id, section_ini, tiles_id):
+	if 'map_width' in section_ini:
+		return _int_get(section_ini, 'map_width', 0)
+
 	filename = _filename_get(section_ini)
-	if filename is None:
-		data = _convert_tileset_ini_section(converter, section_ini)
-	else:
-		_log_debug(converter, f'File: {filename}')
 
-		filename = _filename_normalize(filename)
+	if _resource_type(section_id) == 'layer':
+		tiles_ini = _resource_section(_resource_index(converter), tiles_id)
+		tile_width, _ = _preview_tile_size(converter, tiles_id, tiles_ini)
 		_filename_validate(filename)
-		_filename_set(section_ini, filename)
+		return _image_load(converter, filename)['size'][0] // tile_width
 
-		ext = filename.split('.')[-1]
-		if ext == 'ini':
-			data = _convert_tileset_ini(converter, section_ini)
-		else:
-			_error(f'Tileset resources do not support file extension ".{ext}"')
+	if _strips_get(section_ini):
+		return 32
 
-	address = _address_get(section_ini)
-	filename = _output_filename(converter, section_id)
-	_write_data(converter, address, data, filename)
+	if filename is None:
+		return _tilemap_ini_width(section_ini)
 
-	return
+	filename = _filename_normalize(filename)
+	_filename_validate(filename)
+
+	ext = filename.split('.')[-1].lower()
+	if ext == 'ini':
+		file_ini = configparser.ConfigParser()
+		file_ini.read(filename)
+		if 'Tilemap' not in file_ini:
+			_error(f'{filename} does not contain a "Tilemap" section')
+		return _tilemap_ini_width(file_ini['Tilemap'])
+	if ext == 'csv':
+		gid, _ = _tiled_read_csv(filename)
+	elif ext == 'tmx':
+		gid, _ = _tiled_read_tmx(filename, section_ini.get('layer'))
+	else:
+		gid, _ = _tiled_read_json(filename, section_ini.get('layer'))
+
+	return gid.shape[1]
 
 
 ################################################################################
-# Convert the tileset data
-def _convert_tileset_ini(converter, section_ini):
-	_log_debug(converter, f'Tileset: {[option for option in section_ini]}')
-	filename       = _filename_get(section_ini)
+# Get the palette as an array of 256 R,G,B colors
+#
+# The palettes are written over the default palette, starting at the color
+# of their address when it is in the Vera palette ($1FA00-$1FBFF), otherwise
+# at color 0.
+def _preview_palette(converter, section_ini, tiles_id):
+	import numpy
 
-	file_ini = configparser.ConfigParser()
-	file_ini.read(filename)
+	color = numpy.array([ int(rgb, 16) for row in vera_palette_default for rgb in row.split() ], dtype = numpy.uint16)
 
-	if 'Tileset' not in file_ini:
-		_error(f'{filename} does not contain a "Tileset" section')
+	palette_list = []
+	for palette_id in _preview_section_list(converter, section_ini, 'preview_palette'):
+		if _resource_type(palette_id) != 'palette':
+			_error(f'"[{palette_id}]" is not a Palette resource')
+		palette_ini = _resource_section(_resource_index(converter), palette_id)
+		_layout_apply(converter, palette_id, palette_ini)
+		palette_list.append(( palette_ini, '', _output_filename(converter, palette_id) ))
 
-	# Copy the Bits-Per-Pixel to the other INI file
-	bits_per_pixel = _bits_per_pixel_get(section_ini)
+	if tiles_id is not None:
+		tiles_ini = _resource_section(_resource_index(converter), tiles_id)
+		if _sub_palettes_get(tiles_ini):
+			_layout_apply(converter, tiles_id, tiles_ini)
+			palette_list.append(( tiles_ini, 'palette_', _output_filename(converter, tiles_id, 'palette') ))
 
-	section_ini = file_ini['Tileset']
+	for palette_ini, prefix, filename in palette_list:
+		address, data = _preview_read(palette_ini, prefix, filename)
 
-	_bits_per_pixel_set(section_ini, bits_per_pixel)
+		start = 0
+		if _address_is_palette(address):
+			start = (address - 0xfa00) // 2
 
-	data = _convert_tileset_ini_section(converter, section_ini)
+		entry = numpy.frombuffer(data, dtype = numpy.uint8)[:(256 - start) * 2].reshape(-1, 2)
+		color[start:start + len(entry)] = ((entry[:, 1].astype(numpy.uint16) & 0x0f) << 8) | entry[:, 0]
 
-	return data
+	rgb = numpy.stack(( color >> 8, (color >> 4) & 0x0f, color & 0x0f ), axis = 1)
+
+	return (rgb * 17).astype(numpy.uint8)
 
 
 ################################################################################
-# Convert the tileset data
-def _convert_tileset_ini_section(converter, section_ini):
-	_log_debug(converter, f'Tileset: {[option for option in section_ini]}')
+# Get the Section IDs in a preview option, "SECTION, SECTION, ..."
+def _preview_section_list(converter, section_ini, key):
+	index = _resource_index(converter)
 
-	index = '000'
-	if index not in section_ini:
-		_error(f'Palette: Unable to locate the first index "{index}"')
-	
-	bits_per_pixel = _bits_per_pixel_get(section_ini)
-	tile_max_count = 0x3ff
+	section_list = []
+	for section_id in section_ini.get(key, '').replace(',', '\n').split('\n'):
+		section_id = ' '.join(section_id.split())
+		if len(section_id) == 0:
+			continue
 
-	data = []
-	done = False
-	while not done:
-		filename = section_ini[index]
-		filename = _filename_normalize(filename)
-		_filename_validate(filename)
-		_log_info(converter, f'Tile: {filename}')
+		if section_id not in index['section']:
+			_error(f'Resource "[{section_id}]" not found')
 
-		image = Image.open(filename)
+		section_list.append(section_id)
 
-		if image.format == 'GIF':
-			image_data = _load_gif(image, bits_per_pixel)
-		else:
-			_error(f'Unsupported image type: {image.format}')
+	return section_list
 
-		_log_debug(converter, f'image_data: {image_data}')
-		data.extend(image_data)
 
-		next_index = int(index, 16) + 1
-		index = '{0:0{1}x}'.format(next_index, 3)
-		_log_debug(converter, f'index: {index}')
+################################################################################
+# Read an output file
+#
+# Returns the address from the file header and the data.
+def _preview_read(section_ini, prefix, filename):
+	if prefix in ( '', 'bitmap_', 'map_' ) and _compression_get(section_ini) != 'none':
+		_error(f'"{filename}" is compressed, it can not be previewed')
 
-		if index not in section_ini:
-			_log_info(converter, f'Tileset: Unable to locate index {index}, assuming done')
-			break
-		if next_index > tile_max_count:
-			_log_warning(converter, f'Number of tiles exceeds the maximum of {tile_max_count}')
-			break
+	if not os.path.exists(filename):
+		_error(f'"{filename}" was not converted')
 
-	_log_debug(converter, f'data: {data}')
+	with open(filename, 'rb') as output:
+		header = output.read(2)
+		data   = output.read()
 
-	return data
+	return ( int.from_bytes(header, 'little'), data )
 
 
 ################################################################################
-# }}}
-################################################################################
+# Unpack the pixels to one color index per byte
+#
+# The first pixel is in the high bits of a byte, the same as _pixels_pack().
+def _preview_unpack(data, bits_per_pixel):
+	import numpy
 
-################################################################################
-# {{{ Image : GIF
-################################################################################
+	data = numpy.frombuffer(data, dtype = numpy.uint8)
+	if bits_per_pixel == 8:
+		return data
 
-################################################################################
-# Load GIF color indexes (Not the Palette)
-def _load_gif(image, bits_per_pixel):
-	valid_depths = (2, 4, 8)
-	if bits_per_pixel not in valid_depths:
-		_error(f'BitsPerPixel must be one of {valid_depths}')
+	shift = numpy.arange(8 - bits_per_pixel, -1, -bits_per_pixel, dtype = numpy.uint8)
+	mask  = (1 << bits_per_pixel) - 1
 
-	data = []
-	if bits_per_pixel == 2:
-		data = _load_gif_2bpp(image, bits_per_pixel)
-	elif bits_per_pixel == 4:
-		data = _load_gif_4bpp(image, bits_per_pixel)
-	elif bits_per_pixel == 8:
-		data = _load_gif_8bpp(image, bits_per_pixel)
-	
-	return data
+	return ((data[:, None] >> shift) & mask).reshape(-1)
 
 
 ################################################################################
-# Load the GIF and pack 4 pixel index values into 1 byte
-# 1 byte == 8 bits
-# 1 pixel index == 2 bits
-# 2 bits / 8 bits == 4 pixels per byte
-def _load_gif_2bpp(image, bits_per_pixel):
-	max_value = 0x01 << (bits_per_pixel - 1)
-	byte = 0
-	offset = 6
-	data = []
-	for y in range(image.size[1]):
-		for x in range(image.size[0]):
-			pixel = image.getpixel((x, y))
-			if pixel > max_value:
-				_error(f'{filename} has pixels that exceed BitsPerPixel({bits_per_pixel})')
-			if offset > 0:
-				byte |= (pixel << offset)
-				offset -= 2
-			else:
-				byte |= pixel
-				data.append(byte)
-				byte = 0
-				offset = 6
-	return data
+# Split the tilemap entries in to their fields
+#
+# Returns the tile index, palette offset, V-Flip, and H-Flip arrays, one value
+# for each entry in ( ROW, COLUMN ) order.
+def _preview_entries(data, width):
+	import numpy
 
+	entry = numpy.frombuffer(bytes(data), dtype = numpy.uint8)
+	height = len(entry) // (width * 2)
+	entry = entry[:height * width * 2].reshape(height, width, 2).astype(numpy.uint16)
 
-################################################################################
-# Load the GIF and pack 2 color index values into 1 byte
-# 1 byte == 8 bits
-# 1 pixel index == 4 bits
-# 4 bits / 8 bits == 2 pixels per byte
-def _load_gif_4bpp(image, bits_per_pixel):
-	max_value = 0x01 << (bits_per_pixel - 1)
-	byte = 0
-	offset = 4
-	data = []
-	for y in range(image.size[1]):
-		for x in range(image.size[0]):
-			pixel = image.getpixel((x, y))
-			if pixel > max_value:
-				_error(f'{filename} has pixels that exceed BitsPerPixel({bits_per_pixel})')
-			if offset > 0:
-				byte |= (pixel << offset)
-				offset -= 4
-			else:
-				byte |= pixel
-				data.append(byte)
-				byte = 0
-				offset = 4
-	return data
+	tile_index     = entry[:, :, 0] | ((entry[:, :, 1] & 0x03) << 8)
+	palette_offset = entry[:, :, 1] >> 4
+	v_flip         = (entry[:, :, 1] & 0x08) != 0
+	h_flip         = (entry[:, :, 1] & 0x04) != 0
+
+	return ( tile_index, palette_offset, v_flip, h_flip )
 
 
 ################################################################################
-# Load the GIF and pack 1 color index value into 1 byte
-def _load_gif_8bpp(image, bits_per_pixel):
-	data = []
-	for y in range(image.size[1]):
-		for x in range(image.size[0]):
-			pixel = image.getpixel((x, y))
-			data.append(pixel)
-	return data
+# Draw the tiles of the tilemap entries
+#
+# The palette offset is added to every color of 2bpp and 4bpp tiles, but only
+# to colors 1-15 of 8bpp tiles.  Color 0 is transparent and is never changed.
+# Returns the color indexes and the number of entries that use a tile that
+# does not exist.
+def _preview_draw(tiles, bits_per_pixel, tile_index, palette_offset, v_flip, h_flip):
+	import numpy
+
+	height, width = tile_index.shape
+	tile_count, tile_height, tile_width = tiles.shape
+
+	missing = tile_index >= tile_count
+	pixels = tiles[numpy.where(missing, 0, tile_index)]
+	pixels[missing] = 0
+
+	pixels = numpy.where(h_flip[:, :, None, None], pixels[:, :, :, ::-1], pixels)
+	pixels = numpy.where(v_flip[:, :, None, None], pixels[:, :, ::-1, :], pixels)
+
+	offset = (palette_offset[:, :, None, None] << 4).astype(numpy.uint8)
+	if bits_per_pixel == 8:
+		shifted = (pixels >= 1) & (pixels <= 15)
+	else:
+		shifted = pixels != 0
+	pixels = numpy.where(shifted, pixels + offset, pixels)
+
+	pixels = pixels.transpose(0, 2, 1, 3).reshape(height * tile_height, width * tile_width)
+
+	return ( pixels, int(missing.sum()) )
 
 
 ################################################################################
@@ -920,13 +5258,25 @@ def _load_gif_8bpp(image, bits_per_pixel):
 ################################################################################
 
 ################################################################################
-# Print error message and exit
+# The exception raised by _error()
+class ConverterError(Exception):
+	pass
+
+
+################################################################################
+# Stop with an error message
 #
 # If it is important enough to be an error, then it is important enough to
-# immediately exit!
+# immediately stop!  When converting, only the current resource is stopped.
+# Otherwise ConverterX16.py will exit.
 def _error(message):
-	print(f"Error: {message}")
-	sys.exit(1)
+	raise ConverterError(message)
+
+
+################################################################################
+# Print the error that stopped the conversion of a resource section
+def _log_section_error(section_id, error):
+	print(f"Error: [{section_id}] {error}")
 	return
 
 
@@ -995,16 +5345,53 @@ def _log_warning(converter, message):
 
 ################################################################################
 # Get the address
-def _address_get(section_ini):
-	addr_hi = section_ini.get('address_high', '0')
-	addr_hi = int(addr_hi, 16)
-	
-	addr_lo = section_ini.get('address_low', '0')
-	addr_lo = int(addr_lo, 16)
+#
+# The prefix is used by resources that write more than one file, for example:
+# "remap_" ==> Remap_Address_High and Remap_Address_Low
+def _address_get(section_ini, prefix = ''):
+	addr_hi = _int_get(section_ini, f'{prefix}address_high', 0, 16)
+	addr_lo = _int_get(section_ini, f'{prefix}address_low', 0, 16)
 
 	return ( addr_lo, addr_hi )
 
 
+################################################################################
+# Check if the address has been set
+#
+# An output without any of the address keys is not placed by the layout.
+def _address_is_set(section_ini, prefix = ''):
+	for key in ( 'address_bank', 'address_high', 'address_low' ):
+		if f'{prefix}{key}' in section_ini:
+			return True
+
+	return False
+
+
+################################################################################
+# Check if an address is in the Vera palette
+#
+# The Vera palette is $1FA00-$1FBFF.  Only the 2 byte address is in the file
+# header, so $FA00-$FBFF is always the palette and the Address_Bank is not
+# used.
+def _address_is_palette(address):
+	return 0xfa00 <= address <= 0xfbff
+
+
+################################################################################
+# Get the full 17-bit Vera address
+#
+# The Address_Bank is bit 16, it is not part of the 2 byte file header.
+def _address_vram_get(section_ini, prefix = ''):
+	addr_bank = _int_get(section_ini, f'{prefix}address_bank', 0, 16)
+
+	if addr_bank not in (0, 1):
+		_error(f'{prefix.title()}Address_Bank must be 0 or 1')
+
+	addr_lo, addr_hi = _address_get(section_ini, prefix)
+
+	return (addr_bank << 16) | (addr_hi << 8) | addr_lo
+
+
 ################################################################################
 # Set the address
 def _address_set(section_ini, address):
@@ -1020,7 +5407,7 @@ def _address_set(section_ini, address):
 ################################################################################
 # Set the Bits-Per-Pixel
 def _bits_per_pixel_get(section_ini):
-	bpp = int(section_ini.get('bits_per_pixel', '8'))
+	bpp = _int_get(section_ini, 'bits_per_pixel', 8)
 	return bpp
 
 
@@ -1031,6 +5418,155 @@ def _bits_per_pixel_set(section_ini, bpp):
 	return
 
 
+################################################################################
+# Get the number of colors to reduce a truecolor image to
+def _colors_get(section_ini):
+	colors = _int_get(section_ini, 'colors', 256)
+
+	valid_colors = (4, 16, 256)
+	if colors not in valid_colors:
+		_error(f'Colors must be one of {valid_colors}')
+
+	return colors
+
+
+################################################################################
+# Get the compression method: "none", "rle", or "lz"
+def _compression_get(section_ini):
+	compression = section_ini.get('compression', 'none').lower()
+
+	valid_methods = ('none', 'rle', 'lz')
+	if compression not in valid_methods:
+		_error(f'Compression must be one of {valid_methods}')
+
+	return compression
+
+
+################################################################################
+# Get the tile deduplication mode: "no", "exact", or "yes"
+def _deduplicate_get(section_ini, default = 'no'):
+	deduplicate = section_ini.get('deduplicate', default).lower()
+
+	if deduplicate in ('0', 'false', 'off'):
+		deduplicate = 'no'
+	elif deduplicate in ('1', 'true', 'on', 'flip'):
+		deduplicate = 'yes'
+
+	valid_modes = ('no', 'exact', 'yes')
+	if deduplicate not in valid_modes:
+		_error(f'Deduplicate must be one of {valid_modes}')
+
+	return deduplicate
+
+
+################################################################################
+# Get a "yes" or "no" option
+def _yes_no_get(section_ini, key, default = 'no'):
+	value = section_ini.get(key, default).lower()
+
+	if value in ('1', 'true', 'on', 'yes'):
+		return True
+	if value in ('0', 'false', 'off', 'no'):
+		return False
+
+	_error(f'{key.title()} must be "yes" or "no"')
+
+
+################################################################################
+# Get a number option
+#
+# Address options are hex, without the "$".
+def _int_get(section_ini, key, default, base = 10):
+	value = section_ini.get(key, f'{default}')
+
+	try:
+		return int(value, base)
+	except ValueError:
+		kind = 'a hex number' if base == 16 else 'a number'
+		_error(f'{key.title()} must be {kind}, not "{value}"')
+
+
+################################################################################
+# Check if a bitmap is also written in chunks
+def _chunks_get(section_ini):
+	return _yes_no_get(section_ini, 'chunks')
+
+
+################################################################################
+# Check if a tilemap is cut in to strips
+def _strips_get(section_ini):
+	return _yes_no_get(section_ini, 'strips')
+
+
+################################################################################
+# Check if the tiles use 4bpp sub-palettes
+#
+# Give the Bits-Per-Pixel to check that it is 4.
+def _sub_palettes_get(section_ini, bits_per_pixel = None):
+	sub_palettes = _yes_no_get(section_ini, 'sub_palettes')
+
+	if sub_palettes and bits_per_pixel not in (None, 4):
+		_error('Sub_Palettes needs Bits_Per_Pixel = 4')
+
+	return sub_palettes
+
+
+################################################################################
+# Get the order to read tiles from an image: "row" or "column"
+def _order_get(section_ini):
+	order = section_ini.get('order', 'row').lower()
+
+	valid_orders = ('row', 'column')
+	if order not in valid_orders:
+		_error(f'Order must be one of {valid_orders}')
+
+	return order
+
+
+################################################################################
+# Check if the palette is made by reducing the colors of a truecolor image
+#
+# That is any image file that is not a GIF, or a GIF with the Colors key.
+def _palette_is_quantized(section_ini):
+	filename = _filename_get(section_ini)
+	if filename is None:
+		return False
+
+	ext = filename.split('.')[-1].lower()
+	if ext == 'ini':
+		return False
+	if ext == 'gif':
+		return 'colors' in section_ini
+
+	return True
+
+
+################################################################################
+# Get the width of a VERA tilemap
+def _map_width_get(section_ini, width):
+	map_width = _int_get(section_ini, 'map_width', width)
+
+	if map_width < width:
+		_error(f'Map_Width ({map_width}) is smaller than the image ({width} tiles)')
+
+	valid_widths = (32, 64, 128, 256)
+	if map_width != width and map_width not in valid_widths:
+		_error(f'Map_Width must be one of {valid_widths}')
+
+	return map_width
+
+
+################################################################################
+# Get the width or height of a tile
+def _tile_size_get(section_ini, key, valid_sizes = (8, 16)):
+	size = _int_get(section_ini, key, valid_sizes[0])
+
+	if size not in valid_sizes:
+		_error(f'{key.title()} must be one of {valid_sizes}')
+
+	return size
+
+
 ################################################################################
 # Get the filename
 def _filename_get(ini_section):
@@ -1093,14 +5629,188 @@ def _resource_type(section_id):
 
 
 ################################################################################
-def _output_filename(converter, section_id):
+# Get all the files that are read when converting the resource section
+#
+# Files that are referenced by other files, like the tile images listed in a
+# Tileset INI file, are included.  The inputs of a bundle are the output files
+# of its resources.
+def _section_input_files(converter, section_id, section_ini):
+	if _resource_type(section_id) == 'bundle':
+		filename_list = []
+		for member_id in _bundle_member_list(converter, section_id, section_ini):
+			member_ini = _resource_section(_resource_index(converter), member_id)
+			filename_list.extend(_section_output_files(converter, member_id, member_ini))
+
+		return filename_list
+
+	filename_list = []
+
+	filename = _filename_get(section_ini)
+	if filename is not None:
+		filename = _filename_normalize(filename)
+		filename_list.append(filename)
+
+		if filename.split('.')[-1] == 'ini':
+			file_ini = configparser.ConfigParser()
+			file_ini.read(filename)
+
+			if 'Tileset' in file_ini:
+				section_ini = file_ini['Tileset']
+			else:
+				section_ini = None
+
+	if section_ini is not None:
+		filename_list.extend(_tile_files_get(section_ini))
+
+	return filename_list
+
+
+################################################################################
+# Get the tile image files in the order of their index
+def _tile_files_get(section_ini):
+	filename_list = []
+
+	index = 0
+	while index <= 0x3ff:
+		key = '{0:0{1}x}'.format(index, 3)
+		if key not in section_ini:
+			break
+
+		filename = _filename_normalize(section_ini[key])
+		filename_list.append(filename)
+		index += 1
+
+	return filename_list
+
+
+################################################################################
+# Check if the outputs of a resource section need to be converted
+#
+# The section is stale when an output file is missing or when the resource
+# file or any input file is newer than the oldest output file.
+def _section_is_stale(converter, section_id, section_ini, output_list):
+	output_mtime = None
+	for filename in output_list:
+		if not os.path.exists(filename):
+			_log_debug(converter, f'Missing: {filename}')
+			return True
+
+		mtime = os.stat(filename).st_mtime_ns
+		if output_mtime is None or mtime < output_mtime:
+			output_mtime = mtime
+
+	input_list = [ converter.resource ]
+	input_list.extend(_section_input_files(converter, section_id, section_ini))
+
+	for filename in input_list:
+		if not os.path.exists(filename):
+			_log_debug(converter, f'Missing: {filename}')
+			return True
+
+		if os.stat(filename).st_mtime_ns > output_mtime:
+			_log_debug(converter, f'Changed: {filename}')
+			return True
+
+	return False
+
+
+################################################################################
+# Write the dependency file of each output file
+#
+# The dependency files use the same format as "gcc -MD -MP": The output depends
+# on the resource file and every input file, and every input file has an empty
+# rule so that make does not fail when an input file is removed.
+#
+# The dependency files are only written when their contents change.
+def _depfile_write(converter, section_id, section_ini, output_list):
+	input_list = [ _filename_normalize(converter.resource) ]
+	for filename in _section_input_files(converter, section_id, section_ini):
+		if filename not in input_list:
+			input_list.append(filename)
+
+	src = ' '.join(_depfile_escape(filename) for filename in input_list)
+
+	for output in output_list:
+		depfile = f'{_depfile_escape(output)}: {src}\n'
+		for filename in input_list:
+			depfile += f'\n{_depfile_escape(filename)}:\n'
+
+		filename = f'{output}.d'
+		try:
+			with open(filename, 'r') as depfile_file:
+				if depfile_file.read() == depfile:
+					continue
+		except OSError:
+			pass
+
+		_log_info(converter, f'Writing: {filename}')
+		with open(filename, 'w') as depfile_file:
+			depfile_file.write(depfile)
+
+	return
+
+
+################################################################################
+# Escape a file name for use in a Makefile rule
+def _depfile_escape(filename):
+	filename = filename.replace('$', '$$')
+	filename = filename.replace('#', '\\#')
+	filename = filename.replace(' ', '\\ ')
+
+	return filename
+
+
+################################################################################
+# Get all the files that are written when converting the resource section
+def _section_output_files(converter, section_id, section_ini):
+	filename_list = [ _output_filename(converter, section_id) ]
+
+	resource_type = _resource_type(section_id)
+	if resource_type == 'bitmap':
+		if _chunks_get(section_ini):
+			filename_list.append(_output_filename(converter, section_id, 'index'))
+			filename_list.extend(_bitmap_chunk_files(converter, section_id, section_ini))
+	elif resource_type == 'layer':
+		filename_list.append(_output_filename(converter, section_id, 'tilemap'))
+		if _sub_palettes_get(section_ini):
+			filename_list.append(_output_filename(converter, section_id, 'palette'))
+	elif resource_type == 'palette':
+		if _palette_is_quantized(section_ini):
+			filename_list.append(_output_filename(converter, section_id, 'bitmap'))
+	elif resource_type == 'sprite':
+		filename_list.append(_output_filename(converter, section_id, 'frame'))
+	elif resource_type == 'tilemap':
+		if _strips_get(section_ini):
+			filename_list.append(_output_filename(converter, section_id, 'column'))
+			filename_list.append(_output_filename(converter, section_id, 'row'))
+	elif resource_type == 'tileset':
+		if _deduplicate_get(section_ini) != 'no' or _sub_palettes_get(section_ini):
+			filename_list.append(_output_filename(converter, section_id, 'remap'))
+		if _sub_palettes_get(section_ini):
+			filename_list.append(_output_filename(converter, section_id, 'palette'))
+
+	return filename_list
+
+
+################################################################################
+# Get the output filename
+#
+# Use "extra" to get the name of one of the additional files a resource
+# writes, see "output_ext_extra".  A resource type can also be used, for
+# example the tilemap that a layer writes.
+def _output_filename(converter, section_id, extra = None):
 	file_dir = '.'
 	if converter.output_dir is not None:
 		file_dir = converter.output_dir
 
 	resource_name = _resource_name(section_id)
 	resource_type = _resource_type(section_id)
-	file_ext = converter.output_ext[resource_type]
+	if extra is None:
+		file_ext = converter.output_ext[resource_type]
+	elif extra in converter.output_ext_extra:
+		file_ext = converter.output_ext_extra[extra]
+	else:
+		file_ext = converter.output_ext[extra]
 	filename = f'{resource_name}.{file_ext}'
 
 	if converter.case == 'lower':
@@ -1115,16 +5825,32 @@ def _output_filename(converter, section_id):
 
 
 ################################################################################
-def _write_data(converter, address, data, filename):
+def _write_data(converter, address, data, filename, compression = 'none'):
 	_log_info(converter, f'Writing: {filename}')
 
-	if address is not None:
-		data.insert(0, address[1])
-		data.insert(0, address[0])
+	if compression != 'none':
+		data_size = len(data)
+		with _stats_stage(converter, 'compress'):
+			data = _compress(data, compression)
+		_log_status(converter
+			, f'Compression: {compression.upper()} {data_size} ==> {len(data)} bytes' \
+			  f' ({_compression_ratio(data_size, len(data))})'
+			)
+
+	with _stats_stage(converter, 'write'):
+		# The output file may be a hard link in to the cache
+		if os.path.lexists(filename):
+			os.remove(filename)
 
-	output = open(filename, "wb")
-	output.write(bytearray(data))
-	output.close()
+		# The address header is written on its own so the data is never copied
+		output = open(filename, "wb")
+		if address is not None:
+			output.write(bytes(address))
+		output.write(data)
+		output.close()
+
+	_stats_count(converter, 'files_out')
+	_stats_count(converter, 'bytes_out', len(data) + (0 if address is None else len(address)))
 
 	_log_status(converter, f'{filename}')
 
@@ -1138,48 +5864,72 @@ def _write_data(converter, address, data, filename):
 ################################################################################
 # {{{ Main
 ################################################################################
-converter = configure()
 
-_log_debug(converter, f"{converter}")
+################################################################################
+# Run ConverterX16.py
+#
+# Importing ConverterX16.py does not do anything, call main() with the
+# command-line arguments (without the program name) to use it in-process.
+def main(args = None):
+	converter = configure(args)
+
+	_log_debug(converter, f"{converter}")
+
+	# Help
+	if converter.help_resource is True:
+		help_resource(converter)
+		sys.exit(0)
+
+	try:
+		if converter.resource is None:
+			_error('The following arguments are required: RESOURCE_FILE')
 
-# Help
-if converter.help_resource is True:
-	help_resource(converter)
-	sys.exit(0)
+		_filename_validate(converter.resource)
 
-if converter.resource is None:
-	_error('The following arguments are required: RESOURCE_FILE')
+		# Command-Line Utilities
+		if converter.list_input_files is True:
+			list_input_files(converter)
+			sys.exit(0)
 
-_filename_validate(converter.resource)
+		if converter.list_output_files is True:
+			list_output_files(converter)
+			sys.exit(0)
 
-# Command-Line Utilities
-if converter.list_input_files is True:
-	list_input_files(converter)
-	sys.exit(0)
+		if converter.generate_makefile is True:
+			generate_makefile(converter)
+			sys.exit(0)
 
-if converter.list_output_files is True:
-	list_output_files(converter)
-	sys.exit(0)
+		# Do Conversion
+		with _stats_stage(converter, 'index'):
+			_resource_index(converter)
 
-if converter.generate_makefile is True:
-	generate_makefile(converter)
-	sys.exit(0)
+		resource_list = get_section_list(converter)
 
-# Do Conversion
-if converter.convert_bitmap is not None:
-	resource_list = get_section(converter, converter.convert_bitmap, 'bitmap')
-elif converter.convert_palette is not None:
-	resource_list = get_section(converter, converter.convert_palette, 'palette')
-elif converter.convert_tilemap is not None:
-	resource_list = get_section(converter, converter.convert_tilemap, 'tilemap')
-elif converter.convert_tileset is not None:
-	resource_list = get_section(converter, converter.convert_tileset, 'tileset')
-elif converter.convert_file is not None:
-	resource_list = get_sections_for_file(converter, converter.convert_file)
-else:
-	resource_list = get_section_all(converter)
+		if converter.preview is True:
+			error_count = preview(converter, resource_list)
+			sys.exit(1 if error_count > 0 else 0)
+	except ConverterError as error:
+		print(f"Error: {error}")
+		sys.exit(1)
 
-convert(converter, resource_list)
+	error_count = convert(converter, resource_list)
+
+	if converter.stats is not None:
+		stats_report(converter)
+
+	if converter.watch is True:
+		watch(converter, resource_list)
+		return
+
+	if error_count > 0:
+		sys.exit(1)
+
+	return
+
+
+################################################################################
+if __name__ == '__main__':
+	main()
 
 ################################################################################
 # }}}
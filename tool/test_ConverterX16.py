@@ -0,0 +1,797 @@
+################################################################################
+# Tests for ConverterX16.py
+#
+# Run with: python -m pytest tool
+#
+# The tests check the bytes that are written, so a change to an output format
+# shows up here first.
+################################################################################
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ConverterX16
+
+
+################################################################################
+# {{{ Support Functions
+################################################################################
+
+################################################################################
+# Write a resource file in a temporary directory and configure a converter
+#
+# The directory becomes the current directory, so the resources can use
+# relative file names.
+def _converter(tmp_path, monkeypatch, resource_text, *args):
+	monkeypatch.chdir(tmp_path)
+
+	with open('Resource.ini', 'w') as resource_file:
+		resource_file.write(resource_text)
+
+	os.makedirs('out', exist_ok = True)
+
+	return ConverterX16.configure([ *args, '--output-dir', 'out', 'Resource.ini' ])
+
+
+################################################################################
+# Get the options of a resource section
+def _section(converter, section_id):
+	index = ConverterX16._resource_index(converter)
+	return ConverterX16._resource_section(index, section_id)
+
+
+################################################################################
+# Read an output file, without the address
+def _read(filename):
+	with open(filename, 'rb') as output:
+		return output.read()[2:]
+
+
+################################################################################
+# Write an 8bpp GIF of the pixel indexes
+#
+# The palette is not optimized, so the pixels keep their indexes.
+def _indexed_image(filename, pixels):
+	from PIL import Image
+
+	image = Image.new('P', ( pixels.shape[1], pixels.shape[0] ))
+	image.putdata(pixels.flatten().tolist())
+	image.putpalette([ value for color in range(256) for value in ( color, color, color ) ])
+	image.save(filename, optimize = False)
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Cache
+################################################################################
+
+################################################################################
+def test_cache_key_changes_with_output_format(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Map Tilemap]\n00 = 001 0 0 1 002 0 1 0\n'
+		, '--cache-dir', 'cache'
+		)
+	section_ini = _section(converter, 'Map Tilemap')
+
+	key = ConverterX16._cache_key(converter, 'Map Tilemap', section_ini)
+	assert key == ConverterX16._cache_key(converter, 'Map Tilemap', section_ini)
+
+	monkeypatch.setattr(ConverterX16, 'output_format', ConverterX16.output_format + 1)
+	assert key != ConverterX16._cache_key(converter, 'Map Tilemap', section_ini)
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Makefile
+################################################################################
+
+################################################################################
+# Each output only depends on its own input, the grouped rule only on the
+# resource file
+def test_makefile_rules(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[A Tilemap]\nFile = a.csv\n[B Tilemap]\nFile = b.csv\n'
+		, '--makefile'
+		)
+
+	ConverterX16.generate_makefile(converter)
+
+	with open('.ConverterX16.Makefile.') as makefile:
+		rule_list = makefile.read().splitlines()
+
+	assert 'out/A.x16m: Resource.ini a.csv' in rule_list
+	assert 'out/B.x16m: Resource.ini b.csv' in rule_list
+	assert 'out/A.x16m out/B.x16m &: Resource.ini' in rule_list
+
+
+################################################################################
+# The outputs that are up to date are touched, so that they are all newer than
+# the inputs of the grouped rule
+def test_convert_stale_touches_outputs(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[A Tilemap]\nFile = a.csv\n[B Tilemap]\nFile = b.csv\n'
+		, '--convert-stale', '--depfile'
+		)
+
+	for filename in ( 'a.csv', 'b.csv' ):
+		with open(filename, 'w') as csv_file:
+			csv_file.write('1,2\n')
+
+	assert ConverterX16.convert(converter, [ 'A Tilemap', 'B Tilemap' ]) == 0
+
+	os.utime('out/B.x16m', ( 0, 0 ))
+	os.utime('b.csv', ( 0, 0 ))
+	os.utime('Resource.ini', ( 0, 0 ))
+
+	assert ConverterX16.convert(converter, [ 'A Tilemap', 'B Tilemap' ]) == 0
+	assert os.stat('out/B.x16m').st_mtime > os.stat('a.csv').st_mtime
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Tilemap
+################################################################################
+
+################################################################################
+# Entry byte 1 is: palette offset (7:4), V-Flip (3), H-Flip (2), index (9:8)
+def test_tilemap_pack_bits():
+	data = ConverterX16._tilemap_pack(
+		[ 0x001, 0x002, 0x3ff, 0x123 ]
+	,	[ 0    , 0    , 0xf  , 0x5   ]
+	,	[ 0    , 1    , 1    , 0     ]
+	,	[ 1    , 0    , 1    , 0     ]
+	)
+
+	assert bytes(data) == bytes.fromhex('0104 0208 ffff 2351')
+
+
+################################################################################
+def test_tilemap_ini_flip_bits(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Map Tilemap]\n00 = 001 0 0 1 002 0 1 0\n'
+		)
+
+	assert ConverterX16.convert(converter, [ 'Map Tilemap' ]) == 0
+	assert _read('out/Map.x16m') == bytes.fromhex('0104 0208')
+
+
+################################################################################
+# Tiled keeps the flips in bits 31 (H) and 30 (V) of the global ID
+def test_tilemap_csv_flip_bits(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Map Tilemap]\nFile = map.csv\nEmpty_Tile = 3ff\n'
+		)
+
+	with open('map.csv', 'w') as csv_file:
+		csv_file.write(f'{1 | 0x80000000},{2 | 0x40000000},-1\n')
+
+	assert ConverterX16.convert(converter, [ 'Map Tilemap' ]) == 0
+	assert _read('out/Map.x16m') == bytes.fromhex('0104 0208 ff03')
+
+
+################################################################################
+# A 40x2 world scrolls through a 32x32 layer at $04000, so it has two bands
+# of columns: the second band is padded with tile 0
+def test_tilemap_strips(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[World Tilemap]\nFile = world.csv\nStrips = yes\n'
+		  'Address_High = 40\nAddress_Low = 00\n'
+		)
+
+	with open('world.csv', 'w') as csv_file:
+		for y in range(2):
+			csv_file.write(','.join(f'{x + (y * 64)}' for x in range(40)) + '\n')
+
+	assert ConverterX16.convert(converter, [ 'World Tilemap' ]) == 0
+
+	tilemap = _read('out/World.x16m')
+	assert len(tilemap) == 32 * 32 * 2
+	assert tilemap[0:4] == bytes.fromhex('0000 0100')
+	assert tilemap[64:66] == bytes.fromhex('4000')
+
+	# One record for each of the 64 columns: ADDR_L, ADDR_M, ADDR_H, then
+	# byte 0 of each row, then the same for byte 1
+	column = _read('out/World.x16v')
+	record_size = 2 * (3 + 32)
+	assert len(column) == 64 * record_size
+	record = column[33 * record_size:34 * record_size]
+	assert record[0:3]   == bytes.fromhex('02 40 70')
+	assert record[3:35]  == bytes([ 33, 97 ] + [ 0 ] * 30)
+	assert record[35:38] == bytes.fromhex('03 40 70')
+	assert record[38:70] == bytes(32)
+
+	# One record for each band of columns and each of the 32 rows
+	row = _read('out/World.x16h')
+	record_size = 3 + (32 * 2)
+	assert len(row) == 2 * 32 * record_size
+	record = row[33 * record_size:34 * record_size]
+	assert record[0:3] == bytes.fromhex('40 40 10')
+	assert record[3:]  == bytes([ value for x in range(32, 64) for value in ( (x + 64) if x < 40 else 0, 0 ) ])
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Palette Quantization
+################################################################################
+
+################################################################################
+# A truecolor image with fewer colors than the palette keeps its colors
+# exactly, and the transparent pixels use index 0
+def test_palette_quantize_exact(tmp_path, monkeypatch):
+	from PIL import Image
+
+	converter = _converter(tmp_path, monkeypatch
+		, '[Foo Palette]\nFile = foo.png\nColors = 16\n'
+		)
+
+	color_list = [ ( 255, 0, 0, 255 ), ( 0, 255, 0, 255 ), ( 0, 0, 255, 255 ), ( 255, 255, 255, 255 ), ( 0, 0, 0, 0 ) ]
+	pixel_list = [ color_list[index % 5] for index in range(16) ]
+
+	image = Image.new('RGBA', ( 8, 2 ))
+	image.putdata(pixel_list)
+	image.save('foo.png')
+
+	assert ConverterX16.convert(converter, [ 'Foo Palette' ]) == 0
+
+	palette = _read('out/Foo.x16p')
+	assert len(palette) == 16 * 2
+	palette = [ palette[index] | (palette[index + 1] << 8) for index in range(0, len(palette), 2) ]
+
+	bitmap = _read('out/Foo.x16b')
+	index_list = [ nibble for byte in bitmap for nibble in ( byte >> 4, byte & 0x0f ) ]
+
+	for ( red, green, blue, alpha ), index in zip(pixel_list, index_list):
+		if alpha == 0:
+			assert index == 0
+		else:
+			assert index != 0
+			assert palette[index] == ((red >> 4) << 8) | ((green >> 4) << 4) | (blue >> 4)
+
+
+################################################################################
+# A red and green gradient of 256 12-bit colors is reduced to 16 colors, and
+# every pixel uses the nearest color of the palette
+def test_palette_quantize_nearest():
+	import numpy
+
+	rgb = (numpy.arange(16)[:, None] << 8) | (numpy.arange(16)[None, :] << 4)
+	opaque = numpy.ones(rgb.shape, dtype = bool)
+
+	palette, pixels = ConverterX16._quantize(rgb, opaque, 16)
+	assert len(palette) == 16
+
+	def channels(color):
+		color = numpy.asarray(color)
+		return numpy.stack(( color >> 8, (color >> 4) & 0xf, color & 0xf ), axis = -1)
+
+	distance = ((channels(rgb.reshape(-1))[:, None, :] - channels(palette)[None, :, :]) ** 2).sum(axis = 2)
+	chosen = distance[numpy.arange(rgb.size), pixels.reshape(-1)]
+
+	assert (chosen == distance.min(axis = 1)).all()
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Tileset Atlas
+################################################################################
+
+################################################################################
+# A 2x2 atlas read in column order, without the first tile
+def test_tileset_atlas_order_range(tmp_path, monkeypatch):
+	import numpy
+
+	converter = _converter(tmp_path, monkeypatch
+		, '[Foo Tileset]\nFile = atlas.gif\nOrder = column\nTile_First = 1\nTile_Count = 2\n'
+		)
+
+	tile_list = [ numpy.full(( 8, 8 ), color) for color in ( 1, 2, 3, 4 ) ]
+	_indexed_image('atlas.gif', numpy.block([ tile_list[0:2], tile_list[2:4] ]))
+
+	assert ConverterX16.convert(converter, [ 'Foo Tileset' ]) == 0
+	assert _read('out/Foo.x16t') == bytes([ 3 ] * 64 + [ 2 ] * 64)
+
+
+################################################################################
+# 16x16 tiles are cut from the atlas as whole tiles, in row order
+def test_tileset_atlas_tile_size(tmp_path, monkeypatch):
+	import numpy
+
+	converter = _converter(tmp_path, monkeypatch
+		, '[Foo Tileset]\nFile = atlas.gif\nTile_Width = 16\nTile_Height = 16\n'
+		)
+
+	pixels = numpy.arange(16 * 32).reshape(16, 32) % 251
+	_indexed_image('atlas.gif', pixels)
+
+	assert ConverterX16.convert(converter, [ 'Foo Tileset' ]) == 0
+	assert _read('out/Foo.x16t') == bytes(pixels[:, 0:16].flatten().tolist() + pixels[:, 16:32].flatten().tolist())
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Tile Deduplication
+################################################################################
+
+################################################################################
+# A tile, its flips, another tile, and the first tile again
+def _dedupe_tile_list():
+	import numpy
+
+	tile = numpy.arange(64).reshape(8, 8) + 1
+	other = numpy.full(( 8, 8 ), 100)
+
+	return [ tile, tile[:, ::-1], tile[::-1, :], tile[::-1, ::-1], other, tile ]
+
+
+################################################################################
+def test_tiles_unique_flip():
+	tile_list = _dedupe_tile_list()
+
+	tile_keep, match_list = ConverterX16._tiles_unique(tile_list, True)
+
+	assert len(tile_keep) == 2
+	assert match_list == [ ( 0, 0, 0 ), ( 0, 0, 1 ), ( 0, 1, 0 ), ( 0, 1, 1 ), ( 1, 0, 0 ), ( 0, 0, 0 ) ]
+
+
+################################################################################
+def test_tiles_unique_exact():
+	tile_list = _dedupe_tile_list()
+
+	tile_keep, match_list = ConverterX16._tiles_unique(tile_list, False)
+
+	assert len(tile_keep) == 5
+	assert match_list == [ ( 0, 0, 0 ), ( 1, 0, 0 ), ( 2, 0, 0 ), ( 3, 0, 0 ), ( 4, 0, 0 ), ( 0, 0, 0 ) ]
+
+
+################################################################################
+# The remap table has a tilemap entry for each tile of the atlas, with the
+# flip bits: V-Flip is bit 3 and H-Flip is bit 2 of byte 1
+@pytest.mark.parametrize('deduplicate, tile_count, remap',
+	[ ( 'yes'  , 2, '0000 0004 0008 000c 0100 0000' )
+	, ( 'exact', 5, '0000 0100 0200 0300 0400 0000' )
+	])
+def test_tileset_deduplicate_remap(tmp_path, monkeypatch, deduplicate, tile_count, remap):
+	import numpy
+
+	converter = _converter(tmp_path, monkeypatch
+		, f'[Foo Tileset]\nFile = atlas.gif\nDeduplicate = {deduplicate}\n'
+		)
+	tile_list = _dedupe_tile_list()
+	_indexed_image('atlas.gif', numpy.concatenate(tile_list, axis = 1))
+
+	assert ConverterX16.convert(converter, [ 'Foo Tileset' ]) == 0
+
+	tiles = _read('out/Foo.x16t')
+	assert len(tiles) == tile_count * 64
+	assert tiles[:64] == bytes(tile_list[0].flatten().tolist())
+	assert _read('out/Foo.x16r') == bytes.fromhex(remap)
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Layer
+################################################################################
+
+################################################################################
+# The image is cut in to tiles in row order, the tilemap points at the kept
+# tiles and is padded to Map_Width
+def test_layer_slice(tmp_path, monkeypatch):
+	import numpy
+
+	converter = _converter(tmp_path, monkeypatch
+		, '[Foo Layer]\nFile = foo.gif\nMap_Width = 32\n'
+		)
+
+	tile  = numpy.arange(64).reshape(8, 8) + 1
+	other = numpy.full(( 8, 8 ), 100)
+	_indexed_image('foo.gif', numpy.block([ [ tile, other ], [ tile, tile[:, ::-1] ] ]))
+
+	assert ConverterX16.convert(converter, [ 'Foo Layer' ]) == 0
+
+	tiles = _read('out/Foo.x16t')
+	assert tiles == bytes(tile.flatten().tolist()) + bytes(other.flatten().tolist())
+
+	tilemap = _read('out/Foo.x16m')
+	assert len(tilemap) == 2 * 32 * 2
+	assert tilemap[0:4]   == bytes.fromhex('0000 0100')
+	assert tilemap[64:68] == bytes.fromhex('0000 0004')
+	assert tilemap[4:64]  == bytes(60)
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Sprite
+################################################################################
+
+################################################################################
+# Each frame on the sheet has a frame table entry, the same frames share one
+# copy.  Byte 0 is address (12:5), byte 1 is the mode (7) and address (16:13).
+def test_sprite_frame_table(tmp_path, monkeypatch):
+	import numpy
+
+	converter = _converter(tmp_path, monkeypatch
+		, '[Hero Sprite]\nFile = hero.gif\nFrame_Width = 16\nFrame_Height = 8\n'
+		  'Address_Bank = 1\nAddress_High = 00\nAddress_Low = 40\n'
+		)
+
+	frame = numpy.arange(128).reshape(8, 16) + 1
+	other = numpy.full(( 8, 16 ), 200)
+	_indexed_image('hero.gif', numpy.concatenate([ frame, other, frame ], axis = 1))
+
+	assert ConverterX16.convert(converter, [ 'Hero Sprite' ]) == 0
+
+	assert _read('out/Hero.x16s') == bytes(frame.flatten().tolist()) + bytes(other.flatten().tolist())
+	assert _read('out/Hero.x16f') == bytes.fromhex('0288 0688 0288')
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Sub-palettes
+################################################################################
+
+################################################################################
+# Write an image of two 8x8 tiles with 12 colors each, so each tile gets its
+# own sub-palette
+def _subpalette_image(filename):
+	from PIL import Image
+
+	image = Image.new('P', ( 16, 8 ))
+	image.putpalette([ value for color in range(256) for value in ( (color & 0xf) * 17, (color >> 4) * 17, 0 ) ])
+	image.putdata([ ((y * 8 + x % 8) % 12) + 1 + (20 if x >= 8 else 0) for y in range(8) for x in range(16) ])
+	image.save(filename)
+
+
+################################################################################
+# The tilemap palette offsets start at the sub-palette the layout placed the
+# sub-palettes at, after the fixed palette.  $FA00 is in the Vera palette
+# without Address_Bank.
+def test_subpalette_layout_offset(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[UI Palette]\nAddress_High = fa\nAddress_Low = 00\n'
+		  '00 = 000 fff 800 afe c4c 0c5 00a ee7 d85 640 f77 333 777 af6 08f bbb\n'
+		  '[Level Layer]\nFile = level.gif\nBits_Per_Pixel = 4\nSub_Palettes = yes\n'
+		  'Palette_Address = auto\n'
+		)
+	_subpalette_image('level.gif')
+
+	assert ConverterX16.convert(converter, [ 'UI Palette', 'Level Layer' ]) == 0
+
+	with open('out/Level.x16p', 'rb') as output:
+		address = int.from_bytes(output.read(2), 'little')
+	assert address == 0xfa20
+
+	tilemap = _read('out/Level.x16m')
+	assert sorted(tilemap[1::2]) == [ 0x10, 0x20 ]
+
+
+################################################################################
+# Outputs without an address are not placed, so they do not overlap
+def test_layout_skips_outputs_without_address(tmp_path, monkeypatch, capsys):
+	converter = _converter(tmp_path, monkeypatch
+		, '[A Tilemap]\n00 = 001 0 0 0\n'
+		  '[B Tilemap]\n00 = 002 0 0 0\n'
+		  '[C Tilemap]\nAddress = auto\n00 = 003 0 0 0\n'
+		, '-v'
+		)
+
+	assert ConverterX16.convert(converter, [ 'A Tilemap', 'B Tilemap', 'C Tilemap' ]) == 0
+	assert 'overlaps' not in capsys.readouterr().out
+
+
+################################################################################
+# A fixed sub-palette address in the Vera palette must be a whole sub-palette
+def test_subpalette_unaligned_address(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Level Layer]\nFile = level.gif\nBits_Per_Pixel = 4\nSub_Palettes = yes\n'
+		  'Palette_Address_High = fa\nPalette_Address_Low = 10\n'
+		)
+	_subpalette_image('level.gif')
+
+	assert ConverterX16.convert(converter, [ 'Level Layer' ]) == 1
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Bitmap Chunks
+################################################################################
+
+################################################################################
+# Write an 8bpp GIF
+def _bitmap_image(filename, width, height):
+	from PIL import Image
+
+	Image.new('P', ( width, height )).save(filename)
+
+
+################################################################################
+# 320x240 at $01000 crosses the first 64 KiB Vera bank
+def test_bitmap_chunk_list(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Foo Bitmap]\nFile = foo.gif\nChunks = yes\nAddress_High = 10\n'
+		)
+	_bitmap_image('foo.gif', 320, 240)
+
+	assert ConverterX16.convert(converter, [ 'Foo Bitmap' ]) == 0
+	assert os.path.getsize('out/Foo-0.x16b') == 2 + 61440
+	assert os.path.getsize('out/Foo-1.x16b') == 2 + 15360
+	assert not os.path.exists('out/Foo-2.x16b')
+
+
+################################################################################
+# A bitmap larger than 640x480 in high RAM, 8 KiB in each chunk
+def test_bitmap_chunk_large(tmp_path, monkeypatch, capsys):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Foo Bitmap]\nFile = foo.gif\nChunks = yes\nMemory = ram\n'
+		  'Address_Bank = 01\nAddress_High = a0\nAddress_Low = 00\n'
+		, '-v'
+		)
+	_bitmap_image('foo.gif', 800, 600)
+
+	assert ConverterX16.convert(converter, [ 'Foo Bitmap' ]) == 0
+
+	index = _read('out/Foo.x16i')
+	assert index[0] == 59
+	assert index[1:8] == bytes.fromhex('00 01 00a0 002000')
+	assert index[-7:] == bytes.fromhex('00 3b 00a0 001300')
+	assert os.path.getsize('out/Foo-58.x16b') == 2 + (800 * 600) - (58 * 8192)
+	assert 'Warning' not in capsys.readouterr().out
+
+
+################################################################################
+# The index only has one byte for the number of chunks
+def test_bitmap_chunk_count_limit(tmp_path, monkeypatch, capsys):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Foo Bitmap]\nFile = foo.gif\nChunks = yes\nMemory = ram\n'
+		  'Address_Bank = 00\nAddress_High = a0\nAddress_Low = 00\n'
+		)
+	_bitmap_image('foo.gif', 2048, 1024)
+
+	assert ConverterX16.convert(converter, [ 'Foo Bitmap' ]) == 1
+	assert 'Error: [Foo Bitmap] The bitmap needs 256 chunks, the limit is 255' in capsys.readouterr().out
+
+
+################################################################################
+# The chunk files are listed without decoding the image, at the address from
+# the layout.  320x200 only crosses a 64 KiB Vera bank when it is not at $00000.
+def test_bitmap_chunk_files(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Foo Bitmap]\nFile = foo.gif\nChunks = yes\nAddress = auto\n'
+		)
+	_bitmap_image('foo.gif', 320, 200)
+
+	section_ini = _section(converter, 'Foo Bitmap')
+	converter.layout = { 'Foo Bitmap': { '': { 'bank': 0, 'address': 0x1000 } } }
+	assert ConverterX16._bitmap_chunk_files(converter, 'Foo Bitmap', section_ini) \
+		== [ 'out/Foo-0.x16b', 'out/Foo-1.x16b' ]
+
+	converter.layout = { 'Foo Bitmap': { '': { 'bank': 0, 'address': 0x0000 } } }
+	assert ConverterX16._bitmap_chunk_files(converter, 'Foo Bitmap', section_ini) \
+		== [ 'out/Foo-0.x16b' ]
+
+	ConverterX16._layout_write(converter, { 'Foo Bitmap': { '': { 'bank': 0, 'address': 0x1000 } } })
+
+	script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ConverterX16.py')
+	output = subprocess.run(
+		[ sys.executable, '-c'
+		, 'import runpy, sys\n'
+		  f'sys.argv = [ "ConverterX16.py", "--output-dir", "out", "--list-output-files", "Resource.ini" ]\n'
+		  'try:\n'
+		  f'	runpy.run_path({script!r}, run_name = "__main__")\n'
+		  'except SystemExit:\n'
+		  '	pass\n'
+		  'print("PIL" in sys.modules)\n'
+		]
+		, capture_output = True, text = True, check = True
+		).stdout.split()
+
+	assert output == [ 'out/Foo.x16b', 'out/Foo.x16i', 'out/Foo-0.x16b', 'out/Foo-1.x16b', 'False' ]
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Bundle
+################################################################################
+
+################################################################################
+# 32-bit FNV-1a of the file name, the high and low halves combined
+def _bundle_hash(name):
+	value = 0x811c9dc5
+	for byte in name.encode():
+		value = ((value ^ byte) * 0x01000193) & 0xffffffff
+
+	return (value >> 16) ^ (value & 0xffff)
+
+
+################################################################################
+def test_bundle_hash():
+	assert _bundle_hash('') == 0x811c ^ 0x9dc5
+	for name in ( 'Foo.x16b', 'A.x16m', 'Font.x16t' ):
+		assert ConverterX16._bundle_hash(name) == _bundle_hash(name)
+
+
+################################################################################
+# The directory has a 2 byte count and a 12 byte entry for each file, the data
+# of each file starts at a multiple of Align
+def test_bundle_directory(tmp_path, monkeypatch):
+	converter = _converter(tmp_path, monkeypatch
+		, '[A Tilemap]\nAddress_Bank = 1\nAddress_High = 12\nAddress_Low = 34\n00 = 001 0 0 0\n'
+		  '[B Tilemap]\nMemory = ram\nAddress_Bank = 3\nAddress_High = a0\nAddress_Low = 00\n'
+		  '00 = 002 0 0 0 003 0 0 0\n'
+		  '[All Bundle]\nResources = B Tilemap, A Tilemap\nAlign = 4\n'
+		)
+
+	assert ConverterX16.convert(converter, [ 'A Tilemap', 'B Tilemap', 'All Bundle' ]) == 0
+
+	with open('out/All.x16a', 'rb') as bundle_file:
+		bundle = bundle_file.read()
+
+	assert bundle[0:2] == bytes.fromhex('0200')
+	assert bundle[2:14] == _bundle_hash('B.x16m').to_bytes(2, 'little') \
+		+ bytes.fromhex('1c0000 040000 00 03 00a0')
+	assert bundle[14:26] == _bundle_hash('A.x16m').to_bytes(2, 'little') \
+		+ bytes.fromhex('200000 020000 01 01 3412')
+	assert bundle[28:32] == bytes.fromhex('0200 0300')
+	assert bundle[32:34] == bytes.fromhex('0100')
+	assert len(bundle) == 34
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Compression
+################################################################################
+
+################################################################################
+# Decompress RLE or LZ data, the same as the macros in Zakero_X16_Vera.inc
+def _decompress(data, compression):
+	output = bytearray()
+	position = 0
+
+	while data[position] != 0x00:
+		token = data[position]
+		position += 1
+
+		if token < 0x80:
+			output.extend(data[position:position + token])
+			position += token
+		elif compression == 'lz':
+			distance = data[position] | (data[position + 1] << 8)
+			position += 2
+			assert distance >= 2
+			for _ in range((token & 0x7f) + 4):
+				output.append(output[-distance])
+		else:
+			output.extend(data[position:position + 1] * ((token & 0x7f) + 1))
+			position += 1
+
+	assert position == len(data) - 1
+
+	return bytes(output)
+
+
+################################################################################
+# Data with long runs, short runs, repeats, and noise
+#
+# The LZ matches are never 1 byte back, see the Compression notes in
+# ConverterX16.py.
+def _compress_samples():
+	import random
+
+	generator = random.Random(1)
+
+	return \
+		[ b''
+		, b'\x00'
+		, b'\x05' * 3
+		, b'\x07' * 1000
+		, bytes(range(256)) * 3
+		, b'ab' * 300
+		, bytes(generator.randrange(4) for _ in range(5000))
+		, bytes(generator.randrange(256) for _ in range(300)) * 2
+		, b'\x01\x01\x02\x02\x02\x03' * 50 + b'\x09' * 129
+		]
+
+
+################################################################################
+@pytest.mark.parametrize('sample', _compress_samples())
+def test_compress_rle_round_trip(sample):
+	assert _decompress(ConverterX16._compress_rle(sample), 'rle') == sample
+
+
+################################################################################
+@pytest.mark.parametrize('sample', _compress_samples())
+def test_compress_lz_round_trip(sample):
+	assert _decompress(ConverterX16._compress_lz(sample), 'lz') == sample
+
+
+################################################################################
+# }}}
+################################################################################
+
+################################################################################
+# {{{ Errors
+################################################################################
+
+################################################################################
+# A bad number or a corrupt image is an error of its section, the other
+# sections are converted, with or without worker processes
+@pytest.mark.parametrize('jobs', [ '1', '2' ])
+def test_bad_section_is_section_error(tmp_path, monkeypatch, capsys, jobs):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Bad Tilemap]\nAddress_High = zz\n00 = 001 0 0 0\n'
+		  '[Bad Bitmap]\nFile = bad.gif\n'
+		  '[Good Tilemap]\n00 = 002 0 0 0\n'
+		, '--jobs', jobs
+		)
+
+	with open('bad.gif', 'wb') as gif_file:
+		gif_file.write(b'GIF89a not an image')
+
+	assert ConverterX16.convert(converter, [ 'Bad Tilemap', 'Bad Bitmap', 'Good Tilemap' ]) == 2
+
+	output = capsys.readouterr().out
+	assert 'Error: [Bad Tilemap] Address_High must be a hex number, not "zz"' in output
+	assert 'Error: [Bad Bitmap] Traceback' in output
+	assert _read('out/Good.x16m') == bytes.fromhex('0200')
+
+
+################################################################################
+# A Layer and a Tileset with the same name both write "Foo.x16t"
+def test_shared_output_file(tmp_path, monkeypatch, capsys):
+	converter = _converter(tmp_path, monkeypatch
+		, '[Foo Layer]\nFile = foo.gif\n'
+		  '[Foo Tileset]\nFile = foo.gif\n'
+		  '[Good Tilemap]\n00 = 002 0 0 0\n'
+		)
+
+	assert ConverterX16.convert(converter, [ 'Foo Layer', 'Foo Tileset', 'Good Tilemap' ]) == 2
+	assert 'Error: [Foo Tileset] "out/Foo.x16t" is also written by "[Foo Layer]"' in capsys.readouterr().out
+	assert _read('out/Good.x16m') == bytes.fromhex('0200')
+
+	with pytest.raises(ConverterX16.ConverterError):
+		ConverterX16.list_output_files(converter)
+
+
+################################################################################
+# }}}
+################################################################################